@@ -0,0 +1,257 @@
+"""Monte Carlo robustness of backtest trades.
+
+The trades of a backtest are one realization of the strategy. Resampling
+their order, their blocks of consecutive trades or the slippage of their
+fills gives the distribution of the drawdowns, final equity and probability
+of ruin that the same strategy could have had.
+
+Example:
+    >>> entry_signals = entry_strategy.batch_entry_signals()
+    >>> exit_signals = exit_strategy.batch_exit_signals(entry_signals, as_prices=True)
+    >>> trades = get_trades(candles, entry_signals, exit_signals)
+    >>> result = run_montecarlo(trades, n_paths=10_000, method="block", slippage=0.00005)
+    >>> result.summary()["max_drawdown"]
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+# One row per closed trade
+TradeDtype = np.dtype([
+    ("entry", np.int64),
+    ("exit", np.int64),
+    ("side", np.int8),
+    ("entry_price", np.float64),
+    ("exit_price", np.float64),
+    ("returns", np.float64),
+])
+
+# Metrics of each simulated path
+PathDtype = np.dtype([
+    ("final_equity", np.float64),
+    ("max_drawdown", np.float64),
+    ("ruined", np.bool_),
+])
+
+Percentiles = (5, 25, 50, 75, 95)
+
+
+def get_trades(
+    candles: np.recarray,
+    entry_signals: np.recarray,
+    exit_signals: np.recarray,
+) -> np.recarray:
+    """Closed trades of a backtest, sorted by entry.
+
+    Args:
+        candles (np.recarray): Candles the signals were calculated on.
+        entry_signals (np.recarray): Output of batch_entry_signals (buy_index, buy_price, sell_index, sell_price).
+        exit_signals (np.recarray): Output of batch_exit_signals. The exit bar of the entry on each bar
+            is either the buy/sell field or the buy_index/sell_index one, NaN if the trade is still
+            open at the end. Open trades are left out. Exit prices are taken
+            from buy_price/sell_price if there are, else from the open of the exit bar.
+
+    Returns:
+        np.recarray: Trades with TradeDtype. Returns are relative to the entry price.
+    """
+    names = exit_signals.dtype.names
+    trades = []
+    for side, entry_field, exit_field, price_field in (
+        (1, "buy", "buy" if "buy" in names else "buy_index", "buy_price"),
+        (-1, "sell", "sell" if "sell" in names else "sell_index", "sell_price"),
+    ):
+        entries = np.flatnonzero(entry_signals[f"{entry_field}_index"])
+        exits = np.asarray(exit_signals[exit_field][entries], dtype=np.float64)
+
+        # Entries without exit (NaN) are still open at the end of the backtest
+        closed = np.isfinite(exits) & (exits < candles.shape[0])
+        entries, exits = entries[closed], exits[closed].astype(np.int64)
+
+        side_trades = np.empty(entries.shape[0], dtype=TradeDtype)
+        side_trades["entry"], side_trades["exit"], side_trades["side"] = entries, exits, side
+        side_trades["entry_price"] = entry_signals[f"{entry_field}_price"][entries]
+        if price_field in names:
+            side_trades["exit_price"] = exit_signals[price_field][entries]
+        else:
+            side_trades["exit_price"] = candles.open[exits]
+        trades.append(side_trades)
+
+    trades = np.concatenate(trades)
+    trades = trades[np.argsort(trades["entry"], kind="stable")].view(np.recarray)
+    trades.returns = trades.side * (trades.exit_price - trades.entry_price) / trades.entry_price
+    return trades
+
+
+def resample_indexes(
+    n_trades: int,
+    n_paths: int,
+    method: str = "bootstrap",
+    block_size: int = 10,
+    rng: np.random.Generator = None,
+) -> np.ndarray:
+    """Order of the trades of each path.
+
+    Args:
+        n_trades (int): Trades of the backtest.
+        n_paths (int): Paths to simulate.
+        method (str, optional): "bootstrap" draws trades with replacement, "block" draws
+            circular blocks of `block_size` consecutive trades, keeping their serial
+            correlation, and "original" keeps the backtest order. Defaults to "bootstrap".
+        block_size (int, optional): Trades per block of the "block" method. Defaults to 10.
+        rng (np.random.Generator, optional): Random generator. Defaults to None (new one).
+
+    Returns:
+        np.ndarray: Trade indexes with shape (n_paths, n_trades).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    if method == "original":
+        return np.broadcast_to(np.arange(n_trades), (n_paths, n_trades))
+    elif method == "bootstrap":
+        return rng.integers(0, n_trades, (n_paths, n_trades))
+    elif method == "block":
+        n_blocks = -(-n_trades // block_size)
+        starts = rng.integers(0, n_trades, (n_paths, n_blocks, 1))
+        indexes = (starts + np.arange(block_size)) % n_trades
+        return indexes.reshape(n_paths, -1)[:, :n_trades]
+    raise ValueError(f"{method=} not supported. Must be ['bootstrap', 'block', 'original']")
+
+
+def path_returns(
+    trades: np.recarray,
+    indexes: np.ndarray,
+    slippage: float = 0.,
+    rng: np.random.Generator = None,
+) -> np.ndarray:
+    """Returns of the trades of each path. With slippage, every entry and exit is
+    filled worse than its price by a uniform draw between 0 and `slippage` (in price units).
+    """
+    sides = trades.side[indexes]
+    entry_prices = trades.entry_price[indexes]
+    exit_prices = trades.exit_price[indexes]
+    if slippage > 0:
+        rng = np.random.default_rng() if rng is None else rng
+        entry_prices = entry_prices + sides * rng.uniform(0, slippage, indexes.shape)
+        exit_prices = exit_prices - sides * rng.uniform(0, slippage, indexes.shape)
+    return sides * (exit_prices - entry_prices) / entry_prices
+
+
+def equity_curves(returns: np.ndarray, fraction: float = 1.) -> np.ndarray:
+    """Equity after each trade of each path, starting from 1, when `fraction` of
+    the equity is invested on every trade.
+    """
+    return np.cumprod(1. + fraction * returns, axis=-1)
+
+
+def max_drawdowns(equity: np.ndarray) -> np.ndarray:
+    """Largest relative fall from a peak of each equity curve. The initial equity of 1 is a peak."""
+    peaks = np.maximum.accumulate(np.maximum(equity, 1.), axis=-1)
+    return 1. - (equity / peaks).min(axis=-1)
+
+
+@dataclass
+class MonteCarloResult:
+    """Paths of run_montecarlo.
+
+    Attributes:
+        paths (np.recarray): Final equity, max drawdown and ruin of every path (PathDtype).
+        steps (np.ndarray): Trade numbers where the equity curves were sampled.
+        curves (np.ndarray): float32 equity of every path at each step, shape (n_paths, len(steps)).
+        original (np.recarray): Metrics of the backtest order without slippage.
+    """
+    paths: np.recarray
+    steps: np.ndarray
+    curves: np.ndarray
+    original: np.recarray
+
+    @property
+    def ruin_probability(self) -> float:
+        return float(self.paths.ruined.mean())
+
+    def bands(self, percentiles: tuple = Percentiles) -> np.ndarray:
+        """Percentiles of the equity at each step, shape (len(percentiles), len(steps))."""
+        return np.percentile(self.curves, percentiles, axis=0)
+
+    def summary(self, percentiles: tuple = Percentiles) -> dict:
+        """Percentiles of the final equity and max drawdown of the paths, and the ruin probability."""
+        return {
+            "percentiles": tuple(percentiles),
+            "final_equity": np.percentile(self.paths.final_equity, percentiles),
+            "max_drawdown": np.percentile(self.paths.max_drawdown, percentiles),
+            "ruin_probability": self.ruin_probability,
+            "original_final_equity": float(self.original.final_equity[0]),
+            "original_max_drawdown": float(self.original.max_drawdown[0]),
+        }
+
+
+def _simulate_chunk(trades, n_paths, method, block_size, slippage, fraction, ruin_level, steps, seed):
+    # Paths of a chunk. Each chunk has its own seed, so results don't depend on n_jobs
+    rng = np.random.default_rng(seed)
+    indexes = resample_indexes(trades.shape[0], n_paths, method, block_size, rng)
+    equity = equity_curves(path_returns(trades, indexes, slippage, rng), fraction)
+
+    paths = np.empty(n_paths, dtype=PathDtype)
+    paths["final_equity"] = equity[:, -1]
+    paths["max_drawdown"] = max_drawdowns(equity)
+    paths["ruined"] = (equity <= ruin_level).any(axis=1)
+    return paths, equity[:, steps].astype(np.float32)
+
+
+def run_montecarlo(
+    trades: np.recarray,
+    n_paths: int = 10_000,
+    method: str = "bootstrap",
+    block_size: int = 10,
+    slippage: float = 0.,
+    fraction: float = 1.,
+    ruin_level: float = 0.5,
+    n_steps: int = 100,
+    chunk_size: int = 1000,
+    n_jobs: int = 1,
+    seed: int = None,
+) -> MonteCarloResult:
+    """Simulates `n_paths` alternative histories of the trades of a backtest.
+
+    Paths are simulated as 2-D arrays (paths x trades) in chunks of `chunk_size`
+    paths, so the memory is bounded by the chunk and not by `n_paths`. Only the
+    metrics of each path and its equity at `n_steps` points are kept.
+
+    Args:
+        trades (np.recarray): Trades of get_trades.
+        n_paths (int, optional): Paths to simulate. Defaults to 10_000.
+        method (str, optional): Resampling of the trades. See resample_indexes. Defaults to "bootstrap".
+        block_size (int, optional): Trades per block of the "block" method. Defaults to 10.
+        slippage (float, optional): Max slippage of each fill in price units. Defaults to 0.
+        fraction (float, optional): Fraction of the equity invested on each trade. Defaults to 1.
+        ruin_level (float, optional): Equity (from an initial 1) considered ruin. Defaults to 0.5.
+        n_steps (int, optional): Points of the equity curves kept for the bands. Defaults to 100.
+        chunk_size (int, optional): Paths simulated at once. Defaults to 1000.
+        n_jobs (int, optional): Threads simulating chunks. Defaults to 1.
+        seed (int, optional): Seed of the paths. Defaults to None.
+
+    Returns:
+        MonteCarloResult: Paths of the simulation.
+    """
+    n_trades = trades.shape[0]
+    if n_trades == 0:
+        raise ValueError("There are no trades to simulate")
+
+    steps = np.unique(np.linspace(0, n_trades - 1, min(n_steps, n_trades)).astype(np.int64))
+    chunks = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    params = (method, block_size, slippage, fraction, ruin_level, steps)
+
+    if n_jobs == 1:
+        results = [_simulate_chunk(trades, size, *params, chunk_seed) for size, chunk_seed in zip(chunks, seeds)]
+    else:
+        # Most of the time is spent on numpy ops that release the GIL
+        from joblib import Parallel, delayed
+        results = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_simulate_chunk)(trades, size, *params, chunk_seed) for size, chunk_seed in zip(chunks, seeds))
+
+    original, _ = _simulate_chunk(trades, 1, "original", block_size, 0., fraction, ruin_level, steps, None)
+    return MonteCarloResult(
+        paths=np.concatenate([paths for paths, _ in results]).view(np.recarray),
+        steps=steps,
+        curves=np.concatenate([curves for _, curves in results]),
+        original=original.view(np.recarray),
+    )
@@ -0,0 +1,61 @@
+from glob import glob
+from os.path import basename, splitext
+
+import numpy as np
+from pandas import read_csv, to_datetime
+
+from datatools.augmentation import RatesDtype, MarketGenerator
+
+
+def load_rates(path: str) -> np.recarray:
+    """Candles of a bundled csv, i.e. data/raw/eurusd_10k.csv, with epoch seconds as time.
+    Columns missing in the csv (some only have "volume") are left as zeros.
+    """
+    df_rates = read_csv(path)
+    if "tick_volume" not in df_rates and "volume" in df_rates:
+        df_rates["tick_volume"] = df_rates["volume"]
+
+    rates = np.zeros(df_rates.shape[0], dtype=RatesDtype).view(np.recarray)
+    rates.time = to_datetime(df_rates["time"], utc=True).values.astype("datetime64[s]").astype(np.int64)
+    for name in RatesDtype.names[1:]:
+        if name in df_rates:
+            rates[name] = df_rates[name]
+    return rates
+
+
+def synthetic_rates(
+    n_bars: int,
+    seed: int = 0,
+    price: float = 1.1,
+    volatility: float = 2e-4,
+    timeframe_secs: int = 180,
+) -> np.recarray:
+    """Geometric brownian motion candles with the dtype of the MT5 rates.
+
+    Args:
+        n_bars (int): Number of candles.
+        seed (int, optional): Seed of the generator. Defaults to 0.
+        price (float, optional): First open price. Defaults to 1.1.
+        volatility (float, optional): Standard deviation of the log returns per bar. Defaults to 2e-4.
+        timeframe_secs (int, optional): Seconds between candles. Defaults to 180 (M3).
+
+    Returns:
+        np.recarray: Candles with time, open, high, low, close, tick_volume, spread and real_volume.
+    """
+    generator = MarketGenerator("gbm", price, volatility, timeframe_secs=timeframe_secs, seed=seed)
+    return generator.generate(n_bars)
+
+
+def get_datasets(
+    sizes: tuple = (10_000, 100_000, 1_000_000, 10_000_000),
+    bundled: bool = True,
+    raw_folder: str = "data/raw",
+) -> dict:
+    """Bundled eurusd datasets plus synthetic ones of the given sizes, keyed by name."""
+    datasets = {}
+    if bundled:
+        for path in sorted(glob(f"{raw_folder}/eurusd_*.csv")):
+            datasets[splitext(basename(path))[0]] = load_rates(path)
+    for size in sizes:
+        datasets[f"synthetic_{size:.0e}".replace("+0", "")] = synthetic_rates(size)
+    return datasets
@@ -0,0 +1,217 @@
+import gc
+import json
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter_ns
+from typing import Callable
+
+import numpy as np
+
+
+def measure_batch(func: Callable, n_items: int, repeat: int = 5, warmup: int = 1) -> dict:
+    """Times whole calls of `func`, i.e. a batch indicator over all the bars.
+
+    Args:
+        func (Callable): Function without arguments.
+        n_items (int): Items (bars) processed by a single call, for the throughput.
+        repeat (int, optional): Timed calls. Defaults to 5.
+        warmup (int, optional): Untimed calls before the timed ones. Defaults to 1.
+
+    Returns:
+        dict: throughput (items per second), p50/p99/mean latency of a call in
+            nanoseconds and peak memory of a call in bytes.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = np.empty(repeat, dtype=np.int64)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = perf_counter_ns()
+            func()
+            timings[i] = perf_counter_ns() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        **_latencies(timings),
+        "throughput": n_items / (np.median(timings) / 1e9),
+        "peak_memory": peak_memory(func),
+    }
+
+
+def measure_stream(setup: Callable, step: Callable, n_steps: int) -> dict:
+    """Times every call of `step(i)` for i in range(n_steps), i.e. the per-bar
+    updates of a strategy fitted by `setup()`.
+
+    Returns:
+        dict: throughput (steps per second), p50/p99/mean latency of a step in
+            nanoseconds and peak memory of the whole stream in bytes.
+    """
+    setup()
+    timings = np.empty(n_steps, dtype=np.int64)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(n_steps):
+            start = perf_counter_ns()
+            step(i)
+            timings[i] = perf_counter_ns() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    def stream():
+        setup()
+        for i in range(n_steps):
+            step(i)
+
+    return {
+        **_latencies(timings),
+        "throughput": n_steps / (timings.sum() / 1e9),
+        "peak_memory": peak_memory(stream),
+    }
+
+
+def _latencies(timings: np.ndarray) -> dict:
+    return {
+        "n": int(timings.shape[0]),
+        "mean_ns": float(timings.mean()),
+        "p50_ns": float(np.percentile(timings, 50)),
+        "p99_ns": float(np.percentile(timings, 99)),
+    }
+
+
+def peak_memory(func: Callable) -> int:
+    """Peak of the memory allocated by a call, in bytes. Measured apart from the
+    timings because tracing slows down every allocation.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return int(peak)
+
+
+def get_environment() -> dict:
+    """Commit and versions the results were measured with, to compare runs."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+class BenchmarkSuite:
+    """Collection of benchmark cases run over several dataset sizes.
+
+    Cases are registered with the `case` decorator. A case receives the candles
+    of the dataset and returns the dict of `measure_batch` or `measure_stream`.
+    A case that raises is recorded with its error and the run goes on.
+
+    Example:
+        >>> suite = BenchmarkSuite()
+        >>> @suite.case("indicators", max_bars=1_000_000)
+        ... def rqk(candles):
+        ...     return measure_batch(lambda: RQK(candles.close, 8), candles.shape[0])
+        >>> results = suite.run(datasets)
+        >>> write_results(results, "bench_results.json")
+    """
+
+    def __init__(self) -> None:
+        self.cases = {}
+
+    def case(self, group: str, max_bars: int = None, min_bars: int = None) -> Callable:
+        """Registers a case. It is skipped on datasets with more than `max_bars` bars
+        or less than `min_bars` bars.
+        """
+        def register(func: Callable) -> Callable:
+            self.cases[f"{group}.{func.__name__}"] = (func, max_bars, min_bars)
+            return func
+        return register
+
+    def run(self, datasets: dict, select: str = None, verbose: bool = True) -> list:
+        """Runs every case whose name contains `select` over the datasets.
+
+        Args:
+            datasets (dict): Candles keyed by dataset name.
+            select (str, optional): Substring of the case names to run. Defaults to None (all).
+            verbose (bool, optional): Print each result as it is measured. Defaults to True.
+
+        Returns:
+            list: One dict per case and dataset. Failed cases have an "error" instead of the measures.
+        """
+        results = []
+        for name, (func, max_bars, min_bars) in self.cases.items():
+            if select is not None and select not in name:
+                continue
+            for dataset, candles in datasets.items():
+                n_bars = candles.shape[0]
+                if max_bars is not None and n_bars > max_bars:
+                    continue
+                if min_bars is not None and n_bars < min_bars:
+                    continue
+
+                result = {"case": name, "dataset": dataset, "bars": n_bars}
+                try:
+                    result.update(func(candles))
+                except Exception as error:
+                    result["error"] = f"{type(error).__name__}: {error}"
+                results.append(result)
+                if verbose:
+                    print(format_result(result))
+        return results
+
+
+def format_result(result: dict) -> str:
+    if "error" in result:
+        return f"{result['case']:<45} {result['dataset']:<14} FAILED {result['error']}"
+    return (
+        f"{result['case']:<45} {result['dataset']:<14} "
+        f"{result['throughput']:>14,.0f}/s  p50 {result['p50_ns'] / 1e3:>11,.1f} us  "
+        f"p99 {result['p99_ns'] / 1e3:>11,.1f} us  peak {result['peak_memory'] / 2 ** 20:>8,.1f} MiB"
+    )
+
+
+def write_results(results: list, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump({"environment": get_environment(), "results": results}, file, indent=2)
+
+
+def compare_results(baseline_path: str, current_path: str, tolerance: float = 0.1) -> list:
+    """Cases whose p50 latency got worse than `tolerance` (relative) between two runs.
+
+    Returns:
+        list: (case, dataset, baseline p50, current p50, relative change) of each regression.
+    """
+    with open(baseline_path) as file:
+        baseline = {(r["case"], r["dataset"]): r for r in json.load(file)["results"]}
+    with open(current_path) as file:
+        current = json.load(file)["results"]
+
+    regressions = []
+    for result in current:
+        previous = baseline.get((result["case"], result["dataset"]))
+        if previous is None or "error" in result or "error" in previous or previous["p50_ns"] == 0:
+            continue
+        change = result["p50_ns"] / previous["p50_ns"] - 1
+        if change > tolerance:
+            regressions.append((result["case"], result["dataset"], previous["p50_ns"], result["p50_ns"], change))
+    return regressions
@@ -0,0 +1,265 @@
+"""Benchmarks of the indicators, strategies and bot loop of danafx.
+
+Run from the root of the repository:
+
+    python -m benchmarks.suite --sizes 10000 100000 --output bench_results.json
+    python -m benchmarks.suite --select stream --compare bench_baseline.json
+
+Every result has the throughput, p50/p99 latency and peak memory of its case,
+and the file also records the commit and versions, so runs can be compared.
+"""
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks.data import get_datasets
+from benchmarks.harness import BenchmarkSuite, measure_batch, measure_stream, write_results, compare_results
+from datatools.clean import clean_rates
+from datatools.custom import rolling_apply, rolling_reduce, sliding_extremum
+from datatools.feature_engineering import triple_barrier_labels
+from trade.metadata import EntrySignal
+from trade.indicators import RQK, RBFK, WT, DONCHAIN, PIVOTHIGH
+from trade.strategies import CompoundTradingStrategy, Priority, And
+from trade.strategies.momentum import RsiStrategy
+from trade.strategies.trending import DualSmaStrategy, DualNadarayaKernelStrategy
+from trade.strategies.scalping import ZigZagEntryStrategy
+from trade.strategies.priceaction.breakline import TrendlineBreakStrategy
+from trade.strategies.exit import DirectionChangeExitStrategy
+from trade.strategies.trailingstop import AtrBandTrailingStop
+
+suite = BenchmarkSuite()
+
+# Bars streamed one by one after fitting on the previous ones
+StreamBars = 2000
+
+
+def get_entry_strategies() -> dict:
+    return {
+        "dual_sma": DualSmaStrategy(5, 200),
+        "rsi": RsiStrategy(14, (0, 23), (70, 100), mode="outband"),
+        "zigzag": ZigZagEntryStrategy(window=1, lag=1),
+        "dual_nadaraya": DualNadarayaKernelStrategy(window_rqk=9, window_rbfk=8, lag=1, n_bars=20),
+        "trendline_break": TrendlineBreakStrategy(window=5, alpha=1.856, offset=-1),
+    }
+
+
+def stream_strategy(strategy, candles: np.recarray) -> dict:
+    """Per-bar update_data and get_entry_signal after fitting the previous bars."""
+    n_steps = min(StreamBars, candles.shape[0] // 2)
+    start = candles.shape[0] - n_steps
+
+    def setup():
+        strategy.fit(candles[:start])
+
+    def step(i):
+        t = start + i
+        strategy.update_data(candles[t - 1:t])
+        strategy.get_entry_signal(candles[t])
+
+    return measure_stream(setup, step, n_steps)
+
+
+# Batch indicators
+@suite.case("indicators", max_bars=1_000_000)
+def rqk(candles):
+    return measure_batch(lambda: RQK(candles.close, 8, 1, 25), candles.shape[0])
+
+
+@suite.case("indicators", max_bars=1_000_000)
+def rbfk(candles):
+    return measure_batch(lambda: RBFK(candles.close, 8, 25), candles.shape[0])
+
+
+@suite.case("indicators")
+def wt(candles):
+    return measure_batch(lambda: WT(candles.high, candles.low, candles.close, 10, 11), candles.shape[0])
+
+
+@suite.case("indicators")
+def donchain(candles):
+    return measure_batch(lambda: DONCHAIN(candles.close, 20), candles.shape[0])
+
+
+@suite.case("indicators")
+def pivothigh(candles):
+    return measure_batch(lambda: PIVOTHIGH(candles.high, 5, 5), candles.shape[0])
+
+
+@suite.case("rolling", max_bars=100_000)
+def rolling_apply_mean(candles):
+    return measure_batch(lambda: rolling_apply(np.mean, 20, candles.close), candles.shape[0], repeat=3)
+
+
+@suite.case("rolling")
+def rolling_reduce_std(candles):
+    return measure_batch(lambda: rolling_reduce(candles.close, 20, "std"), candles.shape[0])
+
+
+@suite.case("rolling")
+def sliding_max(candles):
+    return measure_batch(lambda: sliding_extremum(candles.high, 200, "max"), candles.shape[0])
+
+
+@suite.case("data")
+def clean(candles):
+    return measure_batch(lambda: clean_rates(candles, int(np.median(np.diff(candles.time)))), candles.shape[0])
+
+
+@suite.case("data")
+def triple_barrier(candles):
+    return measure_batch(lambda: triple_barrier_labels(candles, 50, take_profit=0.002, stop_loss=0.001), candles.shape[0])
+
+
+# Per-bar streaming updates
+@suite.case("stream", max_bars=1_000_000)
+def dual_sma(candles):
+    return stream_strategy(get_entry_strategies()["dual_sma"], candles)
+
+
+@suite.case("stream", max_bars=1_000_000)
+def rsi(candles):
+    return stream_strategy(get_entry_strategies()["rsi"], candles)
+
+
+@suite.case("stream", max_bars=1_000_000)
+def zigzag(candles):
+    return stream_strategy(get_entry_strategies()["zigzag"], candles)
+
+
+@suite.case("stream", max_bars=1_000_000)
+def dual_nadaraya(candles):
+    return stream_strategy(get_entry_strategies()["dual_nadaraya"], candles)
+
+
+@suite.case("stream", max_bars=1_000_000)
+def trendline_break(candles):
+    return stream_strategy(get_entry_strategies()["trendline_break"], candles)
+
+
+# Batch signals over the whole dataset
+def batch_entry_case(name):
+    def case(candles):
+        strategy = get_entry_strategies()[name]
+        strategy.fit(candles)
+        return measure_batch(strategy.batch_entry_signals, candles.shape[0])
+    case.__name__ = f"{name}_entries"
+    return case
+
+
+# Datasets shorter than min_bars cannot fill the windows of the strategy
+for name, strategy in get_entry_strategies().items():
+    suite.case("batch", max_bars=1_000_000, min_bars=strategy.min_bars)(batch_entry_case(name))
+
+
+@suite.case("batch", max_bars=1_000_000)
+def direction_change_exits(candles):
+    entry_strategy = ZigZagEntryStrategy(window=1, lag=1)
+    entry_strategy.fit(candles)
+    entry_signals = entry_strategy.batch_entry_signals()
+
+    exit_strategy = DirectionChangeExitStrategy(lag=1)
+    exit_strategy.fit(candles)
+    return measure_batch(lambda: exit_strategy.batch_exit_signals(entry_signals), candles.shape[0])
+
+
+@suite.case("batch", max_bars=100_000)
+def dual_nadaraya_population(candles):
+    # Sweep of 1000 configs evaluated at once
+    rng = np.random.default_rng(0)
+    params = dict(
+        window_rqk=rng.integers(3, 40, 1000),
+        window_rbfk=rng.integers(3, 40, 1000),
+        alpha_rq=rng.choice([0.5, 1, 2, 4], 1000),
+    )
+
+    def population():
+        for _ in DualNadarayaKernelStrategy.iter_population_signals(candles, **params):
+            pass
+
+    return measure_batch(population, candles.shape[0] * 1000, repeat=3)
+
+
+# Compound trees evaluated per bar
+@suite.case("compound", max_bars=1_000_000)
+def priority_and_tree(candles):
+    strategies = get_entry_strategies()
+    leaves = [strategies["dual_sma"], strategies["rsi"], strategies["zigzag"]]
+    tree = CompoundTradingStrategy(Priority(leaves[0], And(leaves[1], leaves[2])))
+
+    n_steps = min(StreamBars, candles.shape[0] // 2)
+    start = candles.shape[0] - n_steps
+
+    def setup():
+        for leaf in leaves:
+            leaf.fit(candles[:start])
+
+    def step(i):
+        t = start + i
+        for leaf in leaves:
+            leaf.update_data(candles[t - 1:t])
+        tree.get_entry_signal(candles[t])
+
+    return measure_stream(setup, step, n_steps)
+
+
+# Simulated bot cycle: every stage of SingleTraderBot.run but the broker calls
+@suite.case("bot", max_bars=1_000_000)
+def single_bot_cycle(candles):
+    entry_strategy = get_entry_strategies()["dual_nadaraya"]
+    exit_strategy = DirectionChangeExitStrategy(lag=1)
+    trailing_strategy = AtrBandTrailingStop(window=14, multiplier=1.1, rr_ratio=2.0, lag=1)
+    strategies = (entry_strategy, exit_strategy, trailing_strategy)
+
+    n_steps = min(StreamBars, candles.shape[0] // 2)
+    start = candles.shape[0] - n_steps
+    position = SimpleNamespace(time=0, type=EntrySignal.BUY.value, price_open=0., sl=0., tp=0.)
+
+    def setup():
+        for strategy in strategies:
+            strategy.fit(candles[:start])
+
+    def step(i):
+        t = start + i
+        last_candles, current_candle = candles[t - 1:t], candles[t]
+        for strategy in strategies:
+            strategy.update_data(last_candles)
+
+        entry_signal = entry_strategy.get_entry_signal(current_candle)
+        signal = entry_signal if entry_signal != EntrySignal.NEUTRAL else EntrySignal.BUY
+        stop_loss, take_profit = trailing_strategy.calculate_stop_levels(current_candle, signal)
+
+        position.time, position.price_open = current_candle.time - 1, current_candle.open
+        position.sl, position.tp = stop_loss, take_profit
+        exit_strategy.get_exit_signal(current_candle, position)
+
+    return measure_stream(setup, step, n_steps)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmarks of the danafx indicators, strategies and bot loop")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000, 10_000_000],
+                        help="bars of the synthetic datasets")
+    parser.add_argument("--no-bundled", action="store_true", help="skip the data/raw/eurusd_*.csv datasets")
+    parser.add_argument("--select", default=None, help="only cases whose name contains this text")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file with the results")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative p50 slowdown reported")
+    args = parser.parse_args()
+
+    datasets = get_datasets(tuple(args.sizes), bundled=not args.no_bundled)
+    results = suite.run(datasets, args.select)
+    write_results(results, args.output)
+    failed = sum("error" in result for result in results)
+    print(f"{len(results)} results written to {args.output}" + (f", {failed} failed" if failed else ""))
+
+    if args.compare:
+        regressions = compare_results(args.compare, args.output, args.tolerance)
+        for case, dataset, before, after, change in regressions:
+            print(f"REGRESSION {case} {dataset}: p50 {before / 1e3:,.1f} us -> {after / 1e3:,.1f} us ({change:+.0%})")
+        if not regressions:
+            print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,252 @@
-from pandas import DataFrame, Series
-from sklearn.datasets import make_regression
+from typing import Generator
+
+import numpy as np
 from numpy import ndarray, linspace, newaxis
 
+# Same fields as the rates of mt5.copy_rates_from_pos
+RatesDtype = np.dtype([
+    ("time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("tick_volume", np.uint64),
+    ("spread", np.int32),
+    ("real_volume", np.uint64),
+])
+
+# Parameters of MarketGenerator enabled by each model. Explicit arguments override them
+MarketModels = {
+    "gbm": {},
+    "jump": {"jump_intensity": 0.002, "jump_scale": 8.},
+    "garch": {"clustering": 0.98, "vol_of_vol": 0.15},
+    "regime": {"regimes": ((0., 0.6), (2e-6, 1.), (-2e-6, 1.8)), "regime_duration": 2000},
+    "mixed": {
+        "jump_intensity": 0.002, "jump_scale": 8.,
+        "clustering": 0.98, "vol_of_vol": 0.15,
+        "regimes": ((0., 0.6), (2e-6, 1.), (-2e-6, 1.8)), "regime_duration": 2000,
+    },
+}
+
+_Week = 7 * 86400
+_Monday = 4 * 86400  # 1970-01-01 was a Thursday
+
+
+def ar1_filter(shocks: ndarray, phi: float, initial: float = 0.) -> ndarray:
+    """Vectorized x[t] = phi * x[t-1] + shocks[t] with x[-1] = initial.
+
+    The recursion is solved in closed form with a cumulative sum on blocks short
+    enough for phi ** -block to stay well conditioned.
+    """
+    result = np.empty_like(shocks, dtype=np.float64)
+    if phi == 0:
+        result[:] = shocks
+        return result
+
+    block = int(np.clip(6 * np.log(10) / -np.log(abs(phi)), 1, 4096)) if abs(phi) < 1 else 4096
+    powers = phi ** np.arange(1, block + 1, dtype=np.float64)
+    x = initial
+    for start in range(0, shocks.shape[0], block):
+        shock = shocks[start:start + block]
+        power = powers[:shock.shape[0]]
+        result[start:start + shock.shape[0]] = power * (x + np.cumsum(shock / power))
+        x = result[start + shock.shape[0] - 1]
+    return result
+
+
+class MarketGenerator:
+    """Seeded generator of synthetic rates with the dtype of the MT5 ones.
+
+    Log returns follow a geometric brownian motion whose volatility can cluster
+    (log-volatility AR(1), a vectorizable stand-in for GARCH), jump (compound
+    Poisson) and switch between regimes of drift and volatility (Markov chain with
+    geometric durations). High and low are sampled from the maximum and minimum of
+    a brownian bridge between the open and the close, so open/close are always
+    inside them. Spread and tick volume grow with the volatility of the bar.
+
+    Bars are generated in chunks that continue the state of the previous ones.
+    Each random component has its own stream, so the bars of a seed are the same
+    whatever the chunk sizes.
+
+    Args:
+        model (str, optional): Preset of MarketModels: "gbm", "jump", "garch", "regime" or "mixed". Defaults to "gbm".
+        price (float, optional): First open price. Defaults to 1.1.
+        volatility (float, optional): Mean standard deviation of the log returns per bar. Defaults to 2e-4.
+        drift (float, optional): Mean log return per bar. Defaults to 0.
+        timeframe_secs (int, optional): Seconds between bars. Defaults to 60 (M1).
+        start_time (int, optional): Epoch seconds of the first bar. Defaults to 1_685_000_000.
+        skip_weekends (bool, optional): No bars from saturday to sunday (UTC). Defaults to False.
+        digits (int, optional): Decimals of the prices. Spreads are in points of 10 ** -digits. Defaults to 5.
+        spread (float, optional): Mean spread in points. Defaults to 10.
+        tick_volume (float, optional): Mean ticks per bar. Defaults to 50.
+        seed (int, optional): Seed of the bars. Defaults to None.
+        **params: Parameters of the components, overriding the ones of the model:
+            jump_intensity (expected jumps per bar), jump_scale (jump size in volatilities),
+            clustering (AR(1) coefficient of the log-volatility), vol_of_vol (its shocks),
+            regimes (tuple of (drift, volatility multiplier) per regime) and
+            regime_duration (mean bars per regime).
+
+    Example:
+        >>> generator = MarketGenerator("mixed", seed=7)
+        >>> rates = generator.generate(1_000_000)
+        >>> for chunk in MarketGenerator("garch", seed=7).chunks(100_000_000):
+        ...     feed(chunk)
+    """
+
+    def __init__(
+        self,
+        model: str = "gbm",
+        price: float = 1.1,
+        volatility: float = 2e-4,
+        drift: float = 0.,
+        timeframe_secs: int = 60,
+        start_time: int = 1_685_000_000,
+        skip_weekends: bool = False,
+        digits: int = 5,
+        spread: float = 10.,
+        tick_volume: float = 50.,
+        seed: int = None,
+        **params,
+    ) -> None:
+        if model not in MarketModels:
+            raise ValueError(f"{model=} not supported. Must be {list(MarketModels)}")
+        params = {**MarketModels[model], **params}
+        unknown = set(params) - {"jump_intensity", "jump_scale", "clustering", "vol_of_vol", "regimes", "regime_duration"}
+        if unknown:
+            raise ValueError(f"Unknown parameters {sorted(unknown)}")
+
+        self.model = model
+        self.volatility = volatility
+        self.drift = drift
+        self.timeframe_secs = timeframe_secs
+        self.skip_weekends = skip_weekends
+        self.point = 10. ** -digits
+        self.spread = spread
+        self.tick_volume = tick_volume
+        self.jump_intensity = params.get("jump_intensity", 0.)
+        self.jump_scale = params.get("jump_scale", 0.)
+        self.clustering = params.get("clustering", 0.)
+        self.vol_of_vol = params.get("vol_of_vol", 0.)
+        self.regimes = np.asarray(params.get("regimes", ((0., 1.),)), dtype=np.float64)
+        self.regime_duration = params.get("regime_duration", 1000)
+
+        if skip_weekends:
+            # Bars are counted from the monday of the start time
+            self._bars_per_week = 5 * 86400 // timeframe_secs
+            self._origin = start_time - (start_time - _Monday) % _Week
+            self._offset = min((start_time - self._origin) // timeframe_secs, self._bars_per_week)
+        else:
+            self._origin = start_time
+            self._offset = 0
+
+        # One stream per component, so the chunk sizes don't change the bars
+        names = ("returns", "volatility", "jump_counts", "jump_sizes", "durations", "regimes", "wicks", "spread", "volume")
+        self._rngs = dict(zip(names, (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(names)))))
+
+        # State carried between chunks
+        self._n_bars = 0
+        self._log_price = np.log(price)
+        self._log_volatility = 0.
+        self._regime_codes = np.empty(0, dtype=np.int64)
+        self._regime_lengths = np.empty(0, dtype=np.int64)
+        self._regime = 0
+
+    def _next_regimes(self, n_bars: int) -> ndarray:
+        # Regime of the next n_bars. Unused segments are kept for the next chunk
+        n_regimes = self.regimes.shape[0]
+        if n_regimes == 1:
+            return np.zeros(n_bars, dtype=np.int64)
+
+        while self._regime_lengths.sum() < n_bars:
+            n_segments = max(16, 2 * n_bars // self.regime_duration)
+            lengths = self._rngs["durations"].geometric(1. / self.regime_duration, n_segments)
+            # Each switch moves to one of the other regimes
+            jumps = self._rngs["regimes"].integers(1, n_regimes, n_segments)
+            codes = (self._regime + np.cumsum(jumps)) % n_regimes
+            self._regime = codes[-1]
+            self._regime_codes = np.append(self._regime_codes, codes)
+            self._regime_lengths = np.append(self._regime_lengths, lengths)
+
+        ends = np.cumsum(self._regime_lengths)
+        used = np.searchsorted(ends, n_bars)
+        lengths = self._regime_lengths[:used + 1].copy()
+        lengths[-1] -= ends[used] - n_bars
+        regimes = np.repeat(self._regime_codes[:used + 1], lengths)
+
+        self._regime_lengths = self._regime_lengths[used:].copy()
+        self._regime_lengths[0] = ends[used] - n_bars
+        self._regime_codes = self._regime_codes[used:]
+        if self._regime_lengths[0] == 0:
+            self._regime_lengths, self._regime_codes = self._regime_lengths[1:], self._regime_codes[1:]
+        return regimes
+
+    def _times(self, n_bars: int) -> ndarray:
+        bars = np.arange(self._n_bars + self._offset, self._n_bars + self._offset + n_bars, dtype=np.int64)
+        if not self.skip_weekends:
+            return self._origin + self.timeframe_secs * bars
+        weeks, bars = np.divmod(bars, self._bars_per_week)
+        return self._origin + _Week * weeks + self.timeframe_secs * bars
+
+    def generate(self, n_bars: int) -> np.recarray:
+        """Next `n_bars` bars, continuing the previous ones."""
+        rngs = self._rngs
+
+        # Volatility of each bar: clustering, regime and normalization to the mean volatility
+        volatility = np.full(n_bars, self.volatility)
+        if self.vol_of_vol > 0:
+            shocks = rngs["volatility"].normal(0, self.vol_of_vol, n_bars)
+            log_volatility = ar1_filter(shocks, self.clustering, self._log_volatility)
+            self._log_volatility = log_volatility[-1]
+            variance = self.vol_of_vol ** 2 / (1 - self.clustering ** 2)
+            volatility *= np.exp(log_volatility - variance / 2)
+
+        regimes = self.regimes[self._next_regimes(n_bars)]
+        volatility *= regimes[:, 1]
+
+        returns = self.drift + regimes[:, 0] - volatility ** 2 / 2 + volatility * rngs["returns"].standard_normal(n_bars)
+        if self.jump_intensity > 0:
+            n_jumps = rngs["jump_counts"].poisson(self.jump_intensity, n_bars)
+            returns += self.jump_scale * self.volatility * np.sqrt(n_jumps) * rngs["jump_sizes"].standard_normal(n_bars)
+
+        log_closes = self._log_price + np.cumsum(returns)
+        log_opens = np.empty(n_bars)
+        log_opens[0] = self._log_price
+        log_opens[1:] = log_closes[:-1]
+        self._log_price = log_closes[-1]
+
+        # Max and min of a brownian bridge from 0 to the return of the bar
+        wicks = -2 * volatility[:, None] ** 2 * np.log1p(-rngs["wicks"].random((n_bars, 2)))
+        log_highs = log_opens + (returns + np.sqrt(returns ** 2 + wicks[:, 0])) / 2
+        log_lows = log_opens + (returns - np.sqrt(returns ** 2 + wicks[:, 1])) / 2
+
+        # Prices rounded to the digits keep their order as rounding is monotonic
+        rates = np.empty(n_bars, dtype=RatesDtype).view(np.recarray)
+        rates.time = self._times(n_bars)
+        for name, log_prices in (("open", log_opens), ("high", log_highs), ("low", log_lows), ("close", log_closes)):
+            rates[name] = np.round(np.exp(log_prices) / self.point) * self.point
+
+        activity = volatility / self.volatility
+        rates.spread = np.maximum(1, np.rint(self.spread * np.sqrt(activity) * rngs["spread"].gamma(16., 1 / 16., n_bars)))
+        rates.tick_volume = rngs["volume"].poisson(self.tick_volume * activity) + 1
+        rates.real_volume = 0
+
+        self._n_bars += n_bars
+        return rates
+
+    def chunks(self, n_bars: int, chunk_size: int = 1_000_000) -> Generator[np.recarray, None, None]:
+        """Generates `n_bars` bars in chunks of `chunk_size`, i.e. for histories that don't fit in memory."""
+        for start in range(0, n_bars, chunk_size):
+            yield self.generate(min(chunk_size, n_bars - start))
+
+
+def generate_rates(n_bars: int, model: str = "gbm", seed: int = None, **kwargs) -> np.recarray:
+    """`n_bars` synthetic rates of a new MarketGenerator. See MarketGenerator for the arguments."""
+    return MarketGenerator(model, seed=seed, **kwargs).generate(n_bars)
+
 
 def get_dummy_data():
+    from sklearn.datasets import make_regression
+
     # Generate some random data
     X, y = make_regression(n_samples=70, n_features=1,
                            noise=10, random_state=0)
@@ -13,6 +256,7 @@ def get_dummy_data():
 
 
 def get_dummy_classification_data():
+    from pandas import DataFrame, Series
 
     X = DataFrame({'feature1': [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11],
                    'feature2': [2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22],
@@ -0,0 +1,401 @@
+import numpy as np
+
+from datatools.custom import SlidingBuffer, get_recarray
+
+BarKinds = ("time", "tick", "volume", "range")
+BarNames = ["time", "open", "high", "low", "close", "tick_volume", "spread", "real_volume"]
+
+
+def _tick_arrays(ticks: np.recarray, price: str) -> tuple:
+    # Milliseconds time, traded price, bid-ask spread and volume of each tick
+    names = ticks.dtype.names
+    time_msc = ticks.time_msc if "time_msc" in names else ticks.time * 1000
+    spreads = ticks.ask - ticks.bid if "ask" in names and "bid" in names else np.zeros(ticks.shape[0])
+    volumes = ticks.volume_real if "volume_real" in names else np.zeros(ticks.shape[0])
+    return np.asarray(time_msc, dtype=np.int64), ticks[price].astype(np.float64), spreads, volumes
+
+
+def _range_starts(prices: np.ndarray, size: float, chunk_size: int = 4096) -> np.ndarray:
+    # A range bar closes on the first tick that makes its high - low reach size.
+    # Each bar is searched with running extremes over a chunk of ticks
+    n = prices.shape[0]
+    starts = []
+    start = 0
+    while start < n:
+        starts.append(start)
+        end = min(start + chunk_size, n)
+        while True:
+            window = prices[start:end]
+            ranges = np.maximum.accumulate(window) - np.minimum.accumulate(window)
+            closed = np.flatnonzero(ranges >= size)
+            if closed.shape[0] or end == n:
+                break
+            end = min(end + chunk_size, n)
+        start = start + closed[0] + 1 if closed.shape[0] else n
+    return np.asarray(starts, dtype=np.int64)
+
+
+def get_bar_starts(ticks: np.recarray, kind: str = "time", size: float = 60, price: str = "bid") -> np.ndarray:
+    """Index of the first tick of each bar.
+
+    Args:
+        ticks (np.recarray): Ticks as returned by Mt5Session.get_ticks.
+        kind (str, optional): Bar definition. One of BarKinds. Defaults to "time".
+        size (float, optional): Seconds per bar for "time", ticks per bar for "tick",
+            traded volume per bar for "volume" and high - low per bar for "range". Defaults to 60.
+        price (str, optional): Tick field used as price. Defaults to "bid".
+
+    Returns:
+        np.ndarray: Start indexes, the first one is always 0.
+    """
+    if size <= 0:
+        raise ValueError(f"{size=} should be greater than 0")
+
+    time_msc, prices, _, volumes = _tick_arrays(ticks, price)
+    n = prices.shape[0]
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if kind == "time":
+        bins = time_msc // int(size * 1000)
+    elif kind == "tick":
+        return np.arange(0, n, int(size))
+    elif kind == "volume":
+        # The tick that reaches the volume size closes the bar
+        bins = (np.cumsum(volumes) - volumes) // size
+    elif kind == "range":
+        return _range_starts(prices, size)
+    else:
+        raise ValueError(f"{kind=} not supported. Must be {BarKinds}")
+
+    return np.flatnonzero(np.diff(bins, prepend=bins[0] - 1))
+
+
+def aggregate_ticks(
+    ticks: np.recarray,
+    kind: str = "time",
+    size: float = 60,
+    price: str = "bid",
+    point: float = None,
+) -> np.recarray:
+    """Builds OHLCV bars from a tick history with vectorized binning.
+
+    The output has the same fields as the rates of Mt5Session.get_candles, so
+    strategies can run on custom bars. The last bar may still be incomplete.
+
+    Args:
+        ticks (np.recarray): Ticks as returned by Mt5Session.get_ticks.
+        kind (str, optional): Bar definition. One of BarKinds. Defaults to "time".
+        size (float, optional): Size of each bar as per to the kind. Defaults to 60.
+        price (str, optional): Tick field used as price. Defaults to "bid".
+        point (float, optional): Symbol point. If given, spread is in points as
+            in MT5 rates. Otherwise, it is in price units. Defaults to None.
+
+    Returns:
+        np.recarray: Bars with time (seconds), open, high, low, close, tick_volume, spread and real_volume.
+
+    Example:
+        >>> ticks = session.get_ticks("EURUSD", 100000)
+        >>> candles = aggregate_ticks(ticks, "range", 0.0005)
+    """
+    starts = get_bar_starts(ticks, kind, size, price)
+    time_msc, prices, spreads, volumes = _tick_arrays(ticks, price)
+    ends = np.append(starts[1:], prices.shape[0]) - 1
+
+    if kind == "time":
+        times = time_msc[starts] // int(size * 1000) * int(size)
+    else:
+        times = time_msc[starts] // 1000
+
+    # Maximum spread of each bar, as reported by the terminal
+    spread = np.maximum.reduceat(spreads, starts) if starts.shape[0] else spreads[:0]
+    if point is not None:
+        spread = np.rint(spread / point).astype(np.int64)
+
+    return get_recarray([
+        times,
+        prices[starts],
+        np.maximum.reduceat(prices, starts) if starts.shape[0] else prices[:0],
+        np.minimum.reduceat(prices, starts) if starts.shape[0] else prices[:0],
+        prices[ends],
+        ends - starts + 1,
+        spread,
+        np.add.reduceat(volumes, starts) if starts.shape[0] else volumes[:0]],
+        names=BarNames)
+
+
+class TickAggregator:
+    """Incremental version of aggregate_ticks for live ticks. Each tick is O(1).
+
+    Tick, volume and range bars are closed by the tick that completes them. Time
+    bars are closed by the first tick of the next period, or by `flush`.
+
+    Args:
+        kind (str, optional): Bar definition. One of BarKinds. Defaults to "time".
+        size (float, optional): Size of each bar as per to the kind. Defaults to 60.
+        price (str, optional): Tick field used as price. Defaults to "bid".
+        point (float, optional): Symbol point to report spread in points. Defaults to None.
+
+    Example:
+        >>> aggregator = TickAggregator("tick", 500)
+        >>> for tick in session.get_ticks("EURUSD", 1000):
+        ...     bar = aggregator.update(tick)
+        ...     if bar is not None:
+        ...         strategy.update_data(bar)
+    """
+
+    def __init__(self, kind: str = "time", size: float = 60, price: str = "bid", point: float = None) -> None:
+        if kind not in BarKinds:
+            raise ValueError(f"{kind=} not supported. Must be {BarKinds}")
+        if size <= 0:
+            raise ValueError(f"{size=} should be greater than 0")
+
+        self.kind = kind
+        self.size = size
+        self.price = price
+        self.point = point
+        self._bar = None
+        self._cum_volume = 0.
+
+    @property
+    def current(self) -> np.recarray:
+        """Bar in progress as a single row recarray, or None if there are no ticks yet."""
+        if self._bar is None:
+            return None
+        time, open_, high, low, close, n_ticks, spread, volume = self._bar
+        if self.point is not None:
+            spread = int(round(spread / self.point))
+        return get_recarray(
+            [[time], [open_], [high], [low], [close], [n_ticks], [spread], [volume]],
+            names=BarNames)
+
+    def flush(self) -> np.recarray:
+        """Closes the bar in progress and returns it."""
+        bar = self.current
+        self._bar = None
+        return bar
+
+    def update(self, tick: np.record) -> np.recarray:
+        """Adds a tick to the bar in progress.
+
+        Returns:
+            np.recarray: Single row recarray with the bar closed by this tick, or None.
+        """
+        names = tick.dtype.names
+        time_msc = int(tick.time_msc) if "time_msc" in names else int(tick.time) * 1000
+        price = float(tick[self.price])
+        spread = float(tick.ask - tick.bid) if "ask" in names and "bid" in names else 0.
+        volume = float(tick.volume_real) if "volume_real" in names else 0.
+
+        closed = None
+        if self.kind == "time":
+            period = int(self.size * 1000)
+            time = time_msc // period * int(self.size)
+            if self._bar is not None and self._bar[0] != time:
+                closed = self.flush()
+        else:
+            time = time_msc // 1000
+
+        if self._bar is None:
+            self._bar = [time, price, price, price, price, 1, spread, volume]
+        else:
+            bar = self._bar
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += 1
+            bar[6] = max(bar[6], spread)
+            bar[7] += volume
+
+        # Bars closed by the tick that completes them
+        bar = self._bar
+        if self.kind == "tick" and bar[5] >= self.size:
+            closed = self.flush()
+        elif self.kind == "volume":
+            volume_bin = self._cum_volume // self.size
+            self._cum_volume += volume
+            if self._cum_volume // self.size > volume_bin:
+                closed = self.flush()
+        elif self.kind == "range" and bar[2] - bar[3] >= self.size:
+            closed = self.flush()
+        return closed
+
+
+TimeframeSeconds = {
+    "M1": 60, "M2": 120, "M3": 180, "M4": 240, "M5": 300, "M6": 360, "M10": 600,
+    "M12": 720, "M15": 900, "M20": 1200, "M30": 1800, "H1": 3600, "H2": 7200,
+    "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800, "H12": 43200,
+    "D1": 86400, "W1": 604800, "MN1": None,
+}
+# Weekly bars open on Sunday. The unix epoch was a Thursday
+_WeekOffset = 3 * 86400
+
+
+def get_bucket_times(times: np.ndarray, timeframe: str) -> np.ndarray:
+    """Open time (seconds) of the `timeframe` bar that contains each time."""
+    if timeframe not in TimeframeSeconds:
+        raise ValueError(f"{timeframe=} not supported. Must be one of {list(TimeframeSeconds)}")
+
+    times = np.asarray(times, dtype=np.int64)
+    if timeframe == "MN1":
+        months = times.astype("datetime64[s]").astype("datetime64[M]")
+        return months.astype("datetime64[s]").astype(np.int64)
+    elif timeframe == "W1":
+        return (times - _WeekOffset) // TimeframeSeconds["W1"] * TimeframeSeconds["W1"] + _WeekOffset
+    return times // TimeframeSeconds[timeframe] * TimeframeSeconds[timeframe]
+
+
+def resample_candles(candles: np.recarray, timeframe: str) -> np.recarray:
+    """Aggregates candles into a higher timeframe with vectorized binning.
+
+    Args:
+        candles (np.recarray): Candles as returned by Mt5Session.get_candles.
+        timeframe (str): Higher timeframe name, i.e. "H1".
+
+    Returns:
+        np.recarray: Higher timeframe candles. The last one may still be incomplete.
+    """
+    buckets = get_bucket_times(candles.time, timeframe)
+    if buckets.shape[0] == 0:
+        return candles[:0].copy().view(np.recarray)
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], buckets.shape[0]) - 1
+
+    resampled = np.empty(starts.shape[0], dtype=candles.dtype).view(np.recarray)
+    for name in candles.dtype.names:
+        if name == "time":
+            resampled.time = buckets[starts]
+        elif name == "open":
+            resampled.open = candles.open[starts]
+        elif name == "close":
+            resampled.close = candles.close[ends]
+        elif name in ("high", "spread"):
+            resampled[name] = np.maximum.reduceat(candles[name], starts)
+        elif name == "low":
+            resampled.low = np.minimum.reduceat(candles.low, starts)
+        else:
+            resampled[name] = np.add.reduceat(candles[name], starts)
+    return resampled
+
+
+class TimeframeView:
+    """Higher timeframe candles derived from a CandleStore.
+
+    The view is materialized on first access and refreshed lazily: only the
+    last, possibly incomplete, bar and the bars of the new base candles are
+    recalculated. Bars older than the base window are dropped, but the first bar
+    keeps the values of base candles that already left the window.
+
+    Args:
+        store (CandleStore): Base candle store.
+        timeframe (str): Higher timeframe name, i.e. "H1".
+    """
+
+    def __init__(self, store: "CandleStore", timeframe: str) -> None:
+        self.store = store
+        self.timeframe = timeframe
+        self._bars = store.candles[:0].copy().view(np.recarray)
+        self._seen = 0
+        self._last_count = 0
+
+    def _refresh(self) -> None:
+        n_new = self.store.total - self._seen
+        if n_new == 0:
+            return
+
+        base = self.store.candles
+        n_tail = n_new + self._last_count
+        if n_tail > base.shape[0]:
+            # The base window has moved past the view. Rebuild from scratch
+            n_tail = base.shape[0]
+            bars = self._bars[:0]
+        else:
+            bars = self._bars[:self._bars.shape[0] - (self._last_count > 0)]
+
+        tail = base[-n_tail:]
+        resampled = resample_candles(tail, self.timeframe)
+        buckets = get_bucket_times(tail.time[-1:], self.timeframe)
+        self._last_count = int(np.count_nonzero(get_bucket_times(tail.time, self.timeframe) == buckets[0]))
+
+        # Drop the bars older than the base window
+        first_bucket = get_bucket_times(base.time[:1], self.timeframe)[0]
+        bars = np.concatenate((bars, resampled)).view(np.recarray)
+        self._bars = bars[np.searchsorted(bars.time, first_bucket):]
+        self._seen = self.store.total
+
+    @property
+    def candles(self) -> np.recarray:
+        """Higher timeframe candles. The last one is incomplete until its period ends."""
+        self._refresh()
+        return self._bars
+
+    @property
+    def index(self) -> np.ndarray:
+        """Index of the higher timeframe candle that contains each base candle."""
+        candles = self.candles
+        buckets = get_bucket_times(self.store.candles.time, self.timeframe)
+        return np.searchsorted(candles.time, buckets)
+
+    @property
+    def closed_index(self) -> np.ndarray:
+        """Index of the last higher timeframe candle already closed at each base candle.
+        -1 if none. Use it to read higher timeframe values without lookahead.
+        """
+        base = self.store.candles
+        index = self.index
+        closing = np.zeros(index.shape[0], dtype=bool)
+        closing[:-1] = index[1:] != index[:-1]
+        # The newest base candle closes its bar when it reaches the end of the period
+        if self.timeframe != "MN1" and base.shape[0]:
+            period_end = get_bucket_times(base.time[-1:], self.timeframe)[0] + TimeframeSeconds[self.timeframe]
+            closing[-1] = base.time[-1] + self.store.seconds >= period_end
+        return np.where(closing, index, index - 1)
+
+
+class CandleStore:
+    """Single base candle series from which higher timeframes are derived.
+
+    The base candles are kept in a preallocated SlidingBuffer, so one broker
+    fetch per symbol feeds every timeframe used by a strategy. Views share the
+    same base and map their bars back to the base candles.
+
+    Args:
+        candles (np.recarray): Initial base candles as returned by Mt5Session.get_candles.
+        timeframe (str): Base timeframe name, i.e. "M5".
+        capacity (int, optional): Number of base candles kept. Defaults to the initial length.
+
+    Example:
+        >>> store = CandleStore(session.get_candles("EURUSD", "M5", 5000), "M5")
+        >>> h1 = store.view("H1")
+        >>> trend = SMA(h1.candles.close, 20)[h1.closed_index]
+    """
+
+    def __init__(self, candles: np.recarray, timeframe: str, capacity: int = None) -> None:
+        if TimeframeSeconds.get(timeframe) is None:
+            raise ValueError(f"{timeframe=} is not a valid base timeframe")
+
+        self.timeframe = timeframe
+        self.seconds = TimeframeSeconds[timeframe]
+        self.capacity = capacity or candles.shape[0]
+        self._buffer = SlidingBuffer(self.capacity, (), candles.dtype, 0)
+        self._buffer.extend(candles)
+        self.total = candles.shape[0]
+        self._views = {}
+
+    @property
+    def candles(self) -> np.recarray:
+        return self._buffer.values.view(np.recarray)
+
+    def update(self, new_candles: np.recarray) -> None:
+        """Appends the candles newer than the last one stored."""
+        if self.total and len(self._buffer):
+            new_candles = new_candles[new_candles.time > self._buffer.values[-1]["time"]]
+        self._buffer.extend(new_candles)
+        self.total += new_candles.shape[0]
+
+    def view(self, timeframe: str) -> TimeframeView:
+        if timeframe == self.timeframe:
+            raise ValueError(f"{timeframe=} is the base timeframe. Use candles instead")
+        if timeframe not in self._views:
+            self._views[timeframe] = TimeframeView(self, timeframe)
+        return self._views[timeframe]
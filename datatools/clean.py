@@ -0,0 +1,286 @@
+"""Cleaning of raw rates before they are used by the strategies or the backtests.
+
+The csv exports of data/raw have local timestamps with offsets, weekend gaps,
+missing and duplicated bars. RatesCleaner sanitizes them chunk by chunk, so
+multi-year M1 histories are cleaned once at ingestion with bounded memory:
+
+- times are converted to UTC epoch seconds and floored to the timeframe,
+- duplicated bars keep their last row and bars older than the previous ones are dropped,
+- bars with non finite or non positive open/close are dropped,
+- high and low are repaired to contain open and close,
+- returns far beyond the rolling volatility are flagged as outliers,
+- gaps of up to `max_gap_secs` are filled with flat bars at the previous close.
+  Longer gaps (weekends, holidays) are kept.
+
+Example:
+    >>> stats = clean_csv("data/raw/eurusd_10k.csv", "data/clean/eurusd_10k.npy", timeframe_secs=180)
+    >>> rates = np.load("data/clean/eurusd_10k.npy", mmap_mode="r").view(np.recarray)
+    >>> outliers = rates[(rates.quality & CleanFlags.OUTLIER) > 0]
+"""
+import os
+from enum import IntFlag
+from typing import Generator, Iterable
+
+import numpy as np
+
+from datatools.augmentation import RatesDtype
+from datatools.custom import rolling_reduce
+
+PriceNames = ("open", "high", "low", "close")
+
+
+class CleanFlags(IntFlag):
+    FILLED = 1
+    REPAIRED = 2
+    OUTLIER = 4
+
+
+# Rates plus the CleanFlags of each bar
+CleanRatesDtype = np.dtype(RatesDtype.descr + [("quality", np.uint8)])
+
+
+def to_epoch(times) -> np.ndarray:
+    """UTC epoch seconds of integer epochs, datetime64 values or date strings with
+    offsets, i.e. "2023-04-18 20:45:00-05:00". Naive strings are taken as UTC.
+    """
+    times = np.asarray(times)
+    if times.dtype.kind in "iu":
+        return times.astype(np.int64)
+    if times.dtype.kind == "f":
+        return np.floor(times).astype(np.int64)
+    if times.dtype.kind == "M":
+        return times.astype("datetime64[s]").astype(np.int64)
+
+    from pandas import to_datetime
+    return to_datetime(times, utc=True, format="ISO8601").values.astype("datetime64[s]").astype(np.int64)
+
+
+def read_rates(path: str, chunk_size: int = 1_000_000) -> Generator[np.recarray, None, None]:
+    """Rates of a csv in chunks of `chunk_size` rows, with RatesDtype and UTC epoch times.
+    Columns missing in the csv are left as zeros and "volume" is read as tick_volume.
+    """
+    from pandas import read_csv
+
+    for df_rates in read_csv(path, chunksize=chunk_size):
+        if "tick_volume" not in df_rates and "volume" in df_rates:
+            df_rates["tick_volume"] = df_rates["volume"]
+
+        rates = np.zeros(df_rates.shape[0], dtype=RatesDtype).view(np.recarray)
+        rates.time = to_epoch(df_rates["time"].values)
+        for name in RatesDtype.names[1:]:
+            if name in df_rates:
+                rates[name] = df_rates[name].values
+        yield rates
+
+
+class RatesCleaner:
+    """Streaming cleaner of rates. Every chunk continues the previous ones: the last
+    bar and the recent returns are kept to fill gaps, drop stale bars and flag
+    outliers across chunk boundaries.
+
+    Args:
+        timeframe_secs (int, optional): Seconds between bars. Defaults to 60 (M1).
+        max_gap_secs (int, optional): Longest gap that is filled with bars. Longer ones, like
+            weekends, are kept. 0 disables the filling. Defaults to 14400 (4 hours).
+        outlier_threshold (float, optional): Returns above this many rolling standard deviations
+            are flagged as outliers. Defaults to 10.
+        outlier_window (int, optional): Returns of the rolling standard deviation. Defaults to 500.
+
+    Attributes:
+        stats (dict): Rows read and bars dropped, repaired, flagged and filled so far.
+    """
+
+    def __init__(
+        self,
+        timeframe_secs: int = 60,
+        max_gap_secs: int = 4 * 3600,
+        outlier_threshold: float = 10.,
+        outlier_window: int = 500,
+    ) -> None:
+        if timeframe_secs <= 0:
+            raise ValueError(f"{timeframe_secs=} should be greater than 0")
+        self.timeframe_secs = int(timeframe_secs)
+        self.max_gap_secs = max_gap_secs
+        self.outlier_threshold = outlier_threshold
+        self.outlier_window = outlier_window
+        self.stats = dict.fromkeys(
+            ("rows", "invalid", "misaligned", "duplicates", "unordered", "repaired", "outliers", "filled", "gaps"), 0)
+
+        # Last bar of the previous chunks and their latest returns
+        self._last = None
+        self._returns = np.empty(0)
+
+    def _deduplicate(self, rates: np.recarray) -> np.recarray:
+        times = rates.time
+        if np.any(times[1:] < times[:-1]):
+            rates = rates[np.argsort(times, kind="stable")]
+            times = rates.time
+
+        # The last row of each time wins
+        last = np.append(times[1:] != times[:-1], True)
+        n_duplicates = int(last.shape[0] - last.sum())
+        if n_duplicates:
+            self.stats["duplicates"] += n_duplicates
+            rates = rates[last]
+
+        if self._last is not None:
+            newer = rates.time > self._last.time
+            self.stats["unordered"] += int(newer.shape[0] - newer.sum())
+            rates = rates[newer]
+        return rates
+
+    def _repair(self, rates: np.recarray, flags: np.ndarray) -> None:
+        highs = np.fmax(np.fmax(rates.open, rates.close), rates.high)
+        lows = np.fmin(np.fmin(rates.open, rates.close), rates.low)
+        repaired = (highs != rates.high) | (lows != rates.low)
+        rates.high, rates.low = highs, lows
+        flags[repaired] |= np.uint8(CleanFlags.REPAIRED)
+        self.stats["repaired"] += int(repaired.sum())
+
+    def _flag_outliers(self, rates: np.recarray, flags: np.ndarray) -> None:
+        closes = rates.close if self._last is None else np.append(self._last.close, rates.close)
+        times = rates.time if self._last is None else np.append(self._last.time, rates.time)
+
+        # Returns across unfilled gaps (weekends) are neither tested nor used for the deviation
+        tested = np.diff(times) <= self.max_gap_secs + self.timeframe_secs
+        returns = np.diff(np.log(closes))[tested]
+
+        window = self.outlier_window
+        history = np.concatenate([self._returns, returns])
+        n_previous = self._returns.shape[0]
+        self._returns = history[-window:]
+        if history.shape[0] <= window:
+            return
+
+        # Deviation of the window before each return
+        deviations = np.append(np.nan, rolling_reduce(history, window, "std")[:-1])[n_previous:]
+        outliers = np.abs(returns) > self.outlier_threshold * deviations
+
+        positions = np.flatnonzero(tested)[outliers] + (1 if self._last is None else 0)
+        flags[positions] |= np.uint8(CleanFlags.OUTLIER)
+        self.stats["outliers"] += int(outliers.sum())
+
+    def _fill(self, rates: np.recarray, flags: np.ndarray) -> np.recarray:
+        n = rates.shape[0]
+        times = rates.time if self._last is None else np.append(self._last.time, rates.time)
+        missing = np.diff(times) // self.timeframe_secs - 1
+        if self._last is None:
+            missing = np.append(0, missing)
+
+        unfilled = missing > self.max_gap_secs // self.timeframe_secs
+        self.stats["gaps"] += int(unfilled.sum())
+        missing[unfilled] = 0
+        n_filled = int(missing.sum())
+
+        cleaned = np.zeros(n + n_filled, dtype=CleanRatesDtype).view(np.recarray)
+        positions = np.arange(n) + np.cumsum(missing)
+        for name in RatesDtype.names:
+            cleaned[name][positions] = rates[name]
+        cleaned.quality[positions] = flags
+        if n_filled == 0:
+            return cleaned
+
+        # Filled bars are flat at the close of the bar before their gap
+        gaps = np.flatnonzero(missing)
+        lengths = missing[gaps]
+        bars = rates if self._last is None else np.concatenate([self._last, rates]).view(np.recarray)
+        previous_bars = bars[np.repeat(gaps - (1 if self._last is None else 0), lengths)]
+        steps = np.arange(1, n_filled + 1) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        filled = np.delete(np.arange(cleaned.shape[0]), positions)
+
+        cleaned.time[filled] = previous_bars.time + steps * self.timeframe_secs
+        for name in PriceNames:
+            cleaned[name][filled] = previous_bars.close
+        cleaned.spread[filled] = previous_bars.spread
+        cleaned.quality[filled] = CleanFlags.FILLED
+        self.stats["filled"] += n_filled
+        return cleaned
+
+    def clean(self, rates: np.recarray) -> np.recarray:
+        """Cleans the next chunk of rates.
+
+        Args:
+            rates (np.recarray): Rates with the fields of RatesDtype. Times can be epoch
+                seconds, datetime64 or date strings. Rows don't need to be sorted.
+
+        Returns:
+            np.recarray: Cleaned bars with CleanRatesDtype, sorted by time and after the
+                bars of the previous chunks.
+        """
+        self.stats["rows"] += rates.shape[0]
+        chunk = np.zeros(rates.shape[0], dtype=RatesDtype).view(np.recarray)
+        for name in RatesDtype.names[1:]:
+            if name in rates.dtype.names:
+                chunk[name] = rates[name]
+        times = to_epoch(rates.time)
+        chunk.time = times - times % self.timeframe_secs
+        self.stats["misaligned"] += int(np.count_nonzero(chunk.time != times))
+
+        valid = np.ones(chunk.shape[0], dtype=bool)
+        for name in ("open", "close"):
+            valid &= np.isfinite(chunk[name]) & (chunk[name] > 0)
+        n_invalid = int(valid.shape[0] - valid.sum())
+        if n_invalid:
+            self.stats["invalid"] += n_invalid
+            chunk = chunk[valid]
+
+        chunk = self._deduplicate(chunk)
+        if chunk.shape[0] == 0:
+            return np.zeros(0, dtype=CleanRatesDtype).view(np.recarray)
+
+        flags = np.zeros(chunk.shape[0], dtype=np.uint8)
+        self._repair(chunk, flags)
+        self._flag_outliers(chunk, flags)
+        cleaned = self._fill(chunk, flags)
+        self._last = chunk[-1:].copy()
+        return cleaned
+
+    def stream(self, chunks: Iterable[np.recarray]) -> Generator[np.recarray, None, None]:
+        """Cleans every chunk of `chunks`, i.e. the ones of read_rates."""
+        for rates in chunks:
+            cleaned = self.clean(rates)
+            if cleaned.shape[0]:
+                yield cleaned
+
+
+def clean_rates(rates: np.recarray, timeframe_secs: int = 60, **kwargs) -> np.recarray:
+    """Cleans rates that fit in memory. See RatesCleaner for the arguments."""
+    return RatesCleaner(timeframe_secs, **kwargs).clean(rates)
+
+
+def clean_csv(
+    path: str,
+    output: str,
+    timeframe_secs: int = 60,
+    chunk_size: int = 1_000_000,
+    **kwargs,
+) -> dict:
+    """Cleans the rates of a csv into a .npy file of CleanRatesDtype, chunk by chunk.
+    The output can be memory-mapped with np.load(output, mmap_mode="r").
+
+    Args:
+        path (str): Csv with the columns of RatesDtype, i.e. data/raw/eurusd_10k.csv.
+        output (str): .npy file of the cleaned rates.
+        timeframe_secs (int, optional): Seconds between bars. Defaults to 60 (M1).
+        chunk_size (int, optional): Rows read at once. Defaults to 1_000_000.
+        **kwargs: Other arguments of RatesCleaner.
+
+    Returns:
+        dict: Stats of the cleaner.
+    """
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    cleaner = RatesCleaner(timeframe_secs, **kwargs)
+    header = {"descr": np.lib.format.dtype_to_descr(CleanRatesDtype), "fortran_order": False, "shape": (0,)}
+    n_bars = 0
+    with open(output, "wb") as file:
+        # The header is padded for the shape to be rewritten in place at the end
+        np.lib.format.write_array_header_1_0(file, header)
+        for cleaned in cleaner.stream(read_rates(path, chunk_size)):
+            file.write(cleaned.tobytes())
+            n_bars += cleaned.shape[0]
+        file.seek(0)
+        np.lib.format.write_array_header_1_0(file, {**header, "shape": (n_bars,)})
+    return cleaner.stats
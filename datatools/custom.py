@@ -6,8 +6,11 @@ Window operations
 
 - :func:`numpy_ext.expanding`
 - :func:`numpy_ext.expanding_apply`
+- :func:`numpy_ext.expanding_reduce`
 - :func:`numpy_ext.rolling`
 - :func:`numpy_ext.rolling_apply`
+- :func:`numpy_ext.rolling_reduce`
+- :func:`numpy_ext.rolling_dot`
 
 Operations with nans
 --------------------
@@ -27,12 +30,16 @@ Functions
 ---------
 
 """
+import os
+import shutil
+from collections import deque
 from functools import partial
-from joblib import Parallel, delayed
+from tempfile import mkdtemp
 from typing import Callable, Any, Union, Generator, Tuple, List
 
 import numpy as np
 from numpy.lib.recfunctions import merge_arrays, stack_arrays
+from numpy.lib.stride_tricks import sliding_window_view
 from numpy.core.records import fromarrays as get_recarray
 
 
@@ -115,6 +122,250 @@ def concat_recarrays(
         flatten=True)
 
 
+class SlidingBuffer:
+    """Preallocated buffer that keeps the last `capacity` rows of a stream
+    contiguous in memory.
+
+    Rows are written at the end of a backing array twice as large as the
+    capacity. When the backing array is full, the last `capacity - 1` rows are
+    moved to the front, so appends are amortized O(1) and `values` is always a
+    zero-copy view with the oldest row first.
+
+    Args:
+        capacity (int): Maximum number of rows exposed by the buffer.
+        shape (tuple, optional): Shape of each row. Defaults to () for scalars.
+        dtype (data-type, optional): Type of the stored values. Defaults to np.float64.
+        fill_value (Any, optional): Initial value of the backing array. Defaults to np.nan.
+
+    Example:
+        >>> buffer = SlidingBuffer(3)
+        >>> for value in range(5):
+        ...     buffer.append(value)
+        >>> buffer.values
+        array([2., 3., 4.])
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        shape: Tuple[int, ...] = (),
+        dtype=np.float64,
+        fill_value: Any = np.nan,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError(f"{capacity=} should be greater than 0")
+
+        self.capacity = int(capacity)
+        self._data = np.full((2 * self.capacity, *shape), fill_value, dtype=dtype)
+        self._end = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        """Zero-copy view of the stored rows, from oldest to newest."""
+        return self._data[self._end - self._size:self._end]
+
+    @property
+    def is_full(self) -> bool:
+        return self._size == self.capacity
+
+    def _compact(self) -> None:
+        # Move the rows that survive the next append to the front of the backing array
+        keep = self.capacity - 1
+        self._data[:keep] = self._data[self._end - keep:self._end]
+        self._end = keep
+        self._size = min(self._size, keep)
+
+    def append(self, row: Any) -> None:
+        """Write a new row at the end of the buffer dropping the oldest one if it is full."""
+        if self._end == self._data.shape[0]:
+            self._compact()
+        self._data[self._end] = row
+        self._end += 1
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, rows: np.ndarray) -> None:
+        """Write many rows at once. Only the last `capacity` rows are kept."""
+        rows = np.asarray(rows)[-self.capacity:]
+        n = rows.shape[0]
+        if self._end + n > self._data.shape[0]:
+            keep = min(self._size, self.capacity - n)
+            self._data[:keep] = self._data[self._end - keep:self._end]
+            self._end = keep
+            self._size = keep
+        self._data[self._end:self._end + n] = rows
+        self._end += n
+        self._size = min(self._size + n, self.capacity)
+
+    def clear(self) -> None:
+        self._end = 0
+        self._size = 0
+
+
+class SlidingExtremum:
+    """Maximum or minimum of the last `window` values of a stream.
+
+    A monotonic deque keeps the candidates to be the extremum, so each update
+    is amortized O(1) whatever the window length. On ties, the newest value is
+    the extremum, as in `sliding_extremum`.
+
+    Args:
+        window (int): Number of values in the window.
+        mode (str, optional): "max" or "min". Defaults to "max".
+
+    Example:
+        >>> highest = SlidingExtremum(3)
+        >>> for value in [1, 3, 2, 1, 0]:
+        ...     highest.update(value)
+        >>> highest.value, highest.argindex, highest.age
+        (2, 2, 2)
+    """
+
+    def __init__(self, window: int, mode: str = "max") -> None:
+        if window < 1:
+            raise ValueError(f"{window=} should be greater than 0")
+        if mode not in ("max", "min"):
+            raise ValueError(f"{mode=} not supported. Must be ['max', 'min']")
+
+        self.window = window
+        self.mode = mode
+        self._sign = 1 if mode == "max" else -1
+        self.reset()
+
+    def reset(self) -> None:
+        self._deque = deque()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    @property
+    def is_full(self) -> bool:
+        return self._count >= self.window
+
+    @property
+    def value(self) -> Number:
+        """Extremum of the window. NaN if there are no values yet."""
+        if not self._deque:
+            return np.nan
+        return self._sign * self._deque[0][1]
+
+    @property
+    def argindex(self) -> int:
+        """Position of the extremum in the stream, counting from the first update."""
+        return self._deque[0][0] if self._deque else -1
+
+    @property
+    def age(self) -> int:
+        """Number of updates since the extremum."""
+        return self._count - 1 - self.argindex if self._deque else -1
+
+    def update(self, value: Number) -> Number:
+        """Push a new value. The oldest one leaves the window once it is full."""
+        signed = self._sign * value
+        while self._deque and self._deque[-1][1] <= signed:
+            self._deque.pop()
+        self._deque.append((self._count, signed))
+        self._count += 1
+
+        if self._deque[0][0] <= self._count - 1 - self.window:
+            self._deque.popleft()
+        return self.value
+
+    def extend(self, values: np.ndarray) -> Number:
+        # With `window` new values or more the previous ones leave the window, and
+        # only the last `window` new values can still be the extremum
+        if len(values) >= self.window:
+            self._count += len(values) - self.window
+            self._deque.clear()
+            values = values[len(values) - self.window:]
+        for value in values:
+            self.update(value)
+        return self.value
+
+
+def sliding_extremum(
+    array: np.ndarray,
+    window: int,
+    mode: str = "max",
+    return_index: bool = False,
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Rolling maximum or minimum with the van Herk/Gil-Werman algorithm: running
+    extremes inside blocks of `window` values, from the left and from the right,
+    so every window is the combination of two precalculated values. O(n) whatever
+    the window and fully vectorized. The input should not contain nans.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Input 1-D array.
+    window : int
+        Window size.
+    mode : str, optional
+        "max" or "min". Default is "max".
+    return_index : bool, optional
+        If True, also return the index of the extremum of each window. On ties,
+        the newest one. Default is False.
+
+    Returns
+    -------
+    np.ndarray or tuple[np.ndarray, np.ndarray]
+        Extremes with the first (window-1) values as nans, as talib MAX/MIN,
+        and indexes with -1 in those positions.
+
+    Examples
+    --------
+    >>> sliding_extremum(np.array([1., 3., 2., 1., 0.]), 3)
+    array([nan, nan,  3.,  3.,  2.])
+    """
+    if mode not in ("max", "min"):
+        raise ValueError(f"{mode=} not supported. Must be ['max', 'min']")
+
+    window = int(window)
+    sign = 1. if mode == "max" else -1.
+    values = sign * np.asarray(array, dtype=np.float64)
+    n = values.shape[0]
+
+    result = nans(n)
+    indexes = np.full(n, -1)
+    if n < window:
+        return (result, indexes) if return_index else result
+
+    # Split in blocks of window values. Padding is never the extremum
+    n_blocks = -(-n // window)
+    padded = np.full(n_blocks * window, -np.inf)
+    padded[:n] = values
+    blocks = padded.reshape(n_blocks, window)
+    positions = np.arange(n_blocks * window).reshape(n_blocks, window)
+
+    # Running extremum from the start of each block. Newest index on ties
+    prefix = np.maximum.accumulate(blocks, axis=1)
+    prefix_index = np.maximum.accumulate(np.where(blocks == prefix, positions, -1), axis=1)
+
+    # Running extremum from the end of each block. Newest index on ties
+    reversed_blocks = blocks[:, ::-1]
+    suffix = np.maximum.accumulate(reversed_blocks, axis=1)
+    previous = np.hstack((np.full((n_blocks, 1), -np.inf), suffix[:, :-1]))
+    steps = np.arange(window)
+    first_seen = np.maximum.accumulate(np.where(reversed_blocks > previous, steps, -1), axis=1)
+    suffix_index = positions[:, -1:] - first_seen
+    suffix, suffix_index = suffix[:, ::-1].ravel(), suffix_index[:, ::-1].ravel()
+    prefix, prefix_index = prefix.ravel(), prefix_index.ravel()
+
+    # Window [i, i + window - 1] = suffix at i combined with prefix at i + window - 1
+    starts = np.arange(n - window + 1)
+    ends = starts + window - 1
+    use_prefix = prefix[ends] >= suffix[starts]
+    result[window - 1:] = sign * np.where(use_prefix, prefix[ends], suffix[starts])
+    indexes[window - 1:] = np.where(use_prefix, prefix_index[ends], suffix_index[starts])
+
+    return (result, indexes) if return_index else result
+
+
 def find_index(arr, value):
     if np.isin(value, arr):
         return np.searchsorted(arr, value)
@@ -315,7 +566,7 @@ def nans(shape: Union[int, Tuple[int, ...]], dtype=np.float64) -> np.ndarray:
     array(['NaT', 'NaT'], dtype=datetime64)
     """
     if np.issubdtype(dtype, np.integer):
-        dtype = np.float
+        dtype = np.float64
     arr = np.empty(shape, dtype=dtype)
     arr.fill(np.nan)
     return arr
@@ -453,6 +704,7 @@ def rolling(
     """
     Roll a fixed-width window over an array.
     The result is either a 2-D array or a generator of slices, controlled by `as_array` parameter.
+    Windows are rows of a `sliding_window_view`, so they are views of the input, not copies.
 
     Parameters
     ----------
@@ -494,14 +746,169 @@ def rolling(
     if array.size < window:
         raise ValueError('array.size should be bigger than window')
 
-    def rows_gen():
-        if not skip_na:
-            yield from (prepend_na(array[:i + 1], (window - 1) - i) for i in np.arange(window - 1))
+    if not skip_na:
+        array = prepend_na(array, window - 1)
+    windows = sliding_window_view(array, window)
 
-        starts = np.arange(array.size - (window - 1))
-        yield from (array[start:end] for start, end in zip(starts, starts + window))
+    return windows if as_array else (row for row in windows)
 
-    return np.array([row for row in rows_gen()]) if as_array else rows_gen()
+
+def _rolling_sums(array: np.ndarray, window: int) -> np.ndarray:
+    # Sum of each full window from a single cumulative sum
+    cumsum = np.cumsum(array, dtype=np.float64)
+    sums = cumsum[window - 1:].copy()
+    sums[1:] -= cumsum[:-window]
+    return sums
+
+
+def rolling_reduce(
+    array: np.ndarray,
+    window: int,
+    how: str = "mean",
+    prepend_nans: bool = True,
+) -> np.ndarray:
+    """
+    Fast path of rolling_apply for the most common reducers.
+    Sums, means and deviations use cumulative sums and are O(n) whatever the window.
+    Minimums and maximums use sliding_extremum, also O(n).
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Input 1-D array.
+    window : int
+        Window size.
+    how : str, optional
+        One of "sum", "mean", "min", "max", "std" or "var". Deviations are
+        population ones (ddof=0). Default is "mean".
+    prepend_nans : bool, optional
+        Specifies if nans should be prepended to the resulting array. Default is True.
+
+    Returns
+    -------
+    np.ndarray
+
+    Examples
+    --------
+    >>> rolling_reduce(np.array([1, 2, 3, 4, 5]), 2, "sum")
+    array([nan,  3.,  5.,  7.,  9.])
+    """
+    window = int(window)
+    if array.size < window:
+        raise ValueError('array.size should be bigger than window')
+
+    if how == "sum":
+        result = _rolling_sums(array, window)
+    elif how == "mean":
+        result = _rolling_sums(array, window) / window
+    elif how in ("std", "var"):
+        # Centered on the first value to reduce the cancellation of large sums
+        centered = np.asarray(array, dtype=np.float64) - array[0]
+        means = _rolling_sums(centered, window) / window
+        result = np.clip(_rolling_sums(centered ** 2, window) / window - means ** 2, 0, None)
+        if how == "std":
+            result = np.sqrt(result)
+    elif how in ("min", "max"):
+        result = sliding_extremum(array, window, how)
+        return result if prepend_nans else result[window - 1:]
+    else:
+        raise ValueError(f"{how=} not supported. Must be ['sum', 'mean', 'min', 'max', 'std', 'var']")
+
+    return prepend_na(result, window - 1) if prepend_nans else result
+
+
+def rolling_dot(
+    array: np.ndarray,
+    weights: np.ndarray,
+    prepend_nans: bool = True,
+    n_jobs: int = 1,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """
+    Dot product of each window of the array with a vector of weights, i.e. a
+    weighted moving average. A single matrix-vector product over a zero-copy
+    2-D window view.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Input 1-D array.
+    weights : np.ndarray
+        Weights from the oldest to the newest value of a window. The window size is its length.
+    prepend_nans : bool, optional
+        Specifies if nans should be prepended to the resulting array. Default is True.
+    n_jobs : int, optional
+        Threads used on chunks of `chunk_size` windows. Default is 1.
+    chunk_size : int, optional
+        Windows per task when n_jobs > 1. Default is 65536.
+
+    Returns
+    -------
+    np.ndarray
+
+    Examples
+    --------
+    >>> rolling_dot(np.array([1., 2., 3., 4.]), np.array([0.5, 0.5]))
+    array([nan, 1.5, 2.5, 3.5])
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    window = weights.shape[0]
+    if array.size < window:
+        raise ValueError('array.size should be bigger than window')
+
+    windows = sliding_window_view(np.asarray(array, dtype=np.float64), window)
+    if n_jobs == 1 or windows.shape[0] <= chunk_size:
+        result = windows @ weights
+    else:
+        # BLAS releases the GIL, so threads avoid copying the windows to other processes
+        result = np.empty(windows.shape[0])
+
+        def _dot_chunk(start):
+            np.dot(windows[start:start + chunk_size], weights, out=result[start:start + chunk_size])
+
+        from joblib import Parallel, delayed
+        Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_dot_chunk)(start) for start in range(0, windows.shape[0], chunk_size))
+
+    return prepend_na(result, window - 1) if prepend_nans else result
+
+
+def _apply_chunk(func, arrays, output, start, stop, window, kwargs):
+    # Windows start..stop only need the inputs start..stop + window - 1. Results
+    # are written straight into the shared output
+    views = [sliding_window_view(array[start:stop + window - 1], window) for array in arrays]
+    for i, rows in enumerate(zip(*views)):
+        output[start + i] = func(*rows, **kwargs)
+
+
+def _parallel_rolling_apply(func, window, arrays, n_jobs, chunk_size, kwargs):
+    # joblib is only imported by the parallel paths, it is slow to import
+    from joblib import Parallel, delayed, cpu_count, dump, load
+
+    n_windows = arrays[0].size - window + 1
+    if chunk_size is None:
+        # One contiguous chunk per worker
+        n_workers = cpu_count() if n_jobs < 0 else n_jobs
+        chunk_size = -(-n_windows // n_workers)
+
+    folder = mkdtemp(prefix="rolling_apply_")
+    try:
+        # Workers open the inputs and the output as memmaps instead of receiving copies
+        inputs = []
+        for i, array in enumerate(arrays):
+            path = os.path.join(folder, f"input{i}.mmap")
+            dump(np.ascontiguousarray(array), path)
+            inputs.append(load(path, mmap_mode="r"))
+        output = np.memmap(os.path.join(folder, "output.mmap"), dtype=np.float64, shape=(n_windows,), mode="w+")
+
+        Parallel(n_jobs=n_jobs)(
+            delayed(_apply_chunk)(func, inputs, output, start, min(start + chunk_size, n_windows), window, kwargs)
+            for start in range(0, n_windows, chunk_size))
+        result = np.array(output)
+        del output, inputs
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return result
 
 
 def rolling_apply(
@@ -510,6 +917,7 @@ def rolling_apply(
     *arrays: np.ndarray,
     prepend_nans: bool = True,
     n_jobs: int = 1,
+    chunk_size: int = None,
     **kwargs
 ) -> np.ndarray:
     """
@@ -518,6 +926,9 @@ def rolling_apply(
     Perform computations in parallel, optionally.
     Return a new np.ndarray with the resulting values.
 
+    For sums, means, deviations, extremes and weighted sums prefer
+    rolling_reduce and rolling_dot, which do not call a Python function per window.
+
     Parameters
     ----------
     func : Callable
@@ -530,6 +941,10 @@ def rolling_apply(
         Specifies if nans should be prepended to the resulting array
     n_jobs : int, optional
         Parallel tasks count for joblib. If 1, joblib won't be used. Default is 1.
+        Inputs are shared with the workers through memmaps and each worker fills
+        its own slice of a preallocated float64 output, so func must return a scalar.
+    chunk_size : int, optional
+        Windows per parallel task. Defaults to one contiguous chunk per worker.
     **kwargs : dict
         Input parameters (passed to func, must be named).
 
@@ -558,24 +973,18 @@ def rolling_apply(
     if len({array.size for array in arrays}) != 1:
         raise ValueError('Arrays must be the same length')
 
-    def _apply_func_to_arrays(idxs):
-        return func(*[array[idxs[0]:idxs[-1] + 1] for array in arrays], **kwargs)
-
-    array = arrays[0]
-    rolls = rolling(
-        array if len(arrays) == n_jobs == 1 else np.arange(len(array)),
-        window=window,
-        skip_na=True
-    )
+    n_windows = arrays[0].size - window + 1
+    if n_windows < 1:
+        raise ValueError('array.size should be bigger than window')
 
     if n_jobs == 1:
         if len(arrays) == 1:
-            arr = list(map(partial(func, **kwargs), rolls))
+            arr = list(map(partial(func, **kwargs), sliding_window_view(arrays[0], window)))
         else:
-            arr = list(map(_apply_func_to_arrays, rolls))
+            views = [sliding_window_view(array, window) for array in arrays]
+            arr = [func(*rows, **kwargs) for rows in zip(*views)]
     else:
-        f = delayed(_apply_func_to_arrays)
-        arr = Parallel(n_jobs=n_jobs)(f(idxs[[0, -1]]) for idxs in rolls)
+        arr = _parallel_rolling_apply(func, window, arrays, n_jobs, chunk_size, kwargs)
 
     return prepend_na(arr, n=window - 1) if prepend_nans else np.array(arr)
 
@@ -688,7 +1097,7 @@ def expanding_apply(
         raise ValueError('Arrays must be the same length')
 
     def _apply_func_to_arrays(idxs):
-        return func(*[array[idxs.astype(np.int)] for array in arrays], **kwargs)
+        return func(*[array[idxs.astype(int)] for array in arrays], **kwargs)
 
     array = arrays[0]
     rolls = expanding(
@@ -703,7 +1112,65 @@ def expanding_apply(
         else:
             arr = list(map(_apply_func_to_arrays, rolls))
     else:
+        from joblib import Parallel, delayed
         f = delayed(_apply_func_to_arrays)
         arr = Parallel(n_jobs=n_jobs)(map(f, rolls))
 
     return prepend_na(arr, n=min_periods - 1) if prepend_nans else np.array(arr)
+
+
+def expanding_reduce(
+    array: np.ndarray,
+    how: str = "mean",
+    min_periods: int = 1,
+    prepend_nans: bool = True,
+) -> np.ndarray:
+    """
+    Fast path of expanding_apply for the most common reducers, using cumulative
+    ufuncs instead of a Python function per window.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Input 1-D array.
+    how : str, optional
+        One of "sum", "mean", "min", "max", "std" or "var". Default is "mean".
+    min_periods : int, optional
+        Minimal size of expanding window. Default is 1.
+    prepend_nans : bool, optional
+        Specifies if nans should be prepended to the resulting array. Default is True.
+
+    Returns
+    -------
+    np.ndarray
+
+    Examples
+    --------
+    >>> expanding_reduce(np.array([1, 2, 3, 4, 5]), "sum", 2)
+    array([nan,  3.,  6., 10., 15.])
+    """
+    min_periods = int(min_periods)
+    if array.size < min_periods:
+        raise ValueError('array.size should be bigger than min_periods')
+
+    counts = np.arange(1, array.size + 1)
+    if how == "sum":
+        result = np.cumsum(array, dtype=np.float64)
+    elif how == "mean":
+        result = np.cumsum(array, dtype=np.float64) / counts
+    elif how in ("std", "var"):
+        centered = np.asarray(array, dtype=np.float64) - array[0]
+        means = np.cumsum(centered) / counts
+        result = np.clip(np.cumsum(centered ** 2) / counts - means ** 2, 0, None)
+        if how == "std":
+            result = np.sqrt(result)
+    elif how == "min":
+        result = np.minimum.accumulate(array)
+    elif how == "max":
+        result = np.maximum.accumulate(array)
+    else:
+        raise ValueError(f"{how=} not supported. Must be ['sum', 'mean', 'min', 'max', 'std', 'var']")
+
+    result = result[min_periods - 1:]
+    return prepend_na(result, min_periods - 1) if prepend_nans else result
+
@@ -1,17 +1,40 @@
-
 # TODO: mejorar estas estrategias en backtesting phase
-from talib import SMA, EMA
+from enum import IntEnum
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from trade.indicators import ATR
+
+if TYPE_CHECKING:
+    from pandas import Series
+
 
+class Barrier(IntEnum):
+    UNRESOLVED = -1
+    VERTICAL = 0
+    TAKE_PROFIT = 1
+    STOP_LOSS = 2
 
-def ema_trend(close: Series, ema: Series) -> Series:
+
+# Outcome of the event on each bar
+BarrierLabelDtype = np.dtype([
+    ("label", np.int8),
+    ("touch", np.int64),
+    ("barrier", np.int8),
+    ("returns", np.float64),
+])
+
+
+def ema_trend(close: "Series", ema: "Series") -> "Series":
     return close > ema
 
 
-def sma_trend(close: Series, sma: Series) -> Series:
+def sma_trend(close: "Series", sma: "Series") -> "Series":
     return close > sma
 
 
-def get_signal_labels(source: Series, window: int = -4) -> Series:
+def get_signal_labels(source: "Series", window: int = -4) -> "Series":
     shifted = source.shift(window)  # move the window to the future
     shifted[window:] = source[window:]  # fill nan values with their present
     # 1 if current price is lower than future
@@ -19,3 +42,160 @@ def get_signal_labels(source: Series, window: int = -4) -> Series:
     # -1 if current price is greater than future
     downtrend = (shifted < source).astype(float)
     return uptrend - downtrend
+
+
+def get_sides(entry_signals: np.recarray) -> np.ndarray:
+    """Side of the entries of batch_entry_signals: 1 on buys, -1 on sells and 0 elsewhere."""
+    return entry_signals.buy_index.astype(np.int8) - entry_signals.sell_index.astype(np.int8)
+
+
+def _barrier_widths(candles: np.recarray, barrier: float, atr_window: int) -> np.ndarray:
+    # Distance of a barrier from the entry price. No barrier is an infinite distance
+    if barrier is None:
+        return np.full(candles.shape[0], np.inf)
+    if atr_window is None:
+        return barrier * candles.close
+    return barrier * ATR(candles.high, candles.low, candles.close, atr_window)
+
+
+def _touch_chunk(candles, start, stop, horizon, sides, take_profits, stop_losses, labels):
+    # First touch of the events in [start, stop). Maximum highs and minimum lows of
+    # power of two windows (sparse table) let each event skip the untouched bars in
+    # log2(horizon) steps, the largest first
+    n_candles = candles.shape[0]
+    end = min(stop + horizon, n_candles)
+    highs, lows, opens = candles.high[start:end], candles.low[start:end], candles.open[start:end]
+    maxs, mins = [highs], [lows]
+    while 2 ** len(maxs) <= horizon:
+        half = 2 ** (len(maxs) - 1)
+        maxs.append(np.maximum(maxs[-1][:-half], maxs[-1][half:]))
+        mins.append(np.minimum(mins[-1][:-half], mins[-1][half:]))
+
+    # Prices above the ceiling or below the floor end the event
+    chunk_sides = sides[start:stop]
+    chunk_entries = candles.close[start:stop]
+    events = np.flatnonzero(
+        (chunk_sides != 0) & ~np.isnan(take_profits[start:stop]) & ~np.isnan(stop_losses[start:stop]))
+    entries = chunk_entries[events]
+    buys = chunk_sides[events] > 0
+    take_profits, stop_losses = take_profits[start + events], stop_losses[start + events]
+    ceilings = entries + np.where(buys, take_profits, stop_losses)
+    floors = entries - np.where(buys, stop_losses, take_profits)
+
+    positions = events + 1
+    limits = np.minimum(events + horizon, end - start - 1)
+    for level in range(len(maxs) - 1, -1, -1):
+        step = 2 ** level
+        indexes = np.minimum(positions, maxs[level].shape[0] - 1)
+        untouched = (positions + step - 1 <= limits) \
+            & (maxs[level][indexes] < ceilings) & (mins[level][indexes] > floors)
+        positions += step * untouched
+
+    touches = np.full(stop - start, -1, dtype=np.int64)
+    barriers = np.full(stop - start, Barrier.UNRESOLVED, dtype=np.int8)
+    exits = np.full(stop - start, np.nan)
+
+    # Opens beyond a barrier (gaps) touch it first and are filled at the open. Else, when
+    # both barriers are inside the same bar, the stop loss is assumed to be first
+    touched = positions <= limits
+    bars = positions[touched]
+    buys, ceilings, floors = buys[touched], ceilings[touched], floors[touched]
+    bar_opens = opens[bars]
+    gap_up, gap_down = bar_opens >= ceilings, bar_opens <= floors
+    upper = gap_up | (~gap_down & np.where(buys, lows[bars] > floors, highs[bars] >= ceilings))
+    stopped = np.where(buys, ~upper, upper)
+    exit_prices = np.where(upper, np.maximum(bar_opens, ceilings), np.minimum(bar_opens, floors))
+    touches[events[touched]] = start + bars
+    barriers[events[touched]] = np.where(stopped, Barrier.STOP_LOSS, Barrier.TAKE_PROFIT)
+    exits[events[touched]] = exit_prices
+
+    # Events without touches close at the vertical barrier, if the data reaches it
+    vertical = events[~touched & (start + events + horizon < n_candles)]
+    touches[vertical] = start + vertical + horizon
+    barriers[vertical] = Barrier.VERTICAL
+    exits[vertical] = candles.close[start + vertical + horizon]
+
+    labels["touch"][start:stop] = touches
+    labels["barrier"][start:stop] = barriers
+    labels["returns"][start:stop] = chunk_sides * (exits - chunk_entries) / chunk_entries
+
+
+def triple_barrier_labels(
+    candles: np.recarray,
+    horizon: int = 4,
+    take_profit: float = None,
+    stop_loss: float = None,
+    atr_window: int = None,
+    sides: np.ndarray = None,
+    vertical_sign: bool = True,
+    chunk_size: int = 1_000_000,
+) -> np.recarray:
+    """Triple barrier labels of every bar.
+
+    The event of a bar enters at its close and ends at the first of the next
+    `horizon` bars whose high or low touches the take profit or stop loss barrier,
+    or at the close of the last one (vertical barrier). The first touch of all the
+    events of a chunk is searched at once over range maximums and minimums of the
+    highs and lows, so the cost is O(n * log2(horizon)) vectorized operations and
+    the memory about 16 * log2(horizon) bytes per event of `chunk_size`.
+
+    Args:
+        candles (np.recarray): Candles with open, high, low and close.
+        horizon (int, optional): Bars until the vertical barrier. Defaults to 4.
+        take_profit (float, optional): Distance of the take profit from the entry, as a fraction of
+            the entry price or in ATRs if `atr_window` is given. Defaults to None (no barrier).
+        stop_loss (float, optional): Same as `take_profit` for the stop loss. Defaults to None (no barrier).
+        atr_window (int, optional): Window of the ATR that scales the barriers. Defaults to None.
+        sides (np.ndarray, optional): Side of the event of each bar: 1 buy, -1 sell, 0 no event.
+            Defaults to None (buys on every bar).
+        vertical_sign (bool, optional): Events ended by the vertical barrier are labelled by the sign
+            of their return. Else 0. Defaults to True.
+        chunk_size (int, optional): Events searched at once. Defaults to 1_000_000.
+
+    Returns:
+        np.recarray: BarrierLabelDtype records per bar. Labels are 1 on take profits, -1 on stop losses
+            and the sign of the return on vertical barriers. Touch is the bar that ended the event and
+            returns are relative to the entry and to the side. Events without a side, and the ones
+            near the end of the data that touch no barrier before it, are Barrier.UNRESOLVED with
+            label 0, touch -1 and nan returns.
+
+    Example:
+        >>> labels = triple_barrier_labels(candles, horizon=20, take_profit=2, stop_loss=1, atr_window=14)
+    """
+    if horizon < 1:
+        raise ValueError(f"{horizon=} should be greater than 0")
+
+    n_candles = candles.shape[0]
+    sides = np.ones(n_candles, dtype=np.int8) if sides is None else np.asarray(sides, dtype=np.int8)
+    take_profits = _barrier_widths(candles, take_profit, atr_window)
+    stop_losses = _barrier_widths(candles, stop_loss, atr_window)
+
+    labels = np.zeros(n_candles, dtype=BarrierLabelDtype).view(np.recarray)
+    for start in range(0, n_candles, chunk_size):
+        stop = min(start + chunk_size, n_candles)
+        _touch_chunk(candles, start, stop, horizon, sides, take_profits, stop_losses, labels)
+
+    labels.label[labels.barrier == Barrier.TAKE_PROFIT] = 1
+    labels.label[labels.barrier == Barrier.STOP_LOSS] = -1
+    if vertical_sign:
+        vertical = labels.barrier == Barrier.VERTICAL
+        labels.label[vertical] = np.sign(labels.returns[vertical])
+    return labels
+
+
+def meta_labels(candles: np.recarray, sides: np.ndarray, horizon: int = 4, **kwargs) -> np.recarray:
+    """Meta-labels of the events of a primary model: 1 when the trade of its side
+    ends with a positive return, else 0.
+
+    Args:
+        candles (np.recarray): Candles with open, high, low and close.
+        sides (np.ndarray): Side of the primary model on each bar, i.e. get_sides(strategy.batch_entry_signals()).
+        horizon (int, optional): Bars until the vertical barrier. Defaults to 4.
+        **kwargs: Barriers and other arguments of triple_barrier_labels.
+
+    Returns:
+        np.recarray: BarrierLabelDtype records per bar with the meta-labels.
+    """
+    labels = triple_barrier_labels(candles, horizon, sides=sides, **kwargs)
+    labels.label = (labels.barrier != Barrier.UNRESOLVED) & (labels.returns > 0)
+    return labels
@@ -1,100 +1,261 @@
+from math import ceil, log
 
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
 import numpy as np
-from pandas import DataFrame
-
-
-def build_pipeline(config_pipeline: dict):
-    # Define the columns and their corresponding transformers
-    for name, config in config_pipeline.items():
-        trans = config.get("transform")
-        if not trans:
-            continue
-        transformers = []
-        for action, params in trans.items():
-            if action == "scaled":
-                t = (f"{name}_{action}", get_scaler(**params), name)
-            elif action == "smoother":
-                t = (f"{name}_{action}", get_smoother(**params), name)
-            elif action == "filled":
-                t = (f"{name}_{action}", get_filler(**params), name)  # TODO
-            transformers.append(t)
-    return ColumnTransformer(transformers)
-
-
-# column_transformer = ColumnTransformer(
-#     transformers=[
-#         ("smooth_ema_3", Smoother(**params), ["col1", "col2"]),
-#         ("smooth_sma_2", Smoother(**params), ["col1", "col2"]),
-#         ("range_scaler", RangeScaler(**params))
-#         # Normalize col1 using StandardScaler
-#         ('standard_scaler_1', StandardScaler(**params), ['col1']),
-#         # Normalize col2 using MinMaxScaler
-#         ('minmax_scaler_1', MinMaxScaler(**params), ['col2']),
-#     ])
-
-def add_newcols():
-    pass
-
-
-def transform(candles, pipeline):
-    df = DataFrame()
-
-    # Adding new columns
-    # df['range'] = candles.high - candles.low
-    # df['change'] = candles.close - candles.open
-
-    CustomScaler = FunctionTransformer(custom_scaler, kw_args={})
-
-    # Define preprocessing pipeline
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('minmax_for_range', MinMaxScaler((-1, 1)), ['range']),
-            ('custom_for_change', CustomScaler, ['change']),
-        ])
-
-    # Apply preprocessing pipeline
-    df_preprocessed = preprocessor.fit_transform(df)
-    f = get_recarray(df_preprocessed.T, names=["rate", "change"])
-
-    concat_recarrays(candles, f)
-# If you want the output to remain a DataFrame
-#df_preprocessed = pd.DataFrame(df_preprocessed, columns=['range', 'change'])
-# Assuming 'df' is your DataFrame
-# df_preprocessed.to_records(index=False)
-
-
-# Apply the transformations to the columns of interest
-columns_to_transform = ['col1', 'col2']
-data[columns_to_transform] = column_transformer.fit_transform(
-    data[columns_to_transform])
-
-
-# def get_lorentzian_distance(x1: ndarray, x2: ndarray) -> float:
-#     return np.sum(np.log(1 + np.abs(x1 - x2)))
-
-
-# def preprocess_stock_data(
-#     stock_data: DataFrame,
-#     add_indicators: dict[str, str],
-#     rescaled: bool = True,
-#     fillna: bool = False,
-# ) -> ndarray:
-#     stock_data["index"] = range(0, len(stock_data))
-#     stock_data["hlc3"] = HLC3(
-#         stock_data.high, stock_data.low, stock_data.close)
-#     stock_data["rsi14"] = RSISmoothIndicator(stock_data.close, fillna=False)
-#     stock_data["rsi9"] = RSISmoothIndicator(stock_data.close, 9, fillna=False)
-#     stock_data["cci"] = CCISmoothIndicator(
-#         stock_data.high, stock_data.low, stock_data.close, fillna=False)
-#     stock_data["wt"] = WaveTrendIndicator(stock_data.hlc3, fillna=False)
-#     stock_data["adx"] = ADXSmoothIndicator(
-#         stock_data.high, stock_data.low, stock_data.close, fillna=False)
-#     # stock_data["ground_signal"] = get_signal_labels(stock_data["close"], -4)
-
-#     # stock_data.dropna(axis=0, inplace=True)
-#     data = stock_data[add_indicators].values.reshape(-1, len(add_indicators))
-#     # target = stock_data["ground_signal"].values
-
-#     return data  # , target
+from utils.lazy import lazy_function
+
+from trade.metadata import CandleLike
+from trade.indicators import RSI, ADX, CCI, WT, get_stable_min_bars
+from datatools.custom import SlidingBuffer
+
+FeatureFunctions = ["RSI", "ADX", "CCI", "WT"]
+
+# Weight left on the candles before the warm-up of a recursive indicator. Below the
+# float32 resolution of the features, so a row calculated from the last candles
+# equals the one calculated from the whole history
+WarmupTolerance = 1e-7
+
+EMA = lazy_function("talib", "EMA")
+SMA = lazy_function("talib", "SMA")
+
+
+def get_indicator(candles: CandleLike, function: str, parameters: dict) -> np.ndarray:
+    """Calculates the indicator of a feature spec over the given candles.
+
+    Args:
+        candles (CandleLike): Candles with open, high, low and close values.
+        function (str): Indicator name. One of FeatureFunctions.
+        parameters (dict): Indicator parameters as per to the strategy settings.
+
+    Returns:
+        np.ndarray: Indicator values
+    """
+    window = parameters.get("window", 14)
+    if function == "RSI":
+        return RSI(candles[parameters.get("source", "close")], window)
+    elif function == "ADX":
+        return ADX(candles.high, candles.low, candles.close, window)
+    elif function == "CCI":
+        return CCI(candles.high, candles.low, candles.close, window)
+    elif function == "WT":
+        return WT(candles.high, candles.low, candles.close, window,
+                  parameters.get("window_smooth", 11))
+    raise ValueError(f"{function=} not supported. Must be {FeatureFunctions}")
+
+
+def _decay_bars(factor: float) -> int:
+    # Bars for the weight of the older values of a recursive average to drop below WarmupTolerance
+    return ceil(log(WarmupTolerance) / log(1. - factor))
+
+
+def get_warmup_bars(function: str, parameters: dict) -> int:
+    """Candles needed for the last value of an indicator to match the one of the whole
+    history within WarmupTolerance. RSI and ADX use Wilder smoothing (ADX twice, over
+    the directional movement and the DX) and WT chained EMAs, whose memory decays
+    geometrically. CCI only depends on its window.
+
+    Args:
+        function (str): Indicator name. One of FeatureFunctions.
+        parameters (dict): Indicator parameters as per to the strategy settings.
+
+    Returns:
+        int: Number of candles, the last one included.
+    """
+    window = parameters.get("window", 14)
+    if function == "RSI":
+        return _decay_bars(1. / window) + 1
+    elif function == "ADX":
+        return 2 * _decay_bars(1. / window) + 1
+    elif function == "CCI":
+        return window
+    elif function == "WT":
+        window_smooth = parameters.get("window_smooth", 11)
+        return 2 * _decay_bars(2. / (window + 1)) + _decay_bars(2. / (window_smooth + 1)) + 4
+    raise ValueError(f"{function=} not supported. Must be {FeatureFunctions}")
+
+
+def smooth(values: np.ndarray, method: str = "SMA", window: int = 1) -> np.ndarray:
+    if window < 1:
+        raise ValueError(f"{window=} should be greater than 0")
+    if window == 1:
+        return values
+    elif method == "SMA":
+        return SMA(values, window)
+    elif method == "EMA":
+        return EMA(values, window)
+    raise ValueError(f"smoothing {method=} not supported. Must be ['SMA', 'EMA']")
+
+
+class FeaturePipeline:
+    """Materializes normalized indicator features into a preallocated float32 matrix.
+
+    The features are declared with the "source_data" section of the strategy
+    settings. Each feature has an indicator "function", its "parameters" and an
+    optional "transform" applied in order: "smoothed" (SMA or EMA), "rescaled"
+    (range_scale, minmax_scale or standard_scale) and "filled" (nan, zero or
+    previous). range_scale maps the known "bounds" of the indicator and
+    minmax_scale the fitted minimum and maximum onto "feature_range" (0 to 1 by
+    default). Scaling parameters are learnt once on `fit` and frozen, so training
+    data and live candles share exactly the same representation.
+
+    The matrix is aligned with the candle buffer of the strategy: `fit` writes one
+    row per candle and `update` appends only the rows of the new candles. Those
+    and the live rows of `transform_last` are calculated from the last `min_bars`
+    candles, enough for the recursive indicators to forget the older ones (see
+    get_warmup_bars).
+
+    Args:
+        specs (dict): Feature specs keyed by feature name.
+        capacity (int): Number of rows kept in the feature matrix.
+
+    Example:
+        >>> settings = get_settings("settings/demo/lorentzian_classifier.json")
+        >>> pipeline = FeaturePipeline(settings["source_data"], capacity=2000)
+        >>> features = pipeline.fit(candles)
+    """
+
+    def __init__(self, specs: dict, capacity: int) -> None:
+        for name, spec in specs.items():
+            if spec.get("function") not in FeatureFunctions:
+                raise ValueError(
+                    f"feature {name} function should be one of {FeatureFunctions}. Given {spec.get('function')}")
+
+        self.specs = specs
+        self.names = list(specs.keys())
+        self.n_features = len(self.names)
+        self.capacity = capacity
+
+        # Bars needed for the feature row of a single candle to equal the one of the whole history
+        self.min_bars = max(self._min_bars(spec) for spec in specs.values())
+
+        self._scales = np.ones(self.n_features)
+        self._offsets = np.zeros(self.n_features)
+        self._matrix = SlidingBuffer(capacity, (self.n_features,), np.float32)
+
+    @classmethod
+    def from_settings(cls, settings: dict, capacity: int) -> "FeaturePipeline":
+        return cls(settings["source_data"], capacity)
+
+    @staticmethod
+    def _min_bars(spec: dict) -> int:
+        parameters = spec.get("parameters", {})
+        smoothed = spec.get("transform", {}).get("smoothed", {})
+        min_bars = max(
+            get_stable_min_bars(spec["function"], parameters.get("window", 14)),
+            get_warmup_bars(spec["function"], parameters))
+
+        # The smoothing needs its own warm-up over the indicator values
+        window = smoothed.get("window", 1)
+        if smoothed.get("method", "SMA") == "EMA" and window > 1:
+            return min_bars + _decay_bars(2. / (window + 1))
+        return min_bars + window - 1
+
+    @property
+    def values(self) -> np.ndarray:
+        """Zero-copy view of the feature matrix, one row per candle from oldest to newest."""
+        return self._matrix.values
+
+    def _raw_features(self, candles: CandleLike) -> np.ndarray:
+        # Indicators and smoothing, before any scaling
+        raw = np.empty((candles.shape[0], self.n_features))
+        for j, spec in enumerate(self.specs.values()):
+            values = get_indicator(candles, spec["function"], spec.get("parameters", {}))
+            smoothed = spec.get("transform", {}).get("smoothed", {})
+            raw[:, j] = smooth(values, smoothed.get("method", "SMA"), smoothed.get("window", 1))
+        return raw
+
+    def _fit_scales(self, raw: np.ndarray) -> None:
+        for j, (name, spec) in enumerate(self.specs.items()):
+            rescaled = spec.get("transform", {}).get("rescaled")
+            if not rescaled:
+                continue
+
+            method = rescaled.get("method")
+            lower, upper = rescaled.get("feature_range", (0, 1))
+            if method == "range_scale":
+                # The indicator already has known bounds, i.e. RSI from 0 to 100
+                if "bounds" not in rescaled:
+                    raise ValueError(f"feature {name} range_scale needs the bounds of the indicator")
+                x_min, x_max = rescaled["bounds"]
+                scale = (upper - lower) / (x_max - x_min)
+                self._scales[j] = scale
+                self._offsets[j] = lower - x_min * scale
+            elif method == "minmax_scale":
+                x_min, x_max = np.nanmin(raw[:, j]), np.nanmax(raw[:, j])
+                scale = (upper - lower) / (x_max - x_min) if x_max > x_min else 0.
+                self._scales[j] = scale
+                self._offsets[j] = lower - x_min * scale
+            elif method == "standard_scale":
+                std = np.nanstd(raw[:, j])
+                self._scales[j] = 1. / std if std > 0 else 0.
+                self._offsets[j] = -np.nanmean(raw[:, j]) * self._scales[j]
+            else:
+                raise ValueError(
+                    f"rescaling {method=} not supported. Must be ['range_scale', 'minmax_scale', 'standard_scale']")
+
+    def _fill(self, features: np.ndarray, previous: np.ndarray = None) -> np.ndarray:
+        for j, spec in enumerate(self.specs.values()):
+            filled = spec.get("transform", {}).get("filled", {})
+            method = filled.get("method", "nan")
+            if method == "nan":
+                continue
+
+            column = features[:, j]
+            missing = np.isnan(column)
+            if method == "zero":
+                column[missing] = 0.
+            elif method == "previous":
+                # Forward fill with the last valid value, also across updates
+                valid = np.where(missing, 0, np.arange(column.shape[0]))
+                np.maximum.accumulate(valid, out=valid)
+                column[:] = column[valid]
+                if previous is not None and np.isnan(column[0]):
+                    column[np.isnan(column)] = previous[j]
+            else:
+                raise ValueError(f"filling {method=} not supported. Must be ['nan', 'zero', 'previous']")
+        return features
+
+    def transform(self, candles: CandleLike) -> np.ndarray:
+        """Feature matrix of the given candles using the frozen scaling parameters.
+        Nothing is stored in the pipeline.
+        """
+        features = (self._raw_features(candles) * self._scales + self._offsets).astype(np.float32)
+        return self._fill(features)
+
+    def transform_last(self, candles: CandleLike) -> np.ndarray:
+        """Feature row of the last candle. Only the last `min_bars` candles are used."""
+        candles = candles[-self.min_bars:]
+        features = (self._raw_features(candles)[-1:] * self._scales + self._offsets).astype(np.float32)
+        previous = self.values[-1] if len(self._matrix) else None
+        return self._fill(features, previous)[0]
+
+    def fit(self, candles: CandleLike) -> np.ndarray:
+        """Learns the scaling parameters from the candles and fills the feature matrix.
+
+        Returns:
+            np.ndarray: View of the feature matrix.
+        """
+        raw = self._raw_features(candles)
+        self._fit_scales(raw)
+        features = (raw * self._scales + self._offsets).astype(np.float32)
+
+        self._matrix.clear()
+        self._matrix.extend(self._fill(features))
+        return self.values
+
+    def update(self, candles: CandleLike, n_new: int = 1) -> np.ndarray:
+        """Appends the feature rows of the last `n_new` candles.
+
+        Args:
+            candles (CandleLike): Latest candles, at least `min_bars` + `n_new` - 1 of them.
+            n_new (int, optional): Number of new candles at the end of `candles`. Defaults to 1.
+
+        Returns:
+            np.ndarray: View of the feature matrix.
+        """
+        candles = candles[-(self.min_bars + n_new - 1):]
+        raw = self._raw_features(candles)[-n_new:]
+        features = (raw * self._scales + self._offsets).astype(np.float32)
+
+        previous = self.values[-1] if len(self._matrix) else None
+        self._matrix.extend(self._fill(features, previous))
+        return self.values
@@ -1,7 +1,14 @@
+import os
+from time import monotonic
 from typing import Any, Union
 from abc import abstractmethod, ABC
 from datetime import datetime as dt
 from utils.console import get_logger
+from utils.latency import LatencyRecorder
+from trade.metadata import CandleLike
+from trade.journal import TradeJournal
+from trade.snapshot import load_snapshot
+from trade.risk import ExposureLedger
 from trade.brokers import BrokerSession
 from trade.state_machine import AssetStateMachine
 from trade.strategies.abstract import TradingStrategy, TrailingStopStrategy
@@ -18,6 +25,10 @@ class AbstractTraderBot(ABC):
         interval: str = None,
         adjust_spread: bool = True,
         update_stops: bool =  False,
+        latency_path: str = None,
+        latency_export_secs: float = 60,
+        journal_path: str = None,
+        snapshot_path: str = None,
     ) -> None:
         super().__init__()
 
@@ -33,6 +44,24 @@ class AbstractTraderBot(ABC):
         self.update_stops =  update_stops
         self.state = AssetStateMachine()
 
+        # Stage latencies are only measured if there is a file to export them
+        self.latency = LatencyRecorder(
+            enabled=latency_path is not None,
+            path=latency_path,
+            export_every_secs=latency_export_secs,
+        )
+
+        # Binary record of the session decisions. See trade.journal.read_journal
+        self.journal = TradeJournal(journal_path) if journal_path is not None else None
+
+        # Exposure of every bot of the account and the one booked by the order
+        # waiting for its position. See set_ledger
+        self.ledger = None
+        self.reservation = None
+
+        # Fitted strategies are saved here after every closed candle and restored on start
+        self.snapshot_path = snapshot_path
+
         self.logger = get_logger()
         self.logger.name = symbol
 
@@ -69,6 +98,72 @@ class AbstractTraderBot(ABC):
     def set_broker(self, broker: BrokerSession) -> None:
         self.broker = broker
 
+    def set_ledger(self, ledger: ExposureLedger) -> None:
+        """Shares an exposure ledger among bots. Orders that would break its limits are not sent."""
+        self.ledger = ledger
+
+    def refresh_ledger(self) -> None:
+        """Prices the ledger with the current ticks, once per cycle. Bots sharing the
+        ledger skip it if another one refreshed it less than `leap_in_secs` ago.
+        """
+        ledger = self.ledger
+        if ledger is None or monotonic() - ledger.revalued_at < self.leap_in_secs:
+            return
+        self.broker.refresh_risk_engine(ledger.engine)
+        ledger.revalue()
+
+    def sync_ledger(self) -> None:
+        """Adds the positions open at the broker, i.e. the ones found on start, to the ledger."""
+        if self.ledger is not None:
+            self.ledger.sync(self.broker.get_positions())
+
+    def get_missed_candles(self, last_time: int, max_bars: int) -> CandleLike:
+        """Closed candles after `last_time`. The last ones are fetched in growing
+        batches until the batch reaches `last_time`, so a short outage costs a small
+        query. Returns None if they are more than `max_bars`.
+        """
+        n_candles = min(64, max_bars)
+        while True:
+            candles = self.broker.get_candles(self.symbol, self.timeframe, n_candles, 1)
+            if candles.time[0] <= last_time:
+                return candles[candles.time > last_time]
+            if n_candles == max_bars:
+                return None
+            n_candles = min(4 * n_candles, max_bars)
+
+    def warm_start(self, strategies: dict, min_bars: int) -> None:
+        """Restores the strategies from the snapshot and advances them over the candles
+        missed since it was saved. Without a snapshot of these strategies, symbol and
+        timeframe, or if it is older than `min_bars` candles, the strategies are fitted
+        on the last `min_bars` closed candles.
+
+        Args:
+            strategies (dict): Strategies keyed by role, i.e. {"entry": self.entry_strategy}.
+            min_bars (int): Candles needed to fit the strategies.
+        """
+        states = None
+        if self.snapshot_path is not None:
+            states = load_snapshot(self.snapshot_path, strategies, self.symbol, self.timeframe)
+            if states is None and os.path.exists(self.snapshot_path):
+                self.logger.warning("snapshot of other strategies, symbol or timeframe. Strategies will be fitted")
+        if states is not None:
+            last_time = min(state["last_time"] for state in states.values())
+            missed_candles = self.get_missed_candles(last_time, min_bars)
+            if missed_candles is not None:
+                # Candles are fed one by one, as in the live loop
+                for name, strategy in strategies.items():
+                    strategy.set_state(states[name]["state"])
+                    new_candles = missed_candles[missed_candles.time > states[name]["last_time"]]
+                    for i in range(new_candles.shape[0]):
+                        strategy.update_data(new_candles[i:i + 1])
+                self.logger.info(f"strategies restored from snapshot with {missed_candles.shape[0]} missed candles")
+                return
+            self.logger.warning(f"snapshot older than {min_bars} candles. Strategies will be fitted")
+
+        train_data = self.broker.get_candles(self.symbol, self.timeframe, min_bars, 1)
+        for strategy in strategies.values():
+            strategy.fit(train_data)
+
     def set_active_interval(self, interval: str, timezone: str = 'UTC'):
         # Split the interval into start and end
         try:
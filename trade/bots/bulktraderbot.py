@@ -2,6 +2,7 @@ from time import sleep
 
 from trade.metadata import EntrySignal, AssetState, CandleLike
 from trade.bots.abstract import AbstractTraderBot
+from trade.snapshot import save_snapshot
 
 # TODO: parallel computing with all symbols
 class BulkTraderBot(AbstractTraderBot):
@@ -28,18 +29,20 @@ class BulkTraderBot(AbstractTraderBot):
             self.state.set(AssetState.NULL_POSITION)
             self.logger.info("looking for entry signals")
 
+        # Positions of the previous sessions count for the account limits
+        self.sync_ledger()
+
         # Calculate the minimal amount of data to get accurate predictions
         min_bars = max((
             self.entry_strategy.min_bars, 
             # self.exit_strategy.min_bars, 
             self.trailing_strategy.min_bars))
 
-        train_data = self.broker.get_candles(self.symbol, self.timeframe, min_bars, 1)
+        # Train the models, or restore them from the last session
+        self.warm_start(self.get_strategies(), min_bars)
 
-        # Train the models
-        self.entry_strategy.fit(train_data)
-        # self.exit_strategy.fit(train_data)
-        self.trailing_strategy.fit(train_data)
+    def get_strategies(self) -> dict:
+        return {"entry": self.entry_strategy, "trailing": self.trailing_strategy}
 
     def run(self) -> None:
         """_summary_
@@ -47,6 +50,13 @@ class BulkTraderBot(AbstractTraderBot):
         self.logger.info("running bulktraderbot")
         self.set_init_state()
         last_traded_candle_time = None
+        strategies = self.get_strategies()
+        last_snapshot_candle_time = None
+
+        # Reservations of the orders sent in the cycle, keyed by order ticket, and
+        # the positions of the symbol in the ledger
+        reservations = {}
+        ledger_tickets = set()
 
         # Start a live trading session
         while self.is_active():
@@ -54,11 +64,19 @@ class BulkTraderBot(AbstractTraderBot):
             candles = self.broker.get_candles(self.symbol, self.timeframe, 2)
             last_candles, current_candle = candles[:-1], candles[-1]
 
+            # Limits are checked with the current rates
+            self.refresh_ledger()
+
             # Always update data to save computational time and memory
             self.entry_strategy.update_data(last_candles)
             # self.exit_strategy.update_data(last_candles)
             self.trailing_strategy.update_data(last_candles)
 
+            # Fitted state after each closed candle, for a restart without refitting
+            if self.snapshot_path is not None and last_snapshot_candle_time != last_candles[-1].time:
+                last_snapshot_candle_time = last_candles[-1].time
+                save_snapshot(self.snapshot_path, strategies, self.symbol, self.timeframe)
+
             # print(current_candle.close)
 
             entry_signal = self.entry_strategy.get_entry_signal(current_candle)
@@ -70,13 +88,48 @@ class BulkTraderBot(AbstractTraderBot):
                 entry_params = self.calculate_entry_params(current_candle, entry_signal)
                 last_traded_candle_time = current_candle.time
 
-                self.broker.create_order(self.symbol, entry_signal.name, *entry_params)
-                self.logger.info(f"{entry_signal.name.lower()} order created")
+                # The order must fit in the account limits shared with the other bots
+                open_price, lot_size, stop_loss, _ = entry_params
+                side = 1 if entry_signal == EntrySignal.BUY else -1
+                reservation = None
+                if self.ledger is not None:
+                    reservation = self.ledger.reserve(self.symbol, side, lot_size, stop_loss, open_price)
+                if self.ledger is not None and reservation is None:
+                    self.logger.warning(f"{entry_signal.name.lower()} order blocked by exposure limits")
+                else:
+                    try:
+                        order_result = self.broker.create_order(self.symbol, entry_signal.name, *entry_params)
+                    except Exception:
+                        if reservation is not None:
+                            self.ledger.release(reservation)
+                        raise
+                    self.logger.info(f"{entry_signal.name.lower()} order created")
+                    if reservation is not None:
+                        reservations[getattr(order_result, "order", 0)] = reservation
 
             orders = self.broker.get_orders(self.symbol)
             positions = self.broker.get_positions(self.symbol)
             # print(positions)
 
+            # Market orders are filled by the time create_order returns, and their positions
+            # have the ticket of the order. New positions replace the reservations, the ones
+            # gone since the last cycle were closed and reservations without position are released
+            if self.ledger is not None:
+                tickets = set()
+                for position in positions or ():
+                    tickets.add(position.ticket)
+                    if position.ticket not in self.ledger:
+                        side = 1 if position.type == EntrySignal.BUY.value else -1
+                        self.ledger.open(
+                            position.ticket, self.symbol, side, position.volume, position.price_open, position.sl,
+                            reservations.pop(position.ticket, None))
+                for ticket in ledger_tickets - tickets:
+                    self.ledger.close(ticket)
+                for reservation in reservations.values():
+                    self.ledger.release(reservation)
+                reservations.clear()
+                ledger_tickets = tickets
+
             # Once the bot has created an order, the bot waits till the broker place the position
             # if orders:
             #     self.logger.info(f"position {self.position.ticket} placed")
@@ -1,7 +1,8 @@
-from time import sleep
+from time import sleep, perf_counter_ns
 
 from trade.metadata import EntrySignal, AssetState, CandleLike
 from trade.bots.abstract import AbstractTraderBot
+from trade.snapshot import save_snapshot
 
 # TODO: parallel computing with all symbols
 class SingleTraderBot(AbstractTraderBot):
@@ -28,18 +29,20 @@ class SingleTraderBot(AbstractTraderBot):
             self.state.set(AssetState.NULL_POSITION)
             self.logger.info("looking for entry signals")
 
+        # Positions of the previous sessions count for the account limits
+        self.sync_ledger()
+
         # Calculate the minimal amount of data to get accurate predictions
         min_bars = max((
             self.entry_strategy.min_bars, 
             self.exit_strategy.min_bars, 
             self.trailing_strategy.min_bars))
 
-        train_data = self.broker.get_candles(self.symbol, self.timeframe, min_bars, 1)
+        # Train the models, or restore them from the last session
+        self.warm_start(self.get_strategies(), min_bars)
 
-        # Train the models
-        self.entry_strategy.fit(train_data)
-        self.exit_strategy.fit(train_data)
-        self.trailing_strategy.fit(train_data)
+    def get_strategies(self) -> dict:
+        return {"entry": self.entry_strategy, "exit": self.exit_strategy, "trailing": self.trailing_strategy}
 
     def run(self) -> None:
         """_summary_
@@ -48,79 +51,179 @@ class SingleTraderBot(AbstractTraderBot):
         self.set_init_state()
         last_traded_candle_time = None
 
-        # Start a live trading session
-        while self.is_active():
-            # Retrieve the latest candle data
-            candles = self.broker.get_candles(self.symbol, self.timeframe, 2)
-            last_candles, current_candle = candles[:-1], candles[-1]
+        # Stage spans are named once. They are no-ops if latencies are disabled
+        latency, symbol = self.latency, self.symbol
+        entry_name = type(self.entry_strategy).__name__
+        exit_name = type(self.exit_strategy).__name__
+        trailing_name = type(self.trailing_strategy).__name__
+        journal = self.journal
+        last_journaled_candle_time = None
+        strategies = self.get_strategies()
+        last_snapshot_candle_time = None
 
-            # Always update data to save computational time and memory
-            self.entry_strategy.update_data(last_candles)
-            self.exit_strategy.update_data(last_candles)
-            self.trailing_strategy.update_data(last_candles)
+        try:
+            # Start a live trading session
+            while self.is_active():
+                cycle_start = perf_counter_ns()
 
-            # print(current_candle.close)
+                # Retrieve the latest candle data
+                with latency.span("get_candles", symbol):
+                    candles = self.broker.get_candles(self.symbol, self.timeframe, 2)
+                last_candles, current_candle = candles[:-1], candles[-1]
 
-            # If no position is on placed, create an entry signal
-            if self.state.null_position:
-                entry_signal = self.entry_strategy.get_entry_signal(current_candle)
-                # print(entry_signal)
-                # print(entry_signal.name)
-                # entry_signal = EntrySignal.BUY
+                # Limits are checked with the current rates
+                with latency.span("refresh_ledger", symbol):
+                    self.refresh_ledger()
 
-                # If you get and entry signal either BUY or SELL, create a market order
-                if self.state.is_entry(entry_signal):
-                    
-                    # forbidden to trade the same candle twice
-                    if last_traded_candle_time != current_candle.time:
-                        entry_params = self.calculate_entry_params(current_candle, entry_signal)
-                        last_traded_candle_time = current_candle.time
+                if journal is not None and last_journaled_candle_time != last_candles[-1].time:
+                    last_journaled_candle_time = last_candles[-1].time
+                    journal.candle(symbol, last_candles[-1])
 
-                        self.broker.create_order(self.symbol, entry_signal.name, *entry_params)
-                        self.logger.info(f"{entry_signal.name.lower()} order created")
-                        self.state.next()
-                    else:
-                        self.logger.info("attemp to trade the same candle twice blocked")
+                # Always update data to save computational time and memory
+                with latency.span("update_data", symbol, entry_name):
+                    self.entry_strategy.update_data(last_candles)
+                with latency.span("update_data", symbol, exit_name):
+                    self.exit_strategy.update_data(last_candles)
+                with latency.span("update_data", symbol, trailing_name):
+                    self.trailing_strategy.update_data(last_candles)
 
-            positions = self.broker.get_positions(self.symbol)
+                # Fitted state after each closed candle, for a restart without refitting
+                if self.snapshot_path is not None and last_snapshot_candle_time != last_candles[-1].time:
+                    last_snapshot_candle_time = last_candles[-1].time
+                    with latency.span("snapshot", symbol):
+                        save_snapshot(self.snapshot_path, strategies, self.symbol, self.timeframe)
 
-            # Once the bot has created an order, the bot waits till the broker place the position
-            if self.state.awaiting_position and positions:
-                self.position = positions[-1]
-                self.logger.info(f"position {self.position.ticket} placed")
-                self.state.next()
+                # print(current_candle.close)
 
-            # The position has been placed
-            if self.state.on_position:
-                
-                # Suddently the position is not there, that means the app closed the position (e.i. manually closed, took SL/TP)                
-                if not positions:
-                    self.logger.info(f"position {self.position.ticket} closed on app")
-                    self.position = None
+                # If no position is on placed, create an entry signal
+                if self.state.null_position:
+                    with latency.span("entry_signal", symbol, entry_name):
+                        entry_signal = self.entry_strategy.get_entry_signal(current_candle)
+                    # print(entry_signal)
+                    # print(entry_signal.name)
+                    # entry_signal = EntrySignal.BUY
+
+                    # If you get and entry signal either BUY or SELL, create a market order
+                    if self.state.is_entry(entry_signal):
+                        if journal is not None:
+                            journal.signal(symbol, entry_signal.value, current_candle.time, current_candle.close)
+                    
+                        # forbidden to trade the same candle twice
+                        if last_traded_candle_time != current_candle.time:
+                            with latency.span("entry_params", symbol, trailing_name):
+                                entry_params = self.calculate_entry_params(current_candle, entry_signal)
+                            last_traded_candle_time = current_candle.time
+
+                            # The order must fit in the account limits shared with the other bots.
+                            # Its exposure is booked until the position is placed
+                            open_price, lot_size, stop_loss, _ = entry_params
+                            side = 1 if entry_signal == EntrySignal.BUY else -1
+                            if self.ledger is not None:
+                                self.reservation = self.ledger.reserve(symbol, side, lot_size, stop_loss, open_price)
+                            if self.ledger is not None and self.reservation is None:
+                                self.logger.warning(f"{entry_signal.name.lower()} order blocked by exposure limits")
+                            else:
+                                try:
+                                    with latency.span("create_order", symbol):
+                                        order_result = self.broker.create_order(self.symbol, entry_signal.name, *entry_params)
+                                except Exception:
+                                    if self.ledger is not None:
+                                        self.ledger.release(self.reservation)
+                                        self.reservation = None
+                                    raise
+                                self.logger.info(f"{entry_signal.name.lower()} order created")
+                                self.state.next()
+                                if journal is not None:
+                                    journal.order(symbol, entry_signal.value, *entry_params, candle_time=current_candle.time)
+                                    journal.broker_result(symbol, order_result)
+                                    journal.state(symbol, AssetState.WAITING_POSITION.value)
+                                    journal.flush()
+                        else:
+                            self.logger.info("attemp to trade the same candle twice blocked")
+
+                with latency.span("get_positions", symbol):
+                    positions = self.broker.get_positions(self.symbol)
+
+                # Once the bot has created an order, the bot waits till the broker place the position
+                if self.state.awaiting_position and positions:
+                    self.position = positions[-1]
+                    self.logger.info(f"position {self.position.ticket} placed")
                     self.state.next()
-                    continue
-                
-                # If a exit strategy has been set, generate an exit signal to early out the position
-                if self.exit_strategy:
-                    exit_signal = self.exit_strategy.get_exit_signal(current_candle, self.position)
+                    if self.ledger is not None:
+                        position = self.position
+                        side = 1 if position.type == EntrySignal.BUY.value else -1
+                        self.ledger.open(
+                            position.ticket, symbol, side, position.volume, position.price_open, position.sl, self.reservation)
+                        self.reservation = None
+                    if journal is not None:
+                        journal.position(symbol, self.position)
+                        journal.state(symbol, AssetState.ON_POSITION.value)
+                        journal.flush()
 
-                    if self.state.is_exit(exit_signal):
-                        self.broker.close_position(self.position)
-                        self.logger.info(f"position {self.position.ticket} closed by bot")
+                # The position has been placed
+                if self.state.on_position:
+                
+                    # Suddently the position is not there, that means the app closed the position (e.i. manually closed, took SL/TP)                
+                    if not positions:
+                        self.logger.info(f"position {self.position.ticket} closed on app")
+                        if self.ledger is not None:
+                            self.ledger.close(self.position.ticket)
+                        if journal is not None:
+                            journal.close_position(symbol, self.position.ticket)
+                            journal.state(symbol, AssetState.NULL_POSITION.value)
+                            journal.flush()
                         self.position = None
                         self.state.next()
                         continue
                 
-                # At the end if no early exit, test if the trailing strategy updates the SL/TP levels
-                if self.trailing_strategy:
-                    stop_loss, take_profit = self.recalculate_stop_levels(current_candle, self.position)
+                    # If a exit strategy has been set, generate an exit signal to early out the position
+                    if self.exit_strategy:
+                        with latency.span("exit_signal", symbol, exit_name):
+                            exit_signal = self.exit_strategy.get_exit_signal(current_candle, self.position)
+
+                        if self.state.is_exit(exit_signal):
+                            with latency.span("close_position", symbol):
+                                order_result = self.broker.close_position(self.position)
+                            self.logger.info(f"position {self.position.ticket} closed by bot")
+                            if self.ledger is not None:
+                                self.ledger.close(self.position.ticket)
+                            if journal is not None:
+                                journal.signal(symbol, exit_signal.value, current_candle.time, current_candle.close)
+                                journal.close_position(symbol, self.position.ticket, current_candle.close)
+                                journal.broker_result(symbol, order_result)
+                                journal.state(symbol, AssetState.NULL_POSITION.value)
+                                journal.flush()
+                            self.position = None
+                            self.state.next()
+                            continue
+                
+                    # At the end if no early exit, test if the trailing strategy updates the SL/TP levels
+                    if self.trailing_strategy:
+                        with latency.span("stop_levels", symbol, trailing_name):
+                            stop_loss, take_profit = self.recalculate_stop_levels(current_candle, self.position)
 
-                    if abs(stop_loss - self.position.sl) >= 0.00001 or abs(take_profit - self.position.tp) >= 0.00001:
-                        self.broker.modify_position(self.position, stop_loss, take_profit)
-                        self.position = self.broker.get_positions(self.symbol)[-1]
-                        self.logger.info(f"position {self.position.ticket} modified {stop_loss=:.5f}, {take_profit=:.5f}")
+                        if abs(stop_loss - self.position.sl) >= 0.00001 or abs(take_profit - self.position.tp) >= 0.00001:
+                            with latency.span("modify_position", symbol):
+                                order_result = self.broker.modify_position(self.position, stop_loss, take_profit)
+                            self.position = self.broker.get_positions(self.symbol)[-1]
+                            if journal is not None:
+                                journal.modify(symbol, self.position.ticket, stop_loss, take_profit)
+                                journal.broker_result(symbol, order_result)
+                                journal.flush()
+                            if self.ledger is not None:
+                                self.ledger.modify(self.position.ticket, self.position.sl)
+                            self.logger.info(f"position {self.position.ticket} modified {stop_loss=:.5f}, {take_profit=:.5f}")
 
-            sleep(self.leap_in_secs)
+                # Whole cycle without the sleep. Early continues are not counted
+                latency.record("cycle", perf_counter_ns() - cycle_start, symbol)
+                latency.maybe_export()
+                sleep(self.leap_in_secs)
+        finally:
+            # Events of the last orders are already on disk. The rest are written even on crashes
+            if latency.enabled and latency.path is not None:
+                latency.export()
+            if journal is not None:
+                journal.close()
         self.logger.info("single traderbot session finished")
 
     def calculate_entry_params(
@@ -1,2 +1,5 @@
+from utils.lazy import lazy_attributes
 from trade.brokers.abstract import BrokerSession
-from trade.brokers.mt5broker import Mt5Session
+
+# MetaTrader5 is only imported when Mt5Session is first used
+__getattr__ = lazy_attributes(globals(), {"Mt5Session": "trade.brokers.mt5broker"})
@@ -7,7 +7,20 @@ from dataclasses import dataclass
 from pandas import DataFrame, to_datetime
 
 from trade.brokers.abstract import BrokerSession
-from trade.metadata import OrderTypes, TimeFrames, InverseOrderTypes, CandleLike
+from trade.risk import RiskEngine, get_symbol_specs, conversion_symbols
+from trade.metadata import OrderTypes, TimeFrames, InverseOrderTypes, CandleLike, PositionType
+
+
+def check_constants():
+    # trade.metadata hardcodes the MT5 constants so it can be imported without
+    # MetaTrader5. Make sure they did not change in the installed package
+    for enum, prefix in ((OrderTypes, "ORDER_TYPE_"), (TimeFrames, "TIMEFRAME_"), (PositionType, "POSITION_TYPE_")):
+        for member in enum:
+            if getattr(mt5, prefix + member.name) != member.value:
+                raise ImportError(f"{enum.__name__}.{member.name} does not match mt5.{prefix}{member.name}")
+
+
+check_constants()
 
 
 def count_decimals(number: float) -> int:
@@ -223,7 +236,7 @@ class Mt5Session(BrokerSession):
         stop_loss: float = None,
         take_profit: float = None,
         deviation: int = 5,
-    ) -> mt5.TradeOrder:
+    ) -> mt5.OrderSendResult:
         """Create a new market order. This new order will be transactioned almost immidiately
 
         Args:
@@ -235,7 +248,7 @@ class Mt5Session(BrokerSession):
             deviation (int): Number of pips to miss if the price order is not fulfilled
 
         Returns:
-            mt5.OrderSendResult: _description_
+            mt5.OrderSendResult: Retcode, order ticket, price and volume of the request
         """
         check_symbol(symbol)
         check_order_type(order_type)
@@ -272,8 +285,8 @@ class Mt5Session(BrokerSession):
         order_result = mt5.order_send(request)
         check_order_sent(order_result, "creating")
 
-        # The order stays in the queue until it is canceled
-        return mt5.orders_get(symbol=symbol)  # TODO: cambiar esto por order_result
+        # The order stays in the queue until it is canceled. See get_orders
+        return order_result
 
     def close_position(
         self,
@@ -674,6 +687,32 @@ class Mt5Session(BrokerSession):
 
         return bound_lot(symbol, lot_size)
 
+    def get_risk_engine(self, symbols: list[str]) -> RiskEngine:
+        """Creates a RiskEngine for the symbols and the pairs needed to convert their
+        quote currencies into the account currency.
+
+        Args:
+            symbols (list[str]): Traded symbols
+
+        Returns:
+            RiskEngine: Engine already refreshed with the current ticks
+        """
+        account_currency = self.account_info.currency
+        available = [info.name for info in mt5.symbols_get()]
+        all_symbols = list(symbols) + conversion_symbols(symbols, account_currency, available)
+
+        specs = get_symbol_specs([mt5.symbol_info(symbol) for symbol in all_symbols])
+        engine = RiskEngine(specs, account_currency, self.account_info.leverage)
+        self.refresh_risk_engine(engine)
+        return engine
+
+    def refresh_risk_engine(self, engine: RiskEngine) -> None:
+        """Refreshes the engine prices with one tick per symbol. Call it once per cycle."""
+        ticks = [mt5.symbol_info_tick(symbol) for symbol in engine.symbols]
+        bids = [tick.bid if tick else 0. for tick in ticks]
+        asks = [tick.ask if tick else 0. for tick in ticks]
+        engine.refresh(bids, asks)
+
 
 if __name__ == "__main__":
     from setup import get_settings
@@ -1,7 +1,24 @@
-from talib import EMA, SMA, CCI, ADX, RSI, MAX, MIN, ATR, STDDEV, VAR
-from talib.stream import SMA as SMA_, ATR as ATR_, STDDEV as STDDEV_, VAR as VAR_
+from utils.lazy import lazy_function
 from trade.indicators.custom import HL2, HLC3, OHLC4, PIVOTHIGH, PIVOTLOW, \
-    DONCHAIN, WT, RQK, RBFK, HEIKINASHI
-
-from talib import set_unstable_period, get_unstable_period
+    DONCHAIN, WT, RQK, RBFK, HEIKINASHI, KERNEL_BANK, rqk_weights, rbfk_weights
 from trade.indicators.basic import get_all_indicators, get_min_bars, get_stable_min_bars
+
+# TA-Lib is imported on the first call of any of its functions, not on import
+EMA = lazy_function("talib", "EMA")
+SMA = lazy_function("talib", "SMA")
+CCI = lazy_function("talib", "CCI")
+ADX = lazy_function("talib", "ADX")
+RSI = lazy_function("talib", "RSI")
+MAX = lazy_function("talib", "MAX")
+MIN = lazy_function("talib", "MIN")
+ATR = lazy_function("talib", "ATR")
+STDDEV = lazy_function("talib", "STDDEV")
+VAR = lazy_function("talib", "VAR")
+
+SMA_ = lazy_function("talib.stream", "SMA")
+ATR_ = lazy_function("talib.stream", "ATR")
+STDDEV_ = lazy_function("talib.stream", "STDDEV")
+VAR_ = lazy_function("talib.stream", "VAR")
+
+set_unstable_period = lazy_function("talib", "set_unstable_period")
+get_unstable_period = lazy_function("talib", "get_unstable_period")
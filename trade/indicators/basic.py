@@ -1,5 +1,5 @@
 
-from talib import get_functions
+from importlib import import_module
 from trade.indicators.metadata import __custom_indicators__, __unstable_indicators__
 
 
@@ -10,7 +10,7 @@ def get_all_indicators():
         list: A list of strings representing the names of all technical indicators from the TALib library
         and additional custom indicators.
     """
-    talib_indicators = get_functions()
+    talib_indicators = import_module("talib").get_functions()
     talib_indicators.extend(__custom_indicators__)
     return talib_indicators
 
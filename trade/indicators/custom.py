@@ -1,8 +1,12 @@
 import numpy as np
-from talib import MAX, MIN, EMA, SMA
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.lazy import lazy_function
 
 from trade.metadata import CandleLike
-from datatools.custom import get_recarray, rolling_apply, drop_na
+from datatools.custom import get_recarray, rolling_dot, drop_na, sliding_extremum
+
+EMA = lazy_function("talib", "EMA")
+SMA = lazy_function("talib", "SMA")
 
 
 def OC2(
@@ -171,7 +175,7 @@ def PIVOTHIGH(
     Returns:
         np.ndarray: Array of pivot high values with NaN values for non-pivot highs.
     """
-    pivots = np.roll(MAX(high, left + 1 + right), -right)
+    pivots = np.roll(sliding_extremum(high, left + 1 + right, "max"), -right)
     pivots[pivots != high] = np.NaN
 
     if asrecarray:
@@ -199,7 +203,7 @@ def PIVOTLOW(
     Returns:
         np.ndarray: Array of pivot low values with NaN values for non-pivot lows.
     """
-    pivots = np.roll(MIN(low, left + 1 + right), -right)
+    pivots = np.roll(sliding_extremum(low, left + 1 + right, "min"), -right)
     pivots[pivots != low] = np.NaN
 
     if asrecarray:
@@ -226,8 +230,8 @@ def DONCHAIN(
     Returns:
         CandleLike: array of the upper and lower bounds of the Donchian Channel, respectively.
     """
-    upper = MAX(ohlc, window)
-    lower = MIN(ohlc, window)
+    upper = sliding_extremum(ohlc, window, "max")
+    lower = sliding_extremum(ohlc, window, "min")
 
     if asrecarray:
         donchain = get_recarray(
@@ -276,6 +280,83 @@ def WT(
     return wt
 
 
+def rqk_weights(window, alpha, n_bars: int) -> np.ndarray:
+    """
+    Weights of the Rational Quadratic Kernel from the oldest to the newest bar.
+
+    Args:
+        window (float | np.ndarray): Window of the kernel, or an array of windows.
+        alpha (float | np.ndarray): Decay rate of the weights, or an array broadcastable with `window`.
+        n_bars (int): Bars weighted by the kernel.
+
+    Returns:
+        np.ndarray: Vector of `n_bars` weights, or a bank with one row per (window, alpha)
+            pair if arrays are given.
+    """
+    bars = (np.arange(n_bars) ** 2.)[::-1]
+    window = np.asarray(window, dtype=np.float64)[..., None]
+    alpha = np.asarray(alpha, dtype=np.float64)[..., None]
+    return (1. + 0.5 * bars / (alpha * window ** 2.)) ** (-alpha)
+
+
+def rbfk_weights(window, n_bars: int) -> np.ndarray:
+    """
+    Weights of the Radial Basis Function kernel from the oldest to the newest bar.
+
+    Args:
+        window (float | np.ndarray): Window of the kernel, or an array of windows.
+        n_bars (int): Bars weighted by the kernel.
+
+    Returns:
+        np.ndarray: Vector of `n_bars` weights, or a bank with one row per window if
+            an array is given.
+    """
+    bars = (np.arange(n_bars) ** 2.)[::-1]
+    window = np.asarray(window, dtype=np.float64)[..., None]
+    return np.exp(-0.5 * bars / (window ** 2))
+
+
+def KERNEL_BANK(
+    close: CandleLike,
+    weights: np.ndarray,
+    block_size: int = 4096,
+) -> np.ndarray:
+    """
+    Computes many rolling kernels of the closes at once, one per row of a weight
+    bank (see `rqk_weights` and `rbfk_weights`), as a single matrix product per
+    block of bars.
+
+    Args:
+        close (CandleLike): The closing prices of the time series.
+        weights (np.ndarray): Bank of weights with shape (n_kernels, n_bars).
+        block_size (int, optional): Bars multiplied at once. Bounds the copy of the
+            windows to block_size * n_bars floats. Defaults to 4096.
+
+    Returns:
+        np.ndarray: Kernels with shape (n_kernels, close.shape[0]). The first n_bars - 1
+            bars of each kernel are nan.
+
+    Example:
+        >>> bank = rqk_weights(np.array([8, 9, 10]), 1, 25)
+        >>> kernels = KERNEL_BANK(candles.close, bank)  # kernels[0] == RQK(candles.close, 8, 1, 25)
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    n_kernels, n_bars = weights.shape
+    close = np.asarray(close, dtype=np.float64)
+    if close.size < n_bars:
+        raise ValueError('close.size should be bigger than n_bars')
+
+    kernels = np.full((n_kernels, close.shape[0]), np.nan)
+    windows = sliding_window_view(close, n_bars)
+    for start in range(0, windows.shape[0], block_size):
+        # A contiguous copy of the block lets BLAS multiply it with the whole bank
+        block = np.ascontiguousarray(windows[start:start + block_size])
+        kernels[:, n_bars - 1 + start:n_bars - 1 + start + block.shape[0]] = weights @ block.T
+
+    kernels[:, n_bars - 1:] /= weights.sum(axis=1)[:, None]
+    return kernels
+
+
 def RQK(
     close: CandleLike,
     window: float = 8,
@@ -300,10 +381,9 @@ def RQK(
     if not n_bars:
         n_bars = close.shape[0]
 
-    bars = (np.arange(n_bars) ** 2.)[::-1]
-    weights = (1. + 0.5 * bars / (alpha * window ** 2.)) ** (-alpha)
+    weights = rqk_weights(window, alpha, n_bars)
 
-    rq = rolling_apply(lambda y: (y @ weights), n_bars, close, n_jobs=n_jobs)
+    rq = rolling_dot(close, weights, n_jobs=n_jobs)
     rq /= weights.sum()
 
     if dropna:
@@ -337,10 +417,9 @@ def RBFK(
     if not n_bars:
         n_bars = close.shape[0]
 
-    bars = (np.arange(n_bars) ** 2.)[::-1]
-    weights = np.exp(-0.5 * bars / (window ** 2))
+    weights = rbfk_weights(window, n_bars)
 
-    rbfk = rolling_apply(lambda y: (y @ weights), n_bars, close, n_jobs=n_jobs)
+    rbfk = rolling_dot(close, weights, n_jobs=n_jobs)
     rbfk /= weights.sum()
 
     if dropna:
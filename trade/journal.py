@@ -0,0 +1,314 @@
+import os
+from enum import IntEnum
+from time import time_ns
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+class JournalKind(IntEnum):
+    CANDLE = 0
+    SIGNAL = 1
+    ORDER = 2
+    RESULT = 3
+    MODIFY = 4
+    CLOSE = 5
+    STATE = 6
+
+
+# One fixed size record per event. Fields not used by a kind are left as 0/NaN
+JournalDtype = np.dtype([
+    ("time", np.int64),          # nanoseconds since epoch when the record was written
+    ("kind", np.uint8),          # JournalKind
+    ("code", np.int16),          # signal, order type, broker retcode or asset state
+    ("symbol", "S12"),
+    ("ticket", np.int64),
+    ("candle_time", np.int64),   # time of the candle the event belongs to
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("tick_volume", np.float64),
+    ("price", np.float64),
+    ("volume", np.float64),
+    ("sl", np.float64),
+    ("tp", np.float64),
+])
+
+# Files start with a magic number and the record size, so a reader never
+# memory-maps a journal written with a different layout
+JournalMagic = b"DANAFXJ1"
+JournalHeader = np.dtype([("magic", "S8"), ("itemsize", np.int64)])
+
+
+class TradeJournal:
+    """Append-only binary journal of the decisions of a trading session.
+
+    Every event is a fixed size JournalDtype record: candles seen, entry and exit
+    signals, order requests, broker results, position modifications, closes and
+    state transitions. Records are buffered in a preallocated array and appended
+    to the file in blocks, so writing an event costs a few field assignments.
+    Read them back with `read_journal` and rebuild the state with `replay_journal`.
+
+    Args:
+        path (str): Journal file. Created with its header if it does not exist.
+        buffer_size (int, optional): Records kept in memory before writing them to the file. Defaults to 256.
+
+    Example:
+        >>> journal = TradeJournal("logs/session.journal")
+        >>> journal.signal("EURUSD", EntrySignal.BUY.value, candle.time, candle.close)
+        >>> journal.flush()
+    """
+
+    def __init__(self, path: str, buffer_size: int = 256) -> None:
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = np.zeros(buffer_size, dtype=JournalDtype)
+        self._size = 0
+
+        # Blank record with NaN prices, copied into a buffer slot before it is reused
+        self._blank = np.zeros((), dtype=JournalDtype)
+        for name in ("open", "high", "low", "close", "price", "sl", "tp"):
+            self._blank[name] = np.nan
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")
+        if is_new:
+            np.array([(JournalMagic, JournalDtype.itemsize)], dtype=JournalHeader).tofile(self._file)
+        else:
+            _check_header(path)
+
+    def _next(self, kind: JournalKind, symbol: str) -> np.void:
+        if self._size == self.buffer_size:
+            self.flush()
+        self._buffer[self._size] = self._blank
+        record = self._buffer[self._size]
+        self._size += 1
+
+        record["time"] = time_ns()
+        record["kind"] = kind
+        record["symbol"] = symbol
+        return record
+
+    def candle(self, symbol: str, candle: np.record) -> None:
+        record = self._next(JournalKind.CANDLE, symbol)
+        record["candle_time"] = candle.time
+        record["open"] = candle.open
+        record["high"] = candle.high
+        record["low"] = candle.low
+        record["close"] = candle.close
+        record["tick_volume"] = candle.tick_volume
+
+    def signal(self, symbol: str, signal: int, candle_time: int = 0, price: float = np.nan) -> None:
+        record = self._next(JournalKind.SIGNAL, symbol)
+        record["code"] = signal
+        record["candle_time"] = candle_time
+        record["price"] = price
+
+    def order(
+        self,
+        symbol: str,
+        order_type: int,
+        price: float,
+        volume: float,
+        sl: float = np.nan,
+        tp: float = np.nan,
+        candle_time: int = 0,
+    ) -> None:
+        record = self._next(JournalKind.ORDER, symbol)
+        record["code"] = order_type
+        record["price"] = price
+        record["volume"] = volume
+        record["sl"] = np.nan if sl is None else sl
+        record["tp"] = np.nan if tp is None else tp
+        record["candle_time"] = candle_time
+
+    def result(self, symbol: str, retcode: int, ticket: int = 0, price: float = np.nan, volume: float = 0) -> None:
+        record = self._next(JournalKind.RESULT, symbol)
+        record["code"] = retcode
+        record["ticket"] = ticket
+        record["price"] = price
+        record["volume"] = volume
+
+    def broker_result(self, symbol: str, order_result) -> None:
+        """Retcode, order ticket, price and volume of a request sent to the broker, i.e. a
+        mt5.OrderSendResult. Brokers that return nothing are not recorded."""
+        if order_result is None:
+            return
+        self.result(
+            symbol,
+            getattr(order_result, "retcode", 0),
+            getattr(order_result, "order", 0),
+            getattr(order_result, "price", np.nan),
+            getattr(order_result, "volume", 0),
+        )
+
+    def modify(self, symbol: str, ticket: int, sl: float, tp: float) -> None:
+        record = self._next(JournalKind.MODIFY, symbol)
+        record["ticket"] = ticket
+        record["sl"] = sl
+        record["tp"] = tp
+
+    def close_position(self, symbol: str, ticket: int, price: float = np.nan) -> None:
+        record = self._next(JournalKind.CLOSE, symbol)
+        record["ticket"] = ticket
+        record["price"] = price
+
+    def position(self, symbol: str, position) -> None:
+        """A position seen at the broker, i.e. once placed. Recorded as a RESULT with code 0."""
+        record = self._next(JournalKind.RESULT, symbol)
+        record["ticket"] = position.ticket
+        record["code"] = 0
+        record["price"] = position.price_open
+        record["volume"] = position.volume
+        record["sl"] = position.sl
+        record["tp"] = position.tp
+
+    def state(self, symbol: str, state: int) -> None:
+        record = self._next(JournalKind.STATE, symbol)
+        record["code"] = state
+
+    def flush(self) -> None:
+        if self._size:
+            self._buffer[:self._size].tofile(self._file)
+            self._size = 0
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> "TradeJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _check_header(path: str) -> None:
+    header = np.fromfile(path, dtype=JournalHeader, count=1)
+    if header.shape[0] == 0 or header[0]["magic"] != JournalMagic:
+        raise ValueError(f"{path} is not a danafx journal")
+    if header[0]["itemsize"] != JournalDtype.itemsize:
+        raise ValueError(
+            f"{path} records have {header[0]['itemsize']} bytes. Expected {JournalDtype.itemsize}")
+
+
+def read_journal(
+    path: str,
+    symbols: list = None,
+    start: int = None,
+    end: int = None,
+    kinds: list = None,
+) -> np.recarray:
+    """Memory-maps a journal and filters its records. The records of one writer are in
+    increasing time order and the time range is found with a binary search. Bots
+    sharing a journal append their buffered blocks interleaved, so those files are
+    filtered with a mask and the records merged by time. Only the filtered records
+    are copied out of the map.
+
+    Args:
+        path (str): Journal file.
+        symbols (list, optional): Symbols to keep. Defaults to None (all).
+        start (int, optional): First record time in nanoseconds since epoch. Defaults to None.
+        end (int, optional): Records up to this time (excluded). Defaults to None.
+        kinds (list, optional): JournalKind values to keep. Defaults to None (all).
+
+    Returns:
+        np.recarray: Selected records in time order. Records with the same time keep
+            the order they were written.
+    """
+    _check_header(path)
+    n_records = (os.path.getsize(path) - JournalHeader.itemsize) // JournalDtype.itemsize
+    if n_records == 0:
+        return np.zeros(0, dtype=JournalDtype).view(np.recarray)
+
+    records = np.memmap(path, dtype=JournalDtype, mode="r",
+                        offset=JournalHeader.itemsize, shape=(n_records,))
+
+    times = records["time"]
+    in_order = bool(np.all(times[1:] >= times[:-1]))
+    mask = None
+    if in_order:
+        first = 0 if start is None else np.searchsorted(times, start, side="left")
+        last = n_records if end is None else np.searchsorted(times, end, side="left")
+        records = records[first:last]
+    elif start is not None or end is not None:
+        mask = np.ones(n_records, dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+
+    if symbols is not None:
+        symbol_mask = np.isin(records["symbol"], np.array(symbols, dtype="S12"))
+        mask = symbol_mask if mask is None else mask & symbol_mask
+    if kinds is not None:
+        kind_mask = np.isin(records["kind"], np.array(kinds, dtype=np.uint8))
+        mask = kind_mask if mask is None else mask & kind_mask
+
+    if mask is not None:
+        records = records[mask]
+    if not in_order:
+        records = records[np.argsort(records["time"], kind="stable")]
+    return records.view(np.recarray)
+
+
+@dataclass
+class SessionState:
+    """State of a symbol rebuilt from a journal."""
+    symbol: str
+    state: int = 0
+    last_candle: np.void = None
+    last_signal: int = None
+    positions: dict = field(default_factory=dict)  # ticket -> (price, volume, sl, tp) of the positions seen
+    n_orders: int = 0
+    n_closed: int = 0
+
+
+def replay_journal(records: np.recarray) -> dict:
+    """Rebuilds the last state of every symbol in the records.
+
+    Args:
+        records (np.recarray): Records as returned by `read_journal`.
+
+    Returns:
+        dict: SessionState keyed by symbol.
+    """
+    sessions = {}
+    kinds = records["kind"]
+    symbols = records["symbol"]
+
+    # Only the events that change the state are visited one by one. The last
+    # candle and signal of each symbol are found with vectorized lookups
+    for symbol in np.unique(symbols):
+        name = symbol.decode()
+        session = sessions[name] = SessionState(name)
+        is_symbol = symbols == symbol
+
+        for kind, attribute in ((JournalKind.CANDLE, "last_candle"), (JournalKind.SIGNAL, "last_signal")):
+            found = np.flatnonzero(is_symbol & (kinds == kind))
+            if found.shape[0]:
+                record = records[found[-1]]
+                setattr(session, attribute, record if kind == JournalKind.CANDLE else int(record["code"]))
+
+        events = np.flatnonzero(is_symbol & (kinds >= JournalKind.ORDER))
+        for record in records[events]:
+            kind, ticket = record["kind"], int(record["ticket"])
+            if kind == JournalKind.ORDER:
+                session.n_orders += 1
+            elif kind == JournalKind.RESULT and ticket and record["code"] == 0:
+                session.positions[ticket] = (record["price"], record["volume"], record["sl"], record["tp"])
+            elif kind == JournalKind.MODIFY and ticket in session.positions:
+                price, volume, _, _ = session.positions[ticket]
+                session.positions[ticket] = (price, volume, record["sl"], record["tp"])
+            elif kind == JournalKind.CLOSE:
+                session.n_closed += session.positions.pop(ticket, None) is not None
+            elif kind == JournalKind.STATE:
+                session.state = int(record["code"])
+    return sessions
@@ -0,0 +1,528 @@
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+
+from datatools.custom import get_recarray
+
+# Static properties of a symbol needed to size its positions, as per mt5.symbol_info
+SymbolSpecDtype = np.dtype([
+    ("name", "U12"),
+    ("base_currency", "U3"),
+    ("quote_currency", "U3"),
+    ("digits", np.int16),
+    ("point", np.float64),
+    ("contract_size", np.float64),
+    ("volume_min", np.float64),
+    ("volume_max", np.float64),
+    ("volume_step", np.float64),
+])
+
+
+def get_symbol_specs(symbol_infos: list) -> np.recarray:
+    """Specs of the symbols from their broker info, i.e. mt5.symbol_info.
+
+    Args:
+        symbol_infos (list): Objects with name, digits, point, trade_contract_size,
+            volume_min, volume_max and volume_step attributes.
+
+    Returns:
+        np.recarray: One SymbolSpecDtype record per symbol.
+    """
+    specs = np.zeros(len(symbol_infos), dtype=SymbolSpecDtype).view(np.recarray)
+    for i, info in enumerate(symbol_infos):
+        specs[i] = (
+            info.name, info.name[:3], info.name[3:6], info.digits, info.point,
+            info.trade_contract_size, info.volume_min, info.volume_max, info.volume_step)
+    return specs
+
+
+def conversion_symbols(symbols: list, account_currency: str, available: list) -> list:
+    """Extra pairs whose prices are needed to convert the quote currency of every
+    symbol into the account currency.
+
+    Args:
+        symbols (list): Traded symbols in 'XXXYYY' format.
+        account_currency (str): Currency of the account balance.
+        available (list): Symbols offered by the broker.
+
+    Returns:
+        list: Symbols to add to the refreshed ticks. Either QUOTE+ACCOUNT or ACCOUNT+QUOTE.
+    """
+    available = set(available)
+    extra = []
+    for symbol in symbols:
+        quote = symbol[3:6]
+        if quote == account_currency:
+            continue
+        for pair in (quote + account_currency, account_currency + quote):
+            if pair in available:
+                if pair not in symbols and pair not in extra:
+                    extra.append(pair)
+                break
+        else:
+            raise ValueError(f"Could not find any exchange rate for {quote} with {account_currency}")
+    return extra
+
+
+class ConversionMatrix:
+    """Exchange rates between every pair of currencies from a snapshot of mid prices.
+
+    `rates[i, j]` is the amount of currency j bought with one unit of currency i.
+    Pairs not quoted directly are triangulated through the quoted ones, so a single
+    refresh per cycle serves every conversion of that cycle with the same prices.
+
+    Args:
+        currencies (list): Currency codes, i.e. ["EUR", "USD", "JPY"].
+    """
+
+    def __init__(self, currencies: list) -> None:
+        self.currencies = list(dict.fromkeys(currencies))
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.rates = np.full((len(self.currencies),) * 2, np.nan)
+        np.fill_diagonal(self.rates, 1.)
+
+    @classmethod
+    def from_symbols(cls, symbols: list) -> "ConversionMatrix":
+        currencies = [currency for symbol in symbols for currency in (symbol[:3], symbol[3:6])]
+        return cls(currencies)
+
+    def update(self, symbols: list, bids: np.ndarray, asks: np.ndarray) -> None:
+        """Refreshes the rates with the bid and ask prices of the given symbols."""
+        n = len(self.currencies)
+        rates = np.full((n, n), np.nan)
+        np.fill_diagonal(rates, 1.)
+
+        base = np.array([self.index[symbol[:3]] for symbol in symbols], dtype=np.intp)
+        quote = np.array([self.index[symbol[3:6]] for symbol in symbols], dtype=np.intp)
+        mids = (np.asarray(bids, dtype=np.float64) + np.asarray(asks, dtype=np.float64)) / 2
+        valid = mids > 0
+
+        rates[base[valid], quote[valid]] = mids[valid]
+        rates[quote[valid], base[valid]] = 1. / mids[valid]
+
+        # Triangulate the missing crosses through each currency in turn
+        for k in range(n):
+            if not np.isnan(rates).any():
+                break
+            through = rates[:, k, None] * rates[None, k, :]
+            np.copyto(rates, through, where=np.isnan(rates))
+        self.rates = rates
+
+    def rate(self, source: str, target: str) -> float:
+        return self.rates[self.index[source], self.index[target]]
+
+    def rates_to(self, sources: list, target: str) -> np.ndarray:
+        """Units of `target` per unit of each source currency."""
+        indexes = np.array([self.index[source] for source in sources], dtype=np.intp)
+        return self.rates[indexes, self.index[target]]
+
+
+def bound_lots(
+    lot_sizes: np.ndarray,
+    volume_min: np.ndarray,
+    volume_max: np.ndarray,
+    volume_step: np.ndarray,
+) -> np.ndarray:
+    """Vectorized bound_lot: lot sizes clipped to the allowed volumes and rounded to the volume step."""
+    lot_sizes = np.asarray(lot_sizes, dtype=np.float64)
+    stepped = volume_step * np.round(lot_sizes / volume_step)
+    return np.where(lot_sizes < volume_min, volume_min, np.where(lot_sizes > volume_max, volume_max, stepped))
+
+
+def calculate_stop_levels(
+    sides: np.ndarray,
+    prices: np.ndarray,
+    distances: np.ndarray,
+    rr_ratio: np.ndarray = None,
+) -> tuple:
+    """Vectorized calculate_sltp with distances in price units.
+
+    Args:
+        sides (np.ndarray): +1 for buy orders and -1 for sell orders.
+        prices (np.ndarray): Open prices.
+        distances (np.ndarray): Distances between the open price and the stop loss.
+        rr_ratio (np.ndarray, optional): Risk/reward ratios. Without it there is no take profit (0). Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: stop losses and take profits.
+    """
+    stop_losses = prices - sides * distances
+    if rr_ratio is None:
+        take_profits = np.zeros_like(stop_losses)
+    else:
+        take_profits = np.where(rr_ratio > 0, prices + sides * rr_ratio * distances, 0.)
+    return stop_losses, take_profits
+
+
+class RiskEngine:
+    """Sizes the positions of many symbols in one vectorized pass.
+
+    The engine keeps the symbol specs and a ConversionMatrix. Call `refresh` once per
+    cycle with the latest ticks of the traded and conversion symbols. Then `size`
+    calculates the lot sizes, stop levels, risked amounts and margin of all
+    pending signals against the same prices, without any call to the broker.
+
+    Args:
+        specs (np.recarray): Specs of the traded and conversion symbols. See `get_symbol_specs`.
+        account_currency (str): Currency of the account balance.
+        leverage (float, optional): Account leverage used for the margin. Defaults to 100.
+
+    Example:
+        >>> engine = RiskEngine(get_symbol_specs(infos), "USD", leverage=500)
+        >>> engine.refresh(bids, asks)
+        >>> orders = engine.size(["EURUSD", "USDJPY"], [1, -1], stop_losses, balance, 0.01)
+    """
+
+    def __init__(self, specs: np.recarray, account_currency: str, leverage: float = 100) -> None:
+        self.specs = specs
+        self.account_currency = account_currency
+        self.leverage = leverage
+        self.symbols = list(specs.name)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        currencies = [currency for symbol in self.symbols for currency in (symbol[:3], symbol[3:6])]
+        self.conversion = ConversionMatrix(currencies + [account_currency])
+
+        # Rows of the conversion matrix of each symbol currency, looked up once
+        self._base_rows = np.array(
+            [self.conversion.index[currency] for currency in specs.base_currency], dtype=np.intp)
+        self._quote_rows = np.array(
+            [self.conversion.index[currency] for currency in specs.quote_currency], dtype=np.intp)
+        self._account_column = self.conversion.index[account_currency]
+
+        self.bids = np.full(len(self.symbols), np.nan)
+        self.asks = np.full(len(self.symbols), np.nan)
+
+    def refresh(self, bids: np.ndarray, asks: np.ndarray) -> None:
+        """Latest bid and ask prices, in the order of the specs."""
+        self.bids = np.asarray(bids, dtype=np.float64)
+        self.asks = np.asarray(asks, dtype=np.float64)
+        self.conversion.update(self.symbols, self.bids, self.asks)
+
+    def _indexes(self, symbols: list) -> np.ndarray:
+        return np.array([self.index[symbol] for symbol in symbols], dtype=np.intp)
+
+    def open_prices(self, symbols: list, sides: np.ndarray) -> np.ndarray:
+        """Ask prices for buy orders and bid prices for sell orders."""
+        indexes = self._indexes(symbols)
+        return np.where(np.asarray(sides) > 0, self.asks[indexes], self.bids[indexes])
+
+    def size(
+        self,
+        symbols: list,
+        sides: np.ndarray,
+        stop_losses: np.ndarray,
+        balance: float,
+        risk_pct: np.ndarray,
+        take_profits: np.ndarray = None,
+    ) -> np.recarray:
+        """Lot sizes that risk `risk_pct` of the balance if the stop loss is hit.
+
+        Args:
+            symbols (list): Symbol of each order.
+            sides (np.ndarray): +1 for buy orders and -1 for sell orders.
+            stop_losses (np.ndarray): Stop loss prices.
+            balance (float): Account balance in the account currency.
+            risk_pct (np.ndarray): Fraction of the balance risked per order.
+            take_profits (np.ndarray, optional): Take profit prices. Defaults to None (0).
+
+        Returns:
+            np.recarray: price, lot_size, stop_loss, take_profit, risked and margin
+                (both in the account currency) of each order.
+        """
+        indexes = self._indexes(symbols)
+        specs = self.specs[indexes]
+        sides = np.asarray(sides, dtype=np.float64)
+        stop_losses = np.asarray(stop_losses, dtype=np.float64)
+        take_profits = np.zeros_like(stop_losses) if take_profits is None else np.asarray(take_profits, np.float64)
+        prices = np.where(sides > 0, self.asks[indexes], self.bids[indexes])
+
+        # Loss per lot in the quote currency, converted to the account currency
+        scales = 10. ** specs.digits
+        distances = np.round(np.abs(prices - stop_losses) * scales) / scales
+        quote_rates = self.conversion.rates[self._quote_rows[indexes], self._account_column]
+        loss_per_lot = specs.contract_size * distances * quote_rates
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lot_sizes = np.where(loss_per_lot > 0, balance * np.asarray(risk_pct) / loss_per_lot, 0.)
+        lot_sizes = bound_lots(lot_sizes, specs.volume_min, specs.volume_max, specs.volume_step)
+
+        # Margin of the base currency amount bought or sold
+        base_rates = self.conversion.rates[self._base_rows[indexes], self._account_column]
+        margins = lot_sizes * specs.contract_size * base_rates / self.leverage
+
+        return get_recarray([
+            prices, lot_sizes, stop_losses, take_profits,
+            lot_sizes * loss_per_lot, margins],
+            names=["price", "lot_size", "stop_loss", "take_profit", "risked", "margin"])
+
+
+class ExposureLedger:
+    """In-memory ledger of the open positions of every bot sharing an account.
+
+    Positions live in preallocated arrays indexed by slot, and the totals are kept
+    up to date on each fill, modification and close: net exposure per currency
+    (in units of that currency), open risk to the stop loss and margin usage (both
+    in the account currency). Checking the limits before an order is O(1).
+    Positions without stop loss risk their whole notional.
+
+    Orders book their exposure with `reserve` before they are sent, so bots
+    checking the limits at the same time can't both take the last room. The
+    reservation becomes the position on fill, or is released if there is none.
+
+    The ledger reads symbol specs and exchange rates from a RiskEngine. Call
+    `revalue` after refreshing the engine to price the totals with the new rates.
+
+    Args:
+        engine (RiskEngine): Specs and conversion rates of the symbols.
+        max_risk (float, optional): Maximum open risk to stop loss. Defaults to None (no limit).
+        max_margin (float, optional): Maximum margin usage. Defaults to None (no limit).
+        max_exposure (float, optional): Maximum absolute net exposure of any currency,
+            in the account currency. Defaults to None (no limit).
+        capacity (int, optional): Initial number of position slots. Grows when full. Defaults to 64.
+
+    Example:
+        >>> ledger = ExposureLedger(engine, max_risk=0.05 * balance)
+        >>> reservation = ledger.reserve("EURUSD", 1, 0.3, 1.0950)
+        >>> if reservation is not None:
+        ...     broker.create_order(...)
+        >>> ledger.open(position.ticket, "EURUSD", 1, 0.3, position.price_open, position.sl, reservation)
+    """
+
+    def __init__(
+        self,
+        engine: RiskEngine,
+        max_risk: float = None,
+        max_margin: float = None,
+        max_exposure: float = None,
+        capacity: int = 64,
+    ) -> None:
+        self.engine = engine
+        self.max_risk = max_risk
+        self.max_margin = max_margin
+        self.max_exposure = max_exposure
+
+        self._slots = {}  # ticket -> slot
+        self._reservations = set()  # negative keys of the slots booked by orders
+        self._next_reservation = -1
+        self._free = list(range(capacity - 1, -1, -1))
+        self._symbol = np.zeros(capacity, dtype=np.intp)
+        self._side = np.zeros(capacity)
+        self._volume = np.zeros(capacity)
+        self._price = np.zeros(capacity)
+        self._stop_loss = np.zeros(capacity)
+        self._risk = np.zeros(capacity)
+        self._margin = np.zeros(capacity)
+
+        self.exposure = np.zeros(len(engine.conversion.currencies))
+        self.total_risk = 0.
+        self.total_margin = 0.
+
+        # Monotonic time of the last revalue, for bots sharing the ledger to refresh it once
+        self.revalued_at = float("-inf")
+
+        # Bots may run on different threads
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots) - len(self._reservations)
+
+    def __contains__(self, ticket: int) -> bool:
+        return ticket in self._slots
+
+    def _grow(self) -> None:
+        capacity = self._side.shape[0]
+        for name in ("_symbol", "_side", "_volume", "_price", "_stop_loss", "_risk", "_margin"):
+            array = getattr(self, name)
+            grown = np.zeros(2 * capacity, dtype=array.dtype)
+            grown[:capacity] = array
+            setattr(self, name, grown)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _position_values(self, index: int, side: float, volume: float, price: float, stop_loss: float) -> tuple:
+        # Risk to stop loss and margin of a position, in the account currency
+        engine = self.engine
+        rates = engine.conversion.rates
+        units = volume * engine.specs.contract_size[index]
+        loss = side * (price - stop_loss) if stop_loss else price
+        risk = units * max(loss, 0.) * rates[engine._quote_rows[index], engine._account_column]
+        margin = units * rates[engine._base_rows[index], engine._account_column] / engine.leverage
+        return units, risk, margin
+
+    def _add_exposure(self, index: int, units: float, price: float) -> None:
+        # Buying the base currency is selling price times as much quote currency
+        self.exposure[self.engine._base_rows[index]] += units
+        self.exposure[self.engine._quote_rows[index]] -= units * price
+
+    def _add(self, ticket: int, index: int, side: int, volume: float, price: float, stop_loss: float,
+             values: tuple) -> None:
+        # Called with the lock held
+        units, risk, margin = values
+        if ticket in self._slots:
+            self._remove(ticket)
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slots[ticket] = slot
+
+        self._symbol[slot] = index
+        self._side[slot] = side
+        self._volume[slot] = volume
+        self._price[slot] = price
+        self._stop_loss[slot] = stop_loss
+        self._risk[slot] = risk
+        self._margin[slot] = margin
+
+        self._add_exposure(index, side * units, price)
+        self.total_risk += risk
+        self.total_margin += margin
+
+    def open(
+        self,
+        ticket: int,
+        symbol: str,
+        side: int,
+        volume: float,
+        price: float,
+        stop_loss: float = 0.,
+        reservation: int = None,
+    ) -> None:
+        """Adds a filled position. `side` is +1 for buy and -1 for sell positions.
+        The reservation of its order, if any, is replaced by the position."""
+        index = self.engine.index[symbol]
+        values = self._position_values(index, side, volume, price, stop_loss)
+        with self._lock:
+            if reservation is not None and reservation in self._slots:
+                self._remove(reservation)
+            self._add(ticket, index, side, volume, price, stop_loss, values)
+
+    def reserve(self, symbol: str, side: int, volume: float, stop_loss: float = 0., price: float = None) -> int:
+        """Books the exposure of an order if it keeps the ledger within its limits. The
+        check and the booking are atomic, so the other bots see the order at once.
+        Pass the key to `open` on fill, or to `release` if the order has no position.
+
+        Args:
+            symbol (str): Symbol of the order.
+            side (int): +1 for buy and -1 for sell orders.
+            volume (float): Lot size.
+            stop_loss (float, optional): Stop loss price. Defaults to 0 (none).
+            price (float, optional): Open price. Defaults to None (the engine ask or bid).
+
+        Returns:
+            int: Key of the reservation. None if the order breaks a limit.
+        """
+        index = self.engine.index[symbol]
+        if price is None:
+            price = self.engine.asks[index] if side > 0 else self.engine.bids[index]
+        values = self._position_values(index, side, volume, price, stop_loss)
+        with self._lock:
+            if not self._fits(index, side, price, values):
+                return None
+            reservation = self._next_reservation
+            self._next_reservation -= 1
+            self._add(reservation, index, side, volume, price, stop_loss, values)
+            self._reservations.add(reservation)
+        return reservation
+
+    def release(self, reservation: int) -> None:
+        """Drops the reservation of an order without position. Unknown keys are ignored."""
+        self.close(reservation)
+
+    def modify(self, ticket: int, stop_loss: float) -> None:
+        """Updates the stop loss of a position and its open risk."""
+        with self._lock:
+            slot = self._slots.get(ticket)
+            if slot is None:
+                return
+            _, risk, _ = self._position_values(
+                self._symbol[slot], self._side[slot], self._volume[slot], self._price[slot], stop_loss)
+            self.total_risk += risk - self._risk[slot]
+            self._stop_loss[slot] = stop_loss
+            self._risk[slot] = risk
+
+    def _remove(self, ticket: int) -> None:
+        slot = self._slots.pop(ticket)
+        self._reservations.discard(ticket)
+        index = self._symbol[slot]
+        units = self._side[slot] * self._volume[slot] * self.engine.specs.contract_size[index]
+        self._add_exposure(index, -units, self._price[slot])
+        self.total_risk -= self._risk[slot]
+        self.total_margin -= self._margin[slot]
+        self._risk[slot] = self._margin[slot] = 0.
+        self._free.append(slot)
+
+    def close(self, ticket: int) -> None:
+        """Removes a closed position. Unknown tickets are ignored."""
+        with self._lock:
+            if ticket in self._slots:
+                self._remove(ticket)
+
+    def sync(self, positions: list) -> None:
+        """Rebuilds the ledger from broker positions, i.e. mt5.positions_get().
+        Positions of symbols unknown to the engine are ignored. Reservations are kept.
+        """
+        with self._lock:
+            for ticket in list(self._slots):
+                if ticket not in self._reservations:
+                    self._remove(ticket)
+        for position in positions or ():
+            if position.symbol in self.engine.index:
+                side = 1 if position.type == 0 else -1
+                self.open(position.ticket, position.symbol, side, position.volume, position.price_open, position.sl)
+
+    def revalue(self) -> None:
+        """Prices the risk and margin of every position with the current engine rates."""
+        with self._lock:
+            self.revalued_at = monotonic()
+            slots = np.fromiter(self._slots.values(), dtype=np.intp, count=len(self._slots))
+            if slots.shape[0] == 0:
+                return
+            engine = self.engine
+            rates = engine.conversion.rates
+            indexes = self._symbol[slots]
+            units = self._volume[slots] * engine.specs.contract_size[indexes]
+            prices, stop_losses = self._price[slots], self._stop_loss[slots]
+
+            losses = np.where(stop_losses != 0, self._side[slots] * (prices - stop_losses), prices)
+            self._risk[slots] = units * np.maximum(losses, 0.) * rates[engine._quote_rows[indexes], engine._account_column]
+            self._margin[slots] = units * rates[engine._base_rows[indexes], engine._account_column] / engine.leverage
+            self.total_risk = self._risk[slots].sum()
+            self.total_margin = self._margin[slots].sum()
+
+    def currency_exposure(self, currency: str) -> float:
+        """Net exposure of a currency in the account currency. Positive if long."""
+        conversion = self.engine.conversion
+        row = conversion.index[currency]
+        return self.exposure[row] * conversion.rates[row, self.engine._account_column]
+
+    def can_open(self, symbol: str, side: int, volume: float, stop_loss: float = 0., price: float = None) -> bool:
+        """Whether a new position keeps the ledger within its limits. O(1).
+
+        Args:
+            symbol (str): Symbol of the order.
+            side (int): +1 for buy and -1 for sell orders.
+            volume (float): Lot size.
+            stop_loss (float, optional): Stop loss price. Defaults to 0 (none).
+            price (float, optional): Open price. Defaults to None (the engine ask or bid).
+        """
+        engine = self.engine
+        index = engine.index[symbol]
+        if price is None:
+            price = engine.asks[index] if side > 0 else engine.bids[index]
+        return self._fits(index, side, price, self._position_values(index, side, volume, price, stop_loss))
+
+    def _fits(self, index: int, side: int, price: float, values: tuple) -> bool:
+        engine = self.engine
+        units, risk, margin = values
+        if self.max_risk is not None and self.total_risk + risk > self.max_risk:
+            return False
+        if self.max_margin is not None and self.total_margin + margin > self.max_margin:
+            return False
+        if self.max_exposure is not None:
+            rates = engine.conversion.rates
+            base, quote = engine._base_rows[index], engine._quote_rows[index]
+            base_exposure = (self.exposure[base] + side * units) * rates[base, engine._account_column]
+            quote_exposure = (self.exposure[quote] - side * units * price) * rates[quote, engine._account_column]
+            if max(abs(base_exposure), abs(quote_exposure)) > self.max_exposure:
+                return False
+        return True
@@ -0,0 +1,79 @@
+import os
+import pickle
+from time import time_ns
+
+# Files start with a magic number, so a snapshot of another layout is never unpickled
+SnapshotMagic = b"DANAFXS1"
+
+
+def save_snapshot(path: str, strategies: dict, symbol: str = None, timeframe: str = None) -> None:
+    """Writes the fitted state of the strategies and the time of the last candle
+    each one has seen. The file is replaced atomically, so a crash while saving
+    keeps the previous snapshot.
+
+    Args:
+        path (str): Snapshot file.
+        strategies (dict): Strategies keyed by role, i.e. {"entry": entry_strategy, "exit": exit_strategy}.
+        symbol (str, optional): Symbol of the candles the strategies were fitted on. Defaults to None.
+        timeframe (str, optional): Timeframe of those candles. Defaults to None.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    snapshot = {
+        "time": time_ns(),
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "strategies": {
+            name: {
+                "spec": str(strategy),
+                "last_time": int(strategy.train_data.time[-1]),
+                "state": strategy.get_state(),
+            }
+            for name, strategy in strategies.items()
+        },
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(SnapshotMagic)
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str, strategies: dict, symbol: str = None, timeframe: str = None) -> dict:
+    """States of a snapshot for the given strategies. The states are not applied:
+    call `strategy.set_state(states[name]["state"])` once the missed candles are available.
+
+    Args:
+        path (str): Snapshot file written by save_snapshot.
+        strategies (dict): Strategies keyed by role, as they were saved.
+        symbol (str, optional): Symbol the snapshot must have been saved with. Defaults to None (any).
+        timeframe (str, optional): Timeframe the snapshot must have been saved with. Defaults to None (any).
+
+    Returns:
+        dict: Spec, last candle time and state of each strategy, keyed by role. None if there is
+            no snapshot or it doesn't match the strategies (other roles, classes or hyperparameters),
+            the symbol or the timeframe.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        if file.read(len(SnapshotMagic)) != SnapshotMagic:
+            return None
+        snapshot = pickle.load(file)
+
+    # Another market has other candles, so its history can't be continued
+    if symbol is not None and snapshot.get("symbol") != symbol:
+        return None
+    if timeframe is not None and snapshot.get("timeframe") != timeframe:
+        return None
+
+    states = snapshot["strategies"]
+
+    if set(states) != set(strategies):
+        return None
+    for name, strategy in strategies.items():
+        if states[name]["spec"] != str(strategy):
+            return None
+    return states
@@ -1,5 +1,22 @@
+import numpy as np
+
 from trade.metadata import EntrySignal, ExitSignal, AssetState
 
+# State that follows each AssetState code on AssetStateMachine.next
+NextStates = np.array([
+    AssetState.WAITING_POSITION.value,  # NULL_POSITION
+    AssetState.ON_POSITION.value,       # WAITING_POSITION
+    AssetState.NULL_POSITION.value,     # ON_POSITION
+], dtype=np.int8)
+
+# Lanes of resolve_states, one per trade cycle
+TradeCycleDtype = np.dtype([
+    ("lane", np.int64),
+    ("entry", np.int64),
+    ("fill", np.int64),
+    ("exit", np.int64),
+])
+
 
 class AssetStateMachine:
     """Define the state machine and its transitions
@@ -46,5 +63,195 @@ class AssetStateMachine:
         return self._state == AssetState.ON_POSITION
 
 
+
+class AssetStateArray:
+    """AssetStateMachine of `n_lanes` independent lanes, i.e. symbols or
+    parameter sets of a batch backtest, stored as an array of AssetState codes.
+
+    `next` advances the masked lanes with the same transitions as
+    AssetStateMachine.next and `step` applies one loop of SingleTraderBot to
+    every lane at once.
+
+    Args:
+        n_lanes (int): Number of lanes.
+        init_state (AssetState, optional): Initial state of every lane. Defaults to AssetState.NULL_POSITION.
+
+    Example:
+        >>> states = AssetStateArray(3)
+        >>> states.step(entries=np.array([True, False, True]), fills=np.array([True, False, False]))
+        >>> states.codes
+        array([2, 0, 1], dtype=int8)
+    """
+
+    def __init__(self, n_lanes: int, init_state: AssetState = AssetState.NULL_POSITION) -> None:
+        self.codes = np.full(n_lanes, init_state.value, dtype=np.int8)
+
+    def set(self, lanes: np.ndarray, state: AssetState) -> None:
+        self.codes[lanes] = state.value
+
+    def next(self, mask: np.ndarray = None) -> None:
+        # Same transitions as AssetStateMachine.next on the masked lanes
+        if mask is None:
+            self.codes = NextStates[self.codes]
+        else:
+            self.codes[mask] = NextStates[self.codes[mask]]
+
+    def step(
+        self,
+        entries: np.ndarray,
+        fills: np.ndarray = None,
+        exits: np.ndarray = None,
+    ) -> tuple:
+        """Applies one loop of SingleTraderBot.run to every lane, in its order:
+        an entry creates an order, then a filled order becomes a position and
+        then an exit closes it, all of them possibly on the same bar.
+
+        Args:
+            entries (np.ndarray): Whether each lane got an entry signal. See `is_entry`.
+            fills (np.ndarray, optional): Whether the order of each lane is filled. Defaults to None (always).
+            exits (np.ndarray, optional): Whether the position of each lane is closed, by an
+                exit signal or by the broker. Defaults to None (never).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: Masks of the lanes that created
+                an order, opened a position and closed a position.
+        """
+        created = self.null_position & entries
+        self.next(created)
+
+        placed = self.awaiting_position if fills is None else self.awaiting_position & fills
+        self.next(placed)
+
+        closed = np.zeros_like(placed) if exits is None else self.on_position & exits
+        self.next(closed)
+        return created, placed, closed
+
+    @staticmethod
+    def is_entry(signals: np.ndarray) -> np.ndarray:
+        # Vectorized AssetStateMachine.is_entry over EntrySignal values
+        return (signals == EntrySignal.BUY.value) | (signals == EntrySignal.SELL.value)
+
+    @staticmethod
+    def is_exit(signals: np.ndarray) -> np.ndarray:
+        # Vectorized AssetStateMachine.is_exit over ExitSignal values
+        return signals == ExitSignal.EXIT.value
+
+    @property
+    def null_position(self) -> np.ndarray:
+        return self.codes == AssetState.NULL_POSITION.value
+
+    @property
+    def awaiting_position(self) -> np.ndarray:
+        return self.codes == AssetState.WAITING_POSITION.value
+
+    @property
+    def on_position(self) -> np.ndarray:
+        return self.codes == AssetState.ON_POSITION.value
+
+
+def next_true(positions: np.ndarray, n_bars: int, lanes: np.ndarray, bars: np.ndarray) -> np.ndarray:
+    """Bar of the first True at or after `bars` on each of the `lanes` of a
+    (n_lanes, n_bars) mask, given the flat positions of its True values, i.e.
+    np.flatnonzero(mask). Lanes with no True afterwards get n_bars.
+
+    A binary search on the positions, so only the True values are kept in memory
+    instead of a dense lookup per bar.
+
+    Example:
+        >>> mask = np.array([[False, True, False, False, True, False]])
+        >>> next_true(np.flatnonzero(mask), 6, np.array([0, 0, 0]), np.array([0, 2, 5]))
+        array([1, 4, 6])
+    """
+    lane_starts = lanes * n_bars
+    found = positions.take(np.searchsorted(positions, lane_starts + bars), mode="clip") if positions.size else \
+        np.full(lanes.shape, np.iinfo(np.int64).max)
+    # Positions past the end of the lane belong to the next lanes
+    return np.where((found >= lane_starts + bars) & (found < lane_starts + n_bars), found - lane_starts, n_bars)
+
+
+def resolve_states(
+    entries: np.ndarray,
+    exits: np.ndarray,
+    fills: np.ndarray = None,
+    init_states: np.ndarray = None,
+    with_states: bool = True,
+) -> tuple:
+    """Resolves whole histories of independent lanes at once, with the same result
+    as calling AssetStateArray.step on each bar: no new entry while an order or a
+    position is on, and entries are blocked until the exit.
+
+    Each trade cycle is found with binary searches of the next entry, fill and
+    exit, so the loop runs once per trade of the busiest lane instead of once
+    per bar.
+
+    Args:
+        entries (np.ndarray): Entry signal masks with shape (n_lanes, n_bars), or (n_bars,) for one lane.
+        exits (np.ndarray): Masks of the bars where a position would be closed.
+        fills (np.ndarray, optional): Masks of the bars where an order would be filled.
+            Defaults to None (filled on the bar of the entry).
+        init_states (np.ndarray, optional): AssetState code of each lane before the first bar.
+            Defaults to None (NULL_POSITION).
+        with_states (bool, optional): Whether to build the (n_lanes, n_bars) codes. Without them
+            only the sparse trade cycles are kept in memory. Defaults to True.
+
+    Returns:
+        tuple[np.ndarray, np.recarray]: AssetState codes of each lane at the end of each
+            bar (None if not with_states), and the trade cycles (lane, entry, fill, exit bars) sorted by lane. Bars
+            of steps that never happened are n_bars, and -1 for the ones before the first bar.
+    """
+    entries = np.atleast_2d(entries)
+    n_lanes, n_bars = entries.shape
+    lanes = np.arange(n_lanes)
+
+    entry_positions = np.flatnonzero(entries)
+    exit_positions = np.flatnonzero(np.broadcast_to(np.atleast_2d(exits), entries.shape))
+    fill_positions = None if fills is None else np.flatnonzero(np.broadcast_to(np.atleast_2d(fills), entries.shape))
+
+    if init_states is None:
+        init_states = AssetState.NULL_POSITION.value
+    init_states = np.broadcast_to(np.asarray(init_states, dtype=np.int8), (n_lanes,))
+
+    # Lanes that start with an order or a position finish that trade first
+    started = init_states != AssetState.NULL_POSITION.value
+    waiting = init_states == AssetState.WAITING_POSITION.value
+    entry = np.full(n_lanes, -1)
+    fill = np.where(waiting, 0, -1)
+    if fill_positions is not None:
+        fill[waiting] = next_true(fill_positions, n_bars, lanes[waiting], fill[waiting])
+    exit = next_true(exit_positions, n_bars, lanes, np.maximum(fill, 0))
+
+    cycles = [(lanes[started], entry[started], fill[started], exit[started])]
+    cursor = np.where(started, exit + 1, 0)
+    active = cursor < n_bars
+    while active.any():
+        active_lanes = lanes[active]
+        entry = next_true(entry_positions, n_bars, active_lanes, cursor[active])
+        fill = entry if fill_positions is None else next_true(fill_positions, n_bars, active_lanes, entry)
+        exit = next_true(exit_positions, n_bars, active_lanes, fill)
+
+        found = entry < n_bars
+        cycles.append((active_lanes[found], entry[found], fill[found], exit[found]))
+        cursor[active_lanes] = exit + 1
+        active = cursor < n_bars
+
+    lane, entry, fill, exit = (np.concatenate(values) for values in zip(*cycles))
+    order = np.lexsort((entry, lane))
+    trades = np.empty(lane.shape[0], dtype=TradeCycleDtype).view(np.recarray)
+    trades.lane, trades.entry, trades.fill, trades.exit = lane[order], entry[order], fill[order], exit[order]
+
+    if not with_states:
+        return None, trades
+
+    # Each step adds its transition on its bar, then a running sum gives the codes.
+    # The bars of a step are different on each trade cycle of a lane
+    steps = np.zeros((n_lanes, n_bars + 1), dtype=np.int8)
+    steps[:, 0] = init_states
+    for bars, change in ((entry, 1), (fill, 1), (exit, -2)):
+        known = bars >= 0
+        steps[lane[known], bars[known]] += change
+    states = np.cumsum(steps[:, :n_bars], axis=1, dtype=np.int8)
+
+    return states, trades
+
 if __name__ == "__main__":
     s = AssetStateMachine()
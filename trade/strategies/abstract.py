@@ -5,7 +5,7 @@ from inspect import signature
 from collections import namedtuple
 
 from trade.metadata import EntrySignal, ExitSignal, TradePosition, CandleLike
-from datatools.custom import addpop_recarrays
+from datatools.custom import addpop_recarrays, get_recarray
 
 OHLCbounds = ("open", "high", "low", "close")
 
@@ -21,10 +21,12 @@ class Hyperparameter(
         name (str): The name of the hyperparameter. Note that a strategy using a
             hyperparameter with name "x" must have the @property x and @x.setter
         value_type (str): The type of the hyperparameter. Could be "numeric",
-            "categoric" or "boolean".
+            "categoric", "boolean", "interval" or "structured".
         bounds (Union[list, tuple]): If value_type="numeric" this should be the
             lower and upper bound on the parameter. If value_type="categoric"
-            this list represent all allowed options on the parameter.
+            this list represent all allowed options on the parameter. If
+            value_type="structured" this list represent all allowed functions
+            of the specs in the parameter's dict.
         fixed (bool): If True the string is passed, the hyperparameter's value
             cannot be changed. Default False
 
@@ -41,7 +43,7 @@ class Hyperparameter(
     __slots__ = ()
 
     def __new__(cls, name, value_type, bounds=None, fixed=False):
-        _allowed_types = ["numeric", "categoric", "boolean", "interval"]
+        _allowed_types = ["numeric", "categoric", "boolean", "interval", "structured"]
         if value_type not in _allowed_types:
             raise ValueError(f"Value type should be one of {_allowed_types}")
 
@@ -52,7 +54,7 @@ class Hyperparameter(
             elif value_type in ["numeric", "interval"] and len(bounds) != 2:
                 raise ValueError(
                     f"Bounds should have 2 dimensions. Given {len(bounds)}")
-            elif value_type == "categoric" and len(bounds) == 0:
+            elif value_type in ["categoric", "structured"] and len(bounds) == 0:
                 raise ValueError(
                     "Bounds should have at least 1 category. Given 0")
         else:
@@ -75,6 +77,9 @@ class Hyperparameter(
         elif self.value_type == "interval" and not isinstance(value, (tuple, list)):
             ValueError(
                 f"Hyperparameter {self.name} needs tuple or list value. Given {type(value).__name__}")
+        elif self.value_type == "structured" and not isinstance(value, dict):
+            raise ValueError(
+                f"Hyperparameter {self.name} needs dict value. Given {type(value).__name__}")
         # categoric value are allowed any
 
         if self.fixed and not init:
@@ -97,6 +102,126 @@ class Hyperparameter(
         elif self.value_type in ["categoric", "boolean"] and value not in self.bounds:
             raise ValueError(
                 f"Hyperparameter {self.name} should be between {self.bounds}. Given {value}")
+        # Structured type should only use allowed functions on its specs
+        elif self.value_type == "structured":
+            for key, spec in value.items():
+                if spec.get("function") not in self.bounds:
+                    raise ValueError(
+                        f"Hyperparameter {self.name}[{key}] function should be one of {self.bounds}. Given {spec.get('function')}")
+
+
+class SignalConfirmation:
+    """History of the last `window` signals of a strategy. A signal is confirmed
+    when it has been generated on each of the last `window` calls.
+
+    Signal values are kept in a fixed-size integer ring buffer together with a
+    running counter per value, so pushing a signal and checking a confirmation
+    are O(1) whatever the window length.
+
+    Args:
+        window (int, optional): Number of consecutive signals needed. Defaults to 1.
+
+    Example:
+        >>> confirmation = SignalConfirmation(2)
+        >>> confirmation.push(EntrySignal.BUY)
+        >>> confirmation.is_confirmed(EntrySignal.BUY)
+        False
+        >>> confirmation.push(EntrySignal.BUY)
+        >>> confirmation.is_confirmed(EntrySignal.BUY)
+        True
+    """
+    _EMPTY = np.iinfo(np.int16).min
+
+    def __init__(self, window: int = 1) -> None:
+        if window < 1:
+            raise ValueError(f"{window=} should be greater than 0")
+        self.window = window
+        self._signals = np.empty(window, dtype=np.int16)
+        self.reset()
+
+    def reset(self) -> None:
+        self._signals.fill(self._EMPTY)
+        self._position = 0
+        self._counts = {}
+
+    def push(self, signal: Union[EntrySignal, ExitSignal]) -> None:
+        # The oldest signal leaves the window and the new one takes its place
+        oldest = int(self._signals[self._position])
+        if oldest != self._EMPTY:
+            self._counts[oldest] -= 1
+
+        value = signal.value
+        self._signals[self._position] = value
+        self._counts[value] = self._counts.get(value, 0) + 1
+        self._position = (self._position + 1) % self.window
+
+    def count(self, signal: Union[EntrySignal, ExitSignal]) -> int:
+        return self._counts.get(signal.value, 0)
+
+    def is_confirmed(self, signal: Union[EntrySignal, ExitSignal]) -> bool:
+        return self._counts.get(signal.value, 0) == self.window
+
+
+def confirm_consecutive(mask: np.ndarray, window: int = 1) -> np.ndarray:
+    """Vectorized SignalConfirmation rule. True where the last `window` values of mask are True.
+
+    Args:
+        mask (np.ndarray): Whether the signal was generated on each bar.
+        window (int, optional): Number of consecutive signals needed. Defaults to 1.
+
+    Returns:
+        np.ndarray: Confirmed signals mask.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if window == 1:
+        return mask.copy()
+
+    # Number of signals in the last `window` bars from a running sum
+    running = np.cumsum(mask, dtype=np.int64)
+    counts = running.copy()
+    counts[window:] -= running[:-window]
+    confirmed = counts == window
+    confirmed[:window - 1] = False
+    return confirmed
+
+
+def check_batch_entry_signals(
+    strategy: "TradingStrategy",
+    candles: np.recarray,
+    start: int = None,
+) -> np.ndarray:
+    """Compares batch_entry_signals of a strategy with its streaming path.
+
+    The strategy is fitted with the candles before `start`, then each following
+    candle goes through generate_entry_signal and update_data as in a live
+    session. Then it is fitted with all the candles and the batch signals of
+    the same bars are compared. The strategy is left fitted with all the candles.
+
+    Args:
+        strategy (TradingStrategy): Strategy with batch_entry_signals.
+        candles (np.recarray): Candles to compare the signals on.
+        start (int, optional): First streamed candle. Defaults to half of the candles.
+
+    Returns:
+        np.ndarray: Indexes of the candles where the signals differ. Empty if both
+            paths are equivalent.
+    """
+    n_candles = candles.shape[0]
+    if start is None:
+        start = n_candles // 2
+
+    strategy.fit(candles[:start])
+    streamed = np.empty(n_candles - start, dtype=np.int8)
+    for i in range(start, n_candles):
+        streamed[i - start] = strategy.generate_entry_signal(candles[i]).value
+        strategy.update_data(candles[i:i + 1])
+
+    strategy.fit(candles)
+    signals = strategy.batch_entry_signals()
+    batch = np.where(signals.buy_index, EntrySignal.BUY.value,
+                     np.where(signals.sell_index, EntrySignal.SELL.value, EntrySignal.NEUTRAL.value))
+
+    return np.flatnonzero(streamed != batch[start:]) + start
 
 
 class AbstractStrategy(ABC):
@@ -132,6 +257,15 @@ class AbstractStrategy(ABC):
             params[name] = getattr(self, name)
         return params
 
+    def get_state(self) -> dict:
+        """Fitted state of the strategy, saved by trade.snapshot. Strategies with
+        caches that are cheap to rebuild can leave them out."""
+        return self.__dict__.copy()
+
+    def set_state(self, state: dict) -> None:
+        """Restores a state of get_state, as if the strategy had seen the same candles."""
+        self.__dict__.update(state)
+
     def __str__(self):
         params = self.get_params()
         str_params = ", ".join(
@@ -148,10 +282,26 @@ class TradingStrategy:
         self.train_data = None
         self.train_labels = None
         self.compound_mode = False
-        # TODO: jugar con la cantidad de signals
-        self.last_entry_signals = [None]
-        # TODO: jugar con la cantidad de signals
-        self.last_exit_signals = [None]
+        self.last_entry_signals = SignalConfirmation(1)
+        self.last_exit_signals = SignalConfirmation(1)
+
+    def set_confirmation(self, entry_window: int = 1, exit_window: int = 1) -> None:
+        """Sets the number of consecutive signals needed to confirm an entry and an exit."""
+        self.last_entry_signals = SignalConfirmation(entry_window)
+        self.last_exit_signals = SignalConfirmation(exit_window)
+
+    def confirm_batch_entry_signals(self, signals: np.recarray) -> np.recarray:
+        """Applies the entry confirmation rule to the output of batch_entry_signals."""
+        window = self.last_entry_signals.window
+        buy_entry_indexes = confirm_consecutive(signals.buy_index, window)
+        sell_entry_indexes = confirm_consecutive(signals.sell_index, window)
+        buy_entry_prices = np.where(buy_entry_indexes, signals.buy_price, np.nan)
+        sell_entry_prices = np.where(sell_entry_indexes, signals.sell_price, np.nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
 
     def fit(self, train_data: np.recarray, train_labels: np.recarray = None) -> None:
         self.train_data = train_data
@@ -182,14 +332,13 @@ class TradingStrategy:
         entry_signal = self.generate_entry_signal(candle)
         self.validate_entry_signal(entry_signal)
 
-        self.last_entry_signals.append(entry_signal)
-        self.last_entry_signals.pop(0)
+        self.last_entry_signals.push(entry_signal)
 
         # If last signals in queue are all the same, return equivalent trade signal.
-        if all(signal == EntrySignal.BUY for signal in self.last_entry_signals):
+        if self.last_entry_signals.is_confirmed(EntrySignal.BUY):
             return EntrySignal.BUY
 
-        elif all(signal == EntrySignal.SELL for signal in self.last_entry_signals):
+        elif self.last_entry_signals.is_confirmed(EntrySignal.SELL):
             return EntrySignal.SELL
 
         return EntrySignal.NEUTRAL
@@ -208,12 +357,11 @@ class TradingStrategy:
         exit_signal = self.generate_exit_signal(candle, position)
         self.validate_exit_signal(exit_signal)
 
-        self.last_exit_signals.append(exit_signal)
-        self.last_exit_signals.pop(0)
+        self.last_exit_signals.push(exit_signal)
 
         # If last signals in queue are all the same, return equivalent trade signal.
         # If not, return neutral signal
-        if all(signal == ExitSignal.EXIT for signal in self.last_exit_signals):
+        if self.last_exit_signals.is_confirmed(ExitSignal.EXIT):
             return ExitSignal.EXIT
         return ExitSignal.HOLD
 
@@ -232,6 +380,15 @@ class TradingStrategy:
             params[name] = getattr(self, name)
         return params
 
+    def get_state(self) -> dict:
+        """Fitted state of the strategy, saved by trade.snapshot. Strategies with
+        caches that are cheap to rebuild can leave them out."""
+        return self.__dict__.copy()
+
+    def set_state(self, state: dict) -> None:
+        """Restores a state of get_state, as if the strategy had seen the same candles."""
+        self.__dict__.update(state)
+
     def __str__(self):
         params = self.get_params()
         str_params = ", ".join(
@@ -242,8 +399,11 @@ class TradingStrategy:
 class EntryTradingStrategy(AbstractStrategy):
     def __init__(self):
         super().__init__()
-        # TODO: jugar con la cantidad de signals
-        self.last_entry_signals = [None]
+        self.last_entry_signals = SignalConfirmation(1)
+
+    def set_confirmation(self, entry_window: int = 1) -> None:
+        """Sets the number of consecutive signals needed to confirm an entry."""
+        self.last_entry_signals = SignalConfirmation(entry_window)
 
     def generate_entry_signal(self, candle: np.recarray):
         # Define your entry signal generation logic on this method
@@ -259,14 +419,13 @@ class EntryTradingStrategy(AbstractStrategy):
         entry_signal = self.generate_entry_signal(candle)
         self.validate_entry_signal(entry_signal)
 
-        self.last_entry_signals.append(entry_signal)
-        self.last_entry_signals.pop(0)
+        self.last_entry_signals.push(entry_signal)
 
         # If last signals in queue are all the same, return equivalent trade signal.
-        if all(signal == EntrySignal.BUY for signal in self.last_entry_signals):
+        if self.last_entry_signals.is_confirmed(EntrySignal.BUY):
             return EntrySignal.BUY
 
-        elif all(signal == EntrySignal.SELL for signal in self.last_entry_signals):
+        elif self.last_entry_signals.is_confirmed(EntrySignal.SELL):
             return EntrySignal.SELL
 
         return EntrySignal.NEUTRAL
@@ -275,7 +434,11 @@ class EntryTradingStrategy(AbstractStrategy):
 class ExitTradingStrategy(AbstractStrategy):
     def __init__(self):
         super().__init__()
-        self.last_exit_signals = [None]
+        self.last_exit_signals = SignalConfirmation(1)
+
+    def set_confirmation(self, exit_window: int = 1) -> None:
+        """Sets the number of consecutive signals needed to confirm an exit."""
+        self.last_exit_signals = SignalConfirmation(exit_window)
 
     @abstractmethod
     def generate_exit_signal(self, candle: np.recarray, position: TradePosition):
@@ -292,12 +455,11 @@ class ExitTradingStrategy(AbstractStrategy):
         exit_signal = self.generate_exit_signal(candle, position)
         self.validate_exit_signal(exit_signal)
 
-        self.last_exit_signals.append(exit_signal)
-        self.last_exit_signals.pop(0)
+        self.last_exit_signals.push(exit_signal)
 
         # If last signals in queue are all the same, return equivalent trade signal.
         # If not, return neutral signal
-        if all(signal == ExitSignal.EXIT for signal in self.last_exit_signals):
+        if self.last_exit_signals.is_confirmed(ExitSignal.EXIT):
             return ExitSignal.EXIT
         return ExitSignal.HOLD
 
@@ -333,10 +495,10 @@ class CompoundTradingStrategy(TradingStrategy):
         self.entry_strategy = entry_strategy
         self.exit_strategy = exit_strategy
 
-        # The minimum amount of bars is the maximum of all strategies
-        min_bars_entry = recursive_min_bars(entry_strategy)
-        min_bars_exit = recursive_min_bars(exit_strategy)
-        self.min_bars = max(min_bars_entry, min_bars_exit)
+        # The minimum amount of bars is the maximum of all strategies that were set
+        self.min_bars = max(
+            recursive_min_bars(tree) for tree in (entry_strategy, exit_strategy)
+            if tree is not None)
 
 
     def fit(self, train_data: np.recarray, train_labels: np.recarray = None):
@@ -353,16 +515,16 @@ class CompoundTradingStrategy(TradingStrategy):
         # recursive_fit(self.entry_strategy, train_data, train_labels)
         # recursive_fit(self.exit_strategy, train_data, train_labels)
 
-    def get_entry_signal(self):
-        if self.exit_strategy is None:
+    def get_entry_signal(self, *args):
+        if self.entry_strategy is None:
             raise ValueError("No EntryStrategy was set")
-        return recursive_get_entry_signal(self.entry_strategy)
+        return recursive_get_entry_signal(self.entry_strategy, *args)
 
-    def get_exit_signal(self):
+    def get_exit_signal(self, *args):
         if self.exit_strategy is None:
             raise ValueError("No ExitStrategy was set")
             # return ExitSignal.HOLD
-        return recursive_get_exit_signal(self.exit_strategy)
+        return recursive_get_exit_signal(self.exit_strategy, *args)
     
     def __str__(self):
         entry_strategy = str(self.entry_strategy)
@@ -408,21 +570,22 @@ def recursive_fit(tree, train_data, train_labels = None):
         recursive_fit(stgy, train_data, train_labels)
 
 
-def recursive_get_entry_signal(tree):
+def recursive_get_entry_signal(tree, *args):
+    # args (i.e. the current candle) are passed down to every strategy of the tree
     if isinstance(tree, (TradingStrategy, ExitTradingStrategy, EntryTradingStrategy)):  # the node is a strategy
-        return tree.get_entry_signal()
+        return tree.get_entry_signal(*args)
 
     operator, strategies = tree
 
     # The first strategy to get a entry signal
     if operator == 'priority':
         for stgy in strategies:
-            signal = recursive_get_entry_signal(stgy)
+            signal = recursive_get_entry_signal(stgy, *args)
             if signal != EntrySignal.NEUTRAL:
                 return signal
         return EntrySignal.NEUTRAL
 
-    signals = [recursive_get_entry_signal(stgy) for stgy in strategies]
+    signals = [recursive_get_entry_signal(stgy, *args) for stgy in strategies]
 
     # Any of the signals could be BUY or SELL.
     if operator == 'or':
@@ -443,21 +606,21 @@ def recursive_get_entry_signal(tree):
             return EntrySignal.NEUTRAL
 
 
-def recursive_get_exit_signal(tree):
+def recursive_get_exit_signal(tree, *args):
     if isinstance(tree, (TradingStrategy, ExitTradingStrategy, EntryTradingStrategy)):  # the node is a strategy
-        return tree.get_exit_signal()
+        return tree.get_exit_signal(*args)
 
     operator, strategies = tree
 
     # The first strategy to get a entry signal
     if operator == 'priority':
         for stgy in strategies:
-            signal = recursive_get_exit_signal(stgy)
+            signal = recursive_get_exit_signal(stgy, *args)
             if signal != ExitSignal.HOLD:
                 return signal
         return ExitSignal.HOLD
 
-    signals = [recursive_get_exit_signal(stgy) for stgy in strategies]
+    signals = [recursive_get_exit_signal(stgy, *args) for stgy in strategies]
 
     # Any of the signals could be BUY or SELL.
     if operator == 'or':
@@ -1,5 +1,7 @@
+from trade.metadata import EntrySignal
 from trade.strategies.abstract import Hyperparameter, TradingStrategy
-from numpy import recarray
+from datatools.custom import get_recarray
+from numpy import recarray, where, nan
 
 
 class BandPriceStrategy(TradingStrategy):
@@ -33,10 +35,22 @@ class BandPriceStrategy(TradingStrategy):
         self.config_sell_band._check_bounds(sell_band)
         self._sell_band = sell_band
 
-    def generate_entry_signal(self, datum: recarray):
+    def generate_entry_signal(self, datum: recarray) -> EntrySignal:
         if self._buy_band[0] <= datum.close <= self._buy_band[1]:
-            return 0  # buy
+            return EntrySignal.BUY
         elif self._sell_band[0] <= datum.close <= self._sell_band[1]:
-            return 1  # sell
+            return EntrySignal.SELL
         else:
-            return -1  # neutral
+            return EntrySignal.NEUTRAL
+
+    def batch_entry_signals(self) -> recarray:
+        closes = self.train_data.close
+        buy_entry_indexes = (self._buy_band[0] <= closes) & (closes <= self._buy_band[1])
+        sell_entry_indexes = ~buy_entry_indexes & (self._sell_band[0] <= closes) & (closes <= self._sell_band[1])
+        buy_entry_prices = where(buy_entry_indexes, closes, nan)
+        sell_entry_prices = where(sell_entry_indexes, closes, nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
@@ -38,7 +38,20 @@ def get_exits(candles, length, lag, as_prices: bool = False):
     return buy_exits, sell_exits
 
 def get_entries(entry_signals, as_prices: bool = False):
-    if not as_prices:
+    # batch_entry_signals gives buy_index/buy_price fields. Older signals have buy/sell masks or prices
+    if "buy_index" in entry_signals.dtype.names:
+        buy_entry_indexes = np.where(entry_signals.buy_index)[0]
+        sell_entry_indexes = np.where(entry_signals.sell_index)[0]
+        if not as_prices:
+            buy_entries = get_recarray([buy_entry_indexes], names="indexes")
+            sell_entries = get_recarray([sell_entry_indexes], names="indexes")
+        else:
+            buy_entries = get_recarray([buy_entry_indexes, entry_signals.buy_price[buy_entry_indexes]],
+                                       names=['indexes', 'prices'])
+            sell_entries = get_recarray([sell_entry_indexes, entry_signals.sell_price[sell_entry_indexes]],
+                                        names=['indexes', 'prices'])
+
+    elif not as_prices:
         # entry signals are booleans arrays so extract indexes where you find Trues
         buy_entry_indexes = np.where(entry_signals.buy)[0]
         sell_entry_indexes = np.where(entry_signals.sell)[0]
@@ -86,9 +99,9 @@ def match_signals(
     as_prices: bool = False,
     is_buy: bool = False,
     only_profit: bool = False,
-    last_price: float = np.NaN,
 ) -> np.recarray:
-    # Create new arrays to store exit information
+    # Create new arrays to store exit information. Entries without exit are left as NaN
+    # (still open at the end of the data)
     exit_indexes =  exits.indexes
     confirmed_exit_indexes = np.full(n, np.NaN)
 
@@ -97,19 +110,16 @@ def match_signals(
         confirmed_exit_prices = np.full(n, np.NaN)
 
     last_index = n - 1
-    for entry_i, entry_p in entries:
+    for entry in entries:
+        entry_i = entry.indexes
         if entry_i >= last_index: continue
 
         if only_profit:
-            exit_i = find_exit_profit(entry_i + lag, entry_p, exit_indexes, exit_prices, is_buy, as_index=True)
+            exit_i = find_exit_profit(entry_i + lag, entry.prices, exit_indexes, exit_prices, is_buy, as_index=True)
         else:
             exit_i = find_supreme(entry_i + lag, exit_indexes, as_index=True)
 
-        if exit_i is None:
-            confirmed_exit_indexes[entry_i] = last_index
-            if as_prices:
-                confirmed_exit_prices[entry_i] = last_price
-        else:
+        if exit_i is not None:
             confirmed_exit_indexes[entry_i] = exit_indexes[exit_i]
             if as_prices:
                 confirmed_exit_prices[entry_i] = exit_prices[exit_i]
@@ -261,23 +271,22 @@ class DirectionChangeExitStrategy(ExitTradingStrategy):
         if n != m:
             raise ValueError(f"entry_signals lenght must be {m} but received {n}")
 
-        buy_entries, sell_entries = get_entries(entry_signals, as_prices)
-        buy_exits, sell_exits = get_exits(self.train_data, self._length, self._lag, as_prices)
+        # Exits on profit compare prices, even if only the indexes are returned
+        with_prices = as_prices or self._only_profit
+        if with_prices and "buy_index" not in entry_signals.dtype.names \
+                and entry_signals.dtype["buy"] == np.bool_:
+            raise ValueError("entry_signals have no prices. as_prices and only_profit need the ones of batch_entry_signals")
+
+        buy_entries, sell_entries = get_entries(entry_signals, with_prices)
+        buy_exits, sell_exits = get_exits(self.train_data, self._length, self._lag, with_prices)
+        buy_exit_signals = match_signals(buy_entries, buy_exits, n, self._lag, with_prices, True, self._only_profit)
+        sell_exit_signals = match_signals(sell_entries, sell_exits, n, self._lag, with_prices, False, self._only_profit)
 
         if not as_prices:
-            buy_exit_signals = match_signals(buy_entries, buy_exits, n, self._lag, True, True)
-            sell_exit_signals = match_signals(sell_entries, sell_exits, n, self._lag, True, False)
+            if with_prices:
+                buy_exit_signals, sell_exit_signals = buy_exit_signals[0], sell_exit_signals[0]
             return get_recarray([buy_exit_signals, sell_exit_signals], names=["buy", "sell"])
-
-        else:
-            last_price = self.train_data[-1].close
-            if self._only_profit:
-                buy_exit_prices = match_signals(buy_entries, buy_exits, n, self._lag, True, True, True, last_price)
-                sell_exit_prices = match_signals(sell_entries, sell_exits, n, self._lag, True, False, True, last_price)
-            else:
-                buy_exit_prices = match_signals(buy_entries, buy_exits, n, self._lag, True, True, last_price=last_price)
-                sell_exit_prices = match_signals(sell_entries, sell_exits, n, self._lag, True, False, last_price=last_price)
-            return get_recarray([*buy_exit_prices, *sell_exit_prices], names=["buy", "buy_price", "sell", "sell_price"])
+        return get_recarray([*buy_exit_signals, *sell_exit_signals], names=["buy", "buy_price", "sell", "sell_price"])
 
         # if self._lag == 0:
         #     buy_exit_prices = np.where(buy_exit_signals, opens - self.length, np.NaN)
@@ -1,12 +1,18 @@
 from sklearn.gaussian_process.kernels import RBF, WhiteKernel, ExpSineSquared, RationalQuadratic
 from sklearn.gaussian_process import GaussianProcessRegressor
 import numpy as np
+from numpy import recarray
 import matplotlib.pyplot as plt
+import pickle
 import time
 
+from trade.metadata import EntrySignal
+from trade.strategies.abstract import Hyperparameter, TradingStrategy
+from trade.strategies.ml.sliding_gp import SlidingGaussianProcess
+
 
 class GaussianStockRegressor:
-    def __init__(self) -> None:
+    def __init__(self, warm_start: bool = False) -> None:
         # TODO: poner de parametros los modificadores del kernel
         # expsinsqrt = ExpSineSquared(1.0, 15.0, periodicity_bounds=(1e-3, 1e4))
         # noice = WhiteKernel(1e-2, noise_level_bounds=(1e-7, 1e-4))
@@ -24,6 +30,7 @@ class GaussianStockRegressor:
 
         # kernel = 1.0 * expsinsqrt * rbf + noice
 
+        self.warm_start = warm_start
         self.gaussian_process = GaussianProcessRegressor(
             kernel=self.rq_kernel,
             alpha=0.001**2,
@@ -34,6 +41,11 @@ class GaussianStockRegressor:
     def fit(self, train_data, train_target) -> None:
         self.train_data = train_data
         self.train_target = train_target
+
+        # Start from the last optimized kernel instead of restarting the optimizer
+        if self.warm_start and hasattr(self.gaussian_process, "kernel_"):
+            self.gaussian_process.set_params(
+                kernel=self.gaussian_process.kernel_, n_restarts_optimizer=0)
         self.gaussian_process.fit(self.train_data, self.train_target)
 
     def predict(self, data, return_std: str = True) -> np.ndarray:
@@ -48,8 +60,100 @@ class GaussianStockRegressor:
             pickle.dump(self.gaussian_process, model_file)
 
 
+class GaussianRegressorStrategy(TradingStrategy):
+    """Forecasts the close price `horizon` bars ahead with a Gaussian process over
+    the last `window` closes. A BUY (SELL) signal is generated when the forecast
+    is above (below) the current close by more than `threshold` standard deviations.
+
+    The kernel is optimized on `fit` and every `refit_every` bars, warm started
+    from the last optimized kernel. Between refits the Cholesky factorization
+    is updated as the window slides, so each bar is O(window²).
+    """
+    config_window = Hyperparameter("window", "numeric", (2, 6000))
+    config_refit_every = Hyperparameter("refit_every", "numeric", (0, 100000))
+    config_horizon = Hyperparameter("horizon", "numeric", (1, 100))
+    config_threshold = Hyperparameter("threshold", "numeric", (0, 100))
+
+    def __init__(
+        self,
+        window: int = 500,
+        refit_every: int = 100,
+        horizon: int = 1,
+        threshold: float = 1.0,
+        kernel=None,
+    ) -> None:
+        super().__init__()
+        # Check if hyperparameters met the criteria
+        self.config_window._check_bounds(window, init=True)
+        self.config_refit_every._check_bounds(refit_every, init=True)
+        self.config_horizon._check_bounds(horizon, init=True)
+        self.config_threshold._check_bounds(threshold, init=True)
+
+        self._window = window
+        self._refit_every = refit_every
+        self._horizon = horizon
+        self._threshold = threshold
+        self.min_bars = window
+
+        if kernel is None:
+            kernel = GaussianStockRegressor().rq_kernel
+        self._gaussian_process = SlidingGaussianProcess(
+            kernel, window=window, alpha=0.001**2, refit_every=refit_every)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def refit_every(self):
+        return self._refit_every
+
+    @property
+    def horizon(self):
+        return self._horizon
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, threshold):
+        self.config_threshold._check_bounds(threshold)
+        self._threshold = threshold
+
+    def fit(self, train_data: recarray, train_labels: recarray = None) -> None:
+        if not self.compound_mode:
+            super().fit(train_data, train_labels)
+
+        # Bars are indexed by their position. Stationary kernels only see differences
+        closes = train_data.close[-self._window:]
+        self._last_index = closes.shape[0] - 1
+        self._gaussian_process.fit(np.arange(closes.shape[0]), closes)
+
+    def update_data(self, new_data: recarray) -> None:
+        if not self.is_new_data(new_data):
+            return
+
+        if not self.compound_mode:
+            super().update_data(new_data)
+
+        for close in new_data.close:
+            self._last_index += 1
+            self._gaussian_process.slide(self._last_index, close)
+
+    def generate_entry_signal(self, candle: recarray) -> EntrySignal:
+        # The candle in progress is the next bar after the window
+        x = self._last_index + 1 + self._horizon
+        mean, std = self._gaussian_process.predict(x)
+
+        if mean[0] - candle.close > self._threshold * std[0]:
+            return EntrySignal.BUY
+        elif candle.close - mean[0] > self._threshold * std[0]:
+            return EntrySignal.SELL
+        return EntrySignal.NEUTRAL
+
+
 if __name__ == "__main__":
-    import pickle
     import matplotlib.pyplot as plt
     from datatools.pipeflow import preprocess_stock_data
     from setup import get_settings
@@ -1,30 +1,42 @@
-from numpy import recarray, append, sqrt
-from sklearn.neighbors import KNeighborsClassifier
+import numpy as np
+from numpy import recarray
 
-from trade.strategies.abstract import Hyperparameter, TradingStrategy, OHLCbounds
-from trade.indicators import RSI, ADX, CCI, WT, get_stable_min_bars #TODO: mover estos indicadores a una funcion que solo te los calcule (pipeline) y te los agregue a tu train_data
+from trade.metadata import CandleLike, EntrySignal
+from trade.strategies.abstract import Hyperparameter, TradingStrategy
+from trade.strategies.ml.lorentzian_knn import LorentzianKNN
+from datatools.pipeflow import FeaturePipeline, FeatureFunctions
+from datatools.custom import get_recarray
+from datatools.feature_engineering import triple_barrier_labels
+
+PredictionHorizon = 4
 
-IndicatorBounds = ["RSI", "ADX", "CCI", "WT"]
 
 class LorentzianClassifierStrategy(TradingStrategy):
     """This model specializes specifically in predicting the direction of price
     action over the course of the next 4 bars. To avoid complications with the
     ML model, this value is hardcoded to 4 bars but support for other training
     lengths may be added in the future.
+
+    Neighbors are searched with a LorentzianKNN engine among the last `window`
+    labelled bars, one every `neighbors_leap` bars, and the engine is updated
+    incrementally when a bar enters and the oldest one leaves the window. Features
+    are built by a FeaturePipeline from the `sources` specs, so the training
+    matrix and the live candles share the same normalized representation. Live
+    rows are calculated from the last `min_bars` of the pipeline, enough for the
+    indicators to equal the ones of the whole history. In batch_entry_signals the
+    rows of the first of those candles of train_data are still warming up.
     """
-    config_sources = Hyperparameter("sources", "structured", IndicatorBounds) #TODO: structured
+    config_sources = Hyperparameter("sources", "structured", FeatureFunctions)
     config_window = Hyperparameter("window", "numeric", (2, 6000))
-    config_n_neighbors = Hyperparameter("n_neighbors", "numeric", (0, 100))
-    config_neighbors_leap = Hyperparameter("neighbors_leap", "interval", (0, 100))
-    config_n_jobs = Hyperparameter("n_jobs", "numeric", (1, 5))
+    config_n_neighbors = Hyperparameter("n_neighbors", "numeric", (1, 100))
+    config_neighbors_leap = Hyperparameter("neighbors_leap", "numeric", (1, 100))
 
     def __init__(
         self,
-        sources: list,
+        sources: dict,
         window: int = 2000,
-        n_neighbors: int = 4,
+        n_neighbors: int = 8,
         neighbors_leap: int = 4,
-        n_jobs: int = 1
     ) -> None:
         super().__init__()
         # Check if hyperparameters met the criteria
@@ -32,127 +44,128 @@ class LorentzianClassifierStrategy(TradingStrategy):
         self.config_window._check_bounds(window, init=True)
         self.config_n_neighbors._check_bounds(n_neighbors, init=True)
         self.config_neighbors_leap._check_bounds(neighbors_leap, init=True)
-        self.config_n_jobs._check_bounds(n_jobs, init=True)
 
-        # define the number of neighbors to use
         self._sources = sources
         self._window = window
         self._n_neighbors = n_neighbors
         self._neighbors_leap = neighbors_leap
-        self._n_jobs = n_jobs
-
-        self.min_bars = window
 
-        # create the KNN classifier using the Lorentzian distance metric
-        self.knn_classifier = KNeighborsClassifier(
-            n_neighbors=self._n_neighbors,
-            n_jobs=self._n_jobs,
-            metric=self._modif_lorentzian_distance,
-            weights=self._distance_weights,
-            # metric_params={"lookback_window": 2000},
+        # Feature rows of the labelled window plus the bars still waiting for a label
+        self._pipeline = FeaturePipeline(sources, capacity=window + PredictionHorizon)
+        self._feature_bars = self._pipeline.min_bars
+        self.min_bars = self._feature_bars + window + PredictionHorizon
+
+        # create the KNN engine using the Lorentzian distance metric
+        self._knn = LorentzianKNN(
+            n_features=len(sources),
+            n_neighbors=n_neighbors,
+            window=window,
+            neighbors_leap=neighbors_leap,
         )
 
-    def fit(self, train_data: recarray, train_target: recarray):
-        # fit the model
-
-        for name, specs in self._sources:
-            values = pipeline(train_data, specs)
-            values = copy_fromat(values, train_data, name)
-            append(train_data, )
-        self._train_data = train_data
-        self._train_target = train_target
-        
-        self.knn_classifier.fit(self._train_data, self._train_target)
-
-    def generate_entry_signal(self, candle: recarray) -> int:
-        return self.knn_classifier.predict(data) # TODO
-
-    def predict2(self, data: Any) -> Any:
-        predictions = np.full(data.shape[0], 0)
-        for x1 in data:
-            i1 = x1[0]  # chronologycal index
-            is_past = self._train_data[:, 0] < i1
-            only_leap = ~((self._train_data[:, 0] - i1) % self._neighbors_leap)
-            x2s = self._train_data[is_past & only_leap]
-            distances = self._lorentzian_distance(x1, x2s)
-            neighbor_count = 0
-            largest_distance = -1
-            for i, d in enumerate(distances):
-                if largest_distance:
-                    pass  # TODO
-
-    def update_data(self, new_data: Any) -> None:
-        # TODO: modificar esta funcion para poder actualizar los datos de entrenamiento cada cierto tiempo/iteraciones
-        raise NotImplemented
-
-    def _lorentzian_distance(self, x1: np.ndarray, x2s: np.ndarray) -> np.ndarray:
-        return np.sum(np.log(1 + np.abs(x2s[:, 1:] - x1[1:])), axis=1)
-
-    def _modif_lorentzian_distance(self, x1: np.ndarray, x2: np.ndarray) -> float:
-        i1, i2 = x1[0], x2[0]  # get the chronological index of both points
-        is_not_in_window = (i1 <= i2) or (i1 > i2 + self._lookback_window)
-        # TODO: cambiar esta cosa por 4 velas atras de i2 (experimentar)
-        # (i1 - i2) % self._neighbors_leap
-        skip_neighbor = i1 % self._neighbors_leap
-        if skip_neighbor or is_not_in_window:
-            # print(i1, i2, np.inf)
-            return np.inf
-        # print(i1, i2, np.sum(np.log(1 + np.abs(x1[1:] - x2[1:]))))
-        return np.sum(np.log(1. + np.abs(x1[1:] - x2[1:])))
-
-    def _distance_weights(self, distances: np.ndarray) -> np.ndarray:
-        # convert inf distance to 0, they will be disregarded
-        is_inf = np.isinf(distances)
-        distances[is_inf] = 0
-
-        # normalize weigths using their distance. Further points will have less impact
-        # TODO: tener este parametro para modificaciones
-        elongated_distances = distances**3
-        sum_weighted = np.sum(elongated_distances, axis=1, keepdims=True)
-        new_weights = np.divide(
-            elongated_distances,
-            sum_weighted,
-            out=np.zeros_like(distances),
-            where=(sum_weighted != 0)
-        )
-        return new_weights
+    @property
+    def sources(self):
+        return self._sources
 
+    @property
+    def window(self):
+        return self._window
 
-if __name__ == "__main__":
-    # import pandas as pd
-    from setup import get_settings
-    from trade.brokers.mt5broker import TraderBot
-    # from matplotlib.pyplot import plot, savefig
+    @property
+    def n_neighbors(self):
+        return self._n_neighbors
+
+    @property
+    def neighbors_leap(self):
+        return self._neighbors_leap
+
+    def get_features(self, candles: CandleLike) -> np.ndarray:
+        """Feature matrix with one column per source and one row per candle."""
+        return self._pipeline.transform(candles)
+
+    def get_labels(self, candles: CandleLike) -> np.ndarray:
+        """Direction of the price in the next PredictionHorizon bars. Last bars are unknown (0)"""
+        # Triple barrier labels with the vertical barrier only
+        return triple_barrier_labels(candles, PredictionHorizon).label
+
+    def fit(self, train_data: recarray, train_labels: recarray = None) -> None:
+        if not self.compound_mode:
+            super().fit(train_data, train_labels)
+
+        # Scaling parameters are learnt here and frozen for the live candles
+        features = self._pipeline.fit(train_data)
+        labels = self.get_labels(train_data)[-features.shape[0]:]
 
-    strategy_settings = get_settings(
-        "settings\demo\lorentzian_classifier.json")
+        # Only bars with a known direction are neighbors. The rest wait for their label
+        self._knn.fit(features[:-PredictionHorizon], labels[:-PredictionHorizon])
 
-    # Import project settings
-    login_settings = get_settings("settings/demo/login.json")
-    # trading_settings = get_settings("settings/demo/trading.json")
-    mt5_login_settings = login_settings["mt5_login"]
+        self._batch = train_data[-self._feature_bars - PredictionHorizon:]
 
-    trader = TraderBot()
-    trader.start_session(mt5_login_settings)
-    trader.initialize_symbols(["EURUSD"])
+    def update_data(self, new_data: recarray) -> None:
+        if not self.is_new_data(new_data):
+            return
 
-    df = trader.query_historic_data("EURUSD", "H4", 5000)
-    source_columns = strategy_settings["source_data"].keys()
+        if not self.compound_mode:
+            super().update_data(new_data)
+        self._batch = self.train_data[-self._feature_bars - PredictionHorizon:]
 
-    data, target = None, None  # TODO
-    train_data = data  # [:-90, :]
-    train_target = target  # [:-90]
+        # Only the feature rows of the new bars are calculated
+        n_new = new_data.shape[0]
+        features = self._pipeline.update(self.train_data, n_new)
+        closes = self._batch.close
+
+        # Each new bar reveals the label of the bar PredictionHorizon bars ago
+        for t in range(-n_new, 0):
+            label = np.sign(closes[t] - closes[t - PredictionHorizon])
+            self._knn.add(features[t - PredictionHorizon], label)
+
+    def generate_entry_signal(self, candle: recarray) -> EntrySignal:
+        batch = np.append(self._batch[-self._feature_bars:], candle).view(recarray)
+        score = self._knn.predict_score(self._pipeline.transform_last(batch))
+
+        if score > 0:
+            return EntrySignal.BUY
+        elif score < 0:
+            return EntrySignal.SELL
+        return EntrySignal.NEUTRAL
+
+    def batch_entry_signals(self) -> np.recarray:
+        features = self.get_features(self.train_data)
+        labels = self.get_labels(self.train_data)
+
+        # The newest neighbor of a candle is the last one whose label was known when it opened
+        scores = self._knn.batch_predict_score(features, labels, delay=PredictionHorizon + 1)
+
+        buy_entry_indexes = scores > 0
+        sell_entry_indexes = scores < 0
+        closes = self.train_data.close
+        buy_entry_prices = np.where(buy_entry_indexes, closes, np.nan)
+        sell_entry_prices = np.where(sell_entry_indexes, closes, np.nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from pandas import read_csv
+    from utils.config import get_settings
 
-    test_data = data[-204:-4]
-    test_target = target[-204:-4]
+    strategy_settings = get_settings("settings/demo/lorentzian_classifier.json")
+    candles = read_csv("data/raw/eurusd_10k.csv").to_records(index=False)
 
-    loren_classifier = LorentzianClassifier(
+    loren_classifier = LorentzianClassifierStrategy(
+        strategy_settings["source_data"],
         **strategy_settings["init"]
     )
 
-    loren_classifier.fit(train_data, train_target)
-    pred_target = loren_classifier.predict(test_data)
+    train_data, test_data = candles[:-200], candles[-200:]
+    loren_classifier.fit(train_data)
 
-    print(test_target)
-    print(pred_target)
-    print((test_target == pred_target).sum() / 200)
+    start = perf_counter()
+    for i in range(test_data.shape[0]):
+        loren_classifier.generate_entry_signal(test_data[i])
+        loren_classifier.update_data(test_data[i:i + 1].view(recarray))
+    print(f"{(perf_counter() - start) / test_data.shape[0] * 1e3:.3f} ms per bar")
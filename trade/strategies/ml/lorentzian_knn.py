@@ -0,0 +1,174 @@
+import numpy as np
+
+from datatools.custom import SlidingBuffer
+
+
+def lorentzian_distance(x1: np.ndarray, x2s: np.ndarray) -> np.ndarray:
+    """Calculates the Lorentzian distance sum(log(1 + |x1 - x2|)) between a point
+    and a block of points. Broadcasting is allowed, the sum is over the last axis.
+
+    Args:
+        x1 (np.ndarray): Reference point(s) with shape (..., n_features).
+        x2s (np.ndarray): Points to compare with shape (..., n_features).
+
+    Returns:
+        np.ndarray: Distances with NaN values replaced by inf. Those points are never neighbors.
+    """
+    distances = np.log1p(np.abs(x2s - x1)).sum(axis=-1)
+    distances[np.isnan(distances)] = np.inf
+    return distances
+
+
+class LorentzianKNN:
+    """Approximate nearest neighbors classifier with the Lorentzian distance.
+
+    The engine keeps the last `window` labelled bars in a preallocated feature
+    matrix. Only every `neighbors_leap` bar counted backwards from the newest one
+    is a neighbor candidate, so the chronological window and the leap are resolved
+    by a zero-copy strided view and distances are computed as a single vectorized
+    block. The prediction is the sum of the labels of the `n_neighbors` closest
+    candidates.
+
+    Args:
+        n_features (int): Number of features of each bar.
+        n_neighbors (int, optional): Number of neighbors that vote. Defaults to 8.
+        window (int, optional): Number of past bars kept as training data. Defaults to 2000.
+        neighbors_leap (int, optional): Spacing in bars between neighbor candidates. Defaults to 4.
+        dtype (data-type, optional): Type of the feature matrix. Defaults to np.float32.
+    """
+
+    def __init__(
+        self,
+        n_features: int,
+        n_neighbors: int = 8,
+        window: int = 2000,
+        neighbors_leap: int = 4,
+        dtype=np.float32,
+    ) -> None:
+        if n_neighbors < 1:
+            raise ValueError(f"{n_neighbors=} should be greater than 0")
+        if neighbors_leap < 1:
+            raise ValueError(f"{neighbors_leap=} should be greater than 0")
+
+        self.n_features = n_features
+        self.n_neighbors = n_neighbors
+        self.window = window
+        self.neighbors_leap = neighbors_leap
+        self.dtype = dtype
+
+        self._features = SlidingBuffer(window, (n_features,), dtype)
+        self._labels = SlidingBuffer(window, (), np.int8, 0)
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def fit(self, features: np.ndarray, labels: np.ndarray) -> None:
+        """Replace the training data with the last `window` labelled bars.
+
+        Args:
+            features (np.ndarray): Feature matrix with shape (n_bars, n_features).
+            labels (np.ndarray): Label of each bar. Usually -1, 0 or 1.
+        """
+        features = np.asarray(features, dtype=self.dtype)
+        labels = np.asarray(labels, dtype=np.int8)
+        if features.shape[0] != labels.shape[0]:
+            raise ValueError(
+                f"features and labels must have the same length. Given {features.shape[0]} and {labels.shape[0]}")
+
+        self._features.clear()
+        self._labels.clear()
+        self._features.extend(features)
+        self._labels.extend(labels)
+
+    def add(self, feature: np.ndarray, label: int) -> None:
+        """A new labelled bar enters the window and the oldest one leaves it."""
+        self._features.append(feature)
+        self._labels.append(label)
+
+    def _candidates(self) -> tuple:
+        # Newest bar first, then one every `neighbors_leap` bars. Both are views, not copies
+        features = self._features.values[::-self.neighbors_leap]
+        labels = self._labels.values[::-self.neighbors_leap]
+        return features, labels
+
+    def kneighbors(self, x: np.ndarray) -> tuple:
+        """Finds the nearest neighbors of a single point.
+
+        Args:
+            x (np.ndarray): Features of the point with shape (n_features,).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: distances and labels of the neighbors.
+        """
+        features, labels = self._candidates()
+        distances = lorentzian_distance(np.asarray(x, dtype=self.dtype), features)
+
+        k = min(self.n_neighbors, distances.shape[0])
+        if k < distances.shape[0]:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            distances, labels = distances[nearest], labels[nearest]
+
+        valid = np.isfinite(distances)
+        return distances[valid], labels[valid]
+
+    def predict_score(self, x: np.ndarray) -> int:
+        """Sum of the labels of the nearest neighbors of x."""
+        _, labels = self.kneighbors(x)
+        return int(labels.sum())
+
+    def predict(self, x: np.ndarray) -> int:
+        """Predicted direction of x: 1, -1 or 0 if the neighbors are undecided."""
+        return int(np.sign(self.predict_score(x)))
+
+    def batch_predict_score(
+        self,
+        features: np.ndarray,
+        labels: np.ndarray,
+        delay: int = 1,
+        chunk_size: int = 1024,
+    ) -> np.ndarray:
+        """Replays the engine over a whole history without building it bar by bar.
+
+        For each bar i, the candidates are the bars i - delay, i - delay - leap, ...
+        that are still inside the chronological window, exactly as if the engine had
+        been updated online with one new labelled bar per candle.
+
+        Args:
+            features (np.ndarray): Feature matrix with shape (n_bars, n_features).
+            labels (np.ndarray): Label of each bar. Labels not yet known when a bar is
+                predicted are never used as long as `delay` is greater than the horizon.
+            delay (int, optional): Bars between a prediction and the newest candidate. Defaults to 1.
+            chunk_size (int, optional): Number of bars predicted per vectorized block. Defaults to 1024.
+
+        Returns:
+            np.ndarray: Prediction score of each bar.
+        """
+        features = np.asarray(features, dtype=self.dtype)
+        labels = np.asarray(labels, dtype=np.int8)
+        n = features.shape[0]
+
+        # Candidate offsets from the newest candidate, one every leap bars inside the window
+        offsets = np.arange(0, self.window, self.neighbors_leap)
+        k = min(self.n_neighbors, offsets.shape[0])
+        scores = np.zeros(n, dtype=np.int64)
+
+        for start in range(0, n, chunk_size):
+            rows = np.arange(start, min(start + chunk_size, n))
+            newest = rows - delay
+            candidates = newest[:, None] - offsets[None, :]
+            valid = candidates >= 0
+            candidates[~valid] = 0
+
+            distances = lorentzian_distance(features[rows, None, :], features[candidates])
+            distances[~valid] = np.inf
+
+            if k < offsets.shape[0]:
+                nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(k), (rows.shape[0], k))
+
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            nearest_labels = labels[np.take_along_axis(candidates, nearest, axis=1)]
+            scores[rows] = np.where(np.isfinite(nearest_distances), nearest_labels, 0).sum(axis=1)
+
+        return scores
@@ -0,0 +1,148 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import Kernel
+
+
+def cholesky_downdate_first(L: np.ndarray) -> np.ndarray:
+    """Cholesky factor of K[1:, 1:] given the lower factor L of K.
+
+    With L = [[l11, 0], [l21, L22]], K[1:, 1:] = L22 L22^T + l21 l21^T, so the
+    new factor is a rank-one update of L22. O(n²) instead of O(n³).
+
+    Args:
+        L (np.ndarray): Lower Cholesky factor with shape (n, n).
+
+    Returns:
+        np.ndarray: Lower Cholesky factor with shape (n - 1, n - 1).
+    """
+    L22 = L[1:, 1:].copy()
+    v = L[1:, 0].copy()
+    for k in range(L22.shape[0]):
+        lkk = L22[k, k]
+        r = np.hypot(lkk, v[k])
+        c, s = r / lkk, v[k] / lkk
+        L22[k, k] = r
+        if k + 1 < L22.shape[0]:
+            L22[k + 1:, k] = (L22[k + 1:, k] + s * v[k + 1:]) / c
+            v[k + 1:] = c * v[k + 1:] - s * L22[k + 1:, k]
+    return L22
+
+
+class SlidingGaussianProcess:
+    """Gaussian process regressor over a sliding window of observations.
+
+    The kernel hyperparameters are optimized with sklearn on `fit` and every
+    `refit_every` slides, warm started from the last optimized kernel. In between,
+    the Cholesky factor of K + alpha * I is kept and updated when a point enters
+    (triangular solve) and the oldest one leaves (rank-one update), so each bar
+    costs O(n²) instead of the O(n³) of a full refit.
+
+    Args:
+        kernel (Kernel): Initial sklearn kernel.
+        window (int, optional): Number of observations kept. Defaults to 500.
+        alpha (float, optional): Value added to the diagonal of the kernel matrix. Defaults to 1e-6.
+        refit_every (int, optional): Slides between hyperparameter optimizations.
+            0 means never after the first fit. Defaults to 100.
+        n_restarts_optimizer (int, optional): Optimizer restarts of the first fit. Warm
+            refits start from the last optimized kernel without restarts. Defaults to 8.
+    """
+
+    def __init__(
+        self,
+        kernel: Kernel,
+        window: int = 500,
+        alpha: float = 1e-6,
+        refit_every: int = 100,
+        n_restarts_optimizer: int = 8,
+    ) -> None:
+        if window < 2:
+            raise ValueError(f"{window=} should be greater than 1")
+        if refit_every < 0:
+            raise ValueError(f"{refit_every=} should be positive")
+
+        self.kernel = kernel
+        self.window = window
+        self.alpha = alpha
+        self.refit_every = refit_every
+        self.n_restarts_optimizer = n_restarts_optimizer
+
+        self.kernel_ = None
+        self._slides = 0
+
+    def _optimize(self, n_restarts_optimizer: int) -> None:
+        kernel = self.kernel if self.kernel_ is None else self.kernel_
+        gaussian_process = GaussianProcessRegressor(
+            kernel=kernel,
+            alpha=self.alpha,
+            n_restarts_optimizer=n_restarts_optimizer,
+        )
+        gaussian_process.fit(self._X, self._y - self._y.mean())
+        self.kernel_ = gaussian_process.kernel_
+        self._L = gaussian_process.L_
+        self._slides = 0
+        self._solve()
+
+    def _solve(self) -> None:
+        # Weights of the posterior mean. Two triangular solves, O(n²)
+        self._y_mean = self._y.mean()
+        self._weights = solve_triangular(
+            self._L.T, solve_triangular(self._L, self._y - self._y_mean, lower=True), lower=False)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> None:
+        """Optimizes the kernel with the last `window` observations. Warm started
+        if the process was already fitted.
+        """
+        self._X = np.asarray(X, dtype=np.float64).reshape(len(y), -1)[-self.window:]
+        self._y = np.asarray(y, dtype=np.float64)[-self.window:]
+        restarts = self.n_restarts_optimizer if self.kernel_ is None else 0
+        self._optimize(restarts)
+
+    def slide(self, x: np.ndarray, y: float) -> None:
+        """A new observation enters the window and the oldest one leaves it
+        once the window is full.
+        """
+        x = np.asarray(x, dtype=np.float64).reshape(1, -1)
+
+        # Append the new point: the factor grows by one row
+        k = self.kernel_(self._X, x)[:, 0]
+        l12 = solve_triangular(self._L, k, lower=True)
+        l22 = np.sqrt(max(self.kernel_.diag(x)[0] + self.alpha - l12 @ l12, self.alpha))
+
+        n = self._L.shape[0]
+        L = np.zeros((n + 1, n + 1))
+        L[:n, :n] = self._L
+        L[n, :n] = l12
+        L[n, n] = l22
+
+        self._X = np.vstack((self._X, x))
+        self._y = np.append(self._y, y)
+
+        # Remove the oldest point with a rank-one update
+        if self._y.shape[0] > self.window:
+            L = cholesky_downdate_first(L)
+            self._X = self._X[1:]
+            self._y = self._y[1:]
+
+        self._L = L
+        self._slides += 1
+        if self.refit_every and self._slides >= self.refit_every:
+            self._optimize(0)
+        else:
+            self._solve()
+
+    def predict(self, X: np.ndarray, return_std: bool = True) -> tuple:
+        """Posterior mean and standard deviation at X.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: mean and std. std is None if not requested.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self._X.shape[1])
+        K_trans = self.kernel_(X, self._X)
+        mean = K_trans @ self._weights + self._y_mean
+        if not return_std:
+            return mean, None
+
+        v = solve_triangular(self._L, K_trans.T, lower=True)
+        variance = np.clip(self.kernel_.diag(X) - np.einsum("ij,ij->j", v, v), 0, None)
+        return mean, np.sqrt(variance)
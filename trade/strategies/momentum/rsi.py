@@ -1,5 +1,7 @@
-from numpy import recarray, append
+from numpy import recarray, append, where, nan, isnan
 
+from datatools.custom import get_recarray, shift
+from trade.metadata import EntrySignal
 from trade.strategies.abstract import Hyperparameter, TradingStrategy, OHLCbounds
 from trade.indicators import RSI, get_stable_min_bars
 
@@ -30,6 +32,11 @@ def is_on_band(value: float, band: tuple[float]):
     return band[0] <= value <= band[1]
 
 
+def batch_is_on_band(values: recarray, band: tuple[float]) -> recarray:
+    # Vectorized is_on_band. NaN values are never on band
+    return (band[0] <= values) & (values <= band[1])
+
+
 class RsiStrategy(TradingStrategy):
     config_window = Hyperparameter("window", "numeric", (2, 1000))
     config_buy_band = Hyperparameter("buy_band", "interval", (0, 100))
@@ -104,6 +111,10 @@ class RsiStrategy(TradingStrategy):
         self.config_source._check_bounds(source)
         self._source = source
 
+    @property
+    def lookback(self):
+        return self._lookback
+
     @property
     def mode(self):
         return self._mode
@@ -125,37 +136,68 @@ class RsiStrategy(TradingStrategy):
         # Select optimal batch
         self._batch = self.train_data[self._source][-self.min_bars:]
 
-    def generate_entry_signal(self, candle: recarray) -> int:
+    def generate_entry_signal(self, candle: recarray) -> EntrySignal:
         # Calculate RSI for current candle
-        batch = append(self._batch, candle.close)
+        batch = append(self._batch, candle[self._source])
         rsis = RSI(batch, self._window)
         rsi = rsis[-1+self._lookback]
 
         if self._mode == "outband":
             prev_rsi = rsis[-2+self._lookback]
-            print(f"{prev_rsi=:.2f} {rsi=:.2f}")
             if is_on_band(prev_rsi, self._buy_band) and not is_on_band(rsi, self._buy_band):
-                return 0  # buy
+                return EntrySignal.BUY
             elif is_on_band(prev_rsi, self._sell_band) and not is_on_band(rsi, self._sell_band):
-                return 1  # sell
+                return EntrySignal.SELL
             else:
-                return -1  # neutral
+                return EntrySignal.NEUTRAL
 
         elif self._mode == "inband":
             prev_rsi = rsis[-2+self._lookback]
-            # print(f"{prev_rsi=:.2f} {rsi=:.2f}")
             if not is_on_band(prev_rsi, self._buy_band) and is_on_band(rsi, self._buy_band):
-                return 0  # buy
+                return EntrySignal.BUY
             elif not is_on_band(prev_rsi, self._sell_band) and is_on_band(rsi, self._sell_band):
-                return 1  # sell
+                return EntrySignal.SELL
             else:
-                return -1  # neutral
+                return EntrySignal.NEUTRAL
 
         elif self._mode == "onband":
             # Return signal only if last rsi touches sell/buy bands
             if is_on_band(rsi, self._buy_band):
-                return 0  # buy
+                return EntrySignal.BUY
             elif is_on_band(rsi, self._sell_band):
-                return 1  # sell
+                return EntrySignal.SELL
             else:
-                return -1  # neutral
+                return EntrySignal.NEUTRAL
+
+    def batch_entry_signals(self) -> recarray:
+        # RSI of every bar. With lookback = -1 the signal of a bar uses the RSI of the previous one
+        rsis = shift(RSI(self.train_data[self._source], self._window), -self._lookback, nan)
+        prev_rsis = shift(rsis, 1, nan)
+
+        on_buy_band = batch_is_on_band(rsis, self._buy_band)
+        on_sell_band = batch_is_on_band(rsis, self._sell_band)
+
+        if self._mode == "outband":
+            buy_entry_indexes = batch_is_on_band(prev_rsis, self._buy_band) & ~on_buy_band
+            sell_entry_indexes = batch_is_on_band(prev_rsis, self._sell_band) & ~on_sell_band
+        elif self._mode == "inband":
+            buy_entry_indexes = ~batch_is_on_band(prev_rsis, self._buy_band) & on_buy_band
+            sell_entry_indexes = ~batch_is_on_band(prev_rsis, self._sell_band) & on_sell_band
+        elif self._mode == "onband":
+            buy_entry_indexes = on_buy_band
+            sell_entry_indexes = on_sell_band
+
+        # Bars without the RSIs they need never trigger. A buy signal has priority over a sell one
+        valid = ~isnan(rsis) if self._mode == "onband" else ~isnan(prev_rsis)
+        buy_entry_indexes &= valid
+        sell_entry_indexes &= valid & ~buy_entry_indexes
+
+        # Signals using the current RSI trigger at the close, else at the open
+        prices = self.train_data.close if self._lookback == 0 else self.train_data.open
+        buy_entry_prices = where(buy_entry_indexes, prices, nan)
+        sell_entry_prices = where(sell_entry_indexes, prices, nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
@@ -1,10 +1,11 @@
-from numpy import recarray, append, nanargmax, arange
+from numpy import recarray, arange
+from numpy.lib.stride_tricks import sliding_window_view
 import numpy as np
 
-from trade.metadata import CandleLike
+from trade.metadata import CandleLike, EntrySignal
 from trade.strategies.abstract import Hyperparameter, TradingStrategy
-from trade.indicators import ATR_, SMA_, STDDEV_, VAR_
 from trade.indicators import PIVOTHIGH, PIVOTLOW
+from datatools.custom import SlidingBuffer, SlidingExtremum, get_recarray
 
 # Stream indicators. Only returns last value
 
@@ -56,26 +57,178 @@ def last_nonnan(arr):
     return np.max(np.where(~mask))
 
 
+def rolling_slopes(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    window: int,
+    alpha: float,
+    method: str,
+) -> np.ndarray:
+    """Trendline slope of every bar calculated with the `window` bars that end on it.
+
+    Args:
+        high (np.ndarray): High values.
+        low (np.ndarray): Low values.
+        close (np.ndarray): Close values.
+        window (int): Number of bars used by the method.
+        alpha (float): Slope multiplier.
+        method (str): One of "atr", "stdev" or "linreg".
+
+    Returns:
+        np.ndarray: Slopes. The first `window` bars are NaN.
+    """
+    slopes = np.full(close.shape[0], np.nan)
+    if close.shape[0] <= window:
+        return slopes
+
+    if method == "atr":
+        # Wilder's ATR seeded with the plain mean of the true ranges
+        prev_close = close[:-1]
+        true_range = np.maximum(high[1:] - low[1:], np.maximum(
+            np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+        slopes[window:] = alpha * sliding_window_view(true_range, window).mean(axis=1) / window
+    elif method == "stdev":
+        closes = sliding_window_view(close, window)[1:]
+        slopes[window:] = alpha * closes.std(axis=1) / window
+    elif method == "linreg":
+        closes = sliding_window_view(close, window)[1:]
+        bar_indexes = arange(window)
+        covariance = (closes * bar_indexes).mean(axis=1) - closes.mean(axis=1) * bar_indexes.mean()
+        slopes[window:] = 2 * alpha * np.abs(covariance / bar_indexes.var())
+    else:
+        raise ValueError(f"{method=} not supported. Must be ['atr', 'stdev', 'linreg']")
+    return slopes
+
+
 def calc_slope(
     data: CandleLike,
     window: int,
     alpha: float,
     method: str
 ) -> float:
-    # s = data.shape[0]
-    # slice_data = data[s - bar_index - window: s - bar_index + 1]
+    """Trendline slope of the last bar of data. At least `window` + 1 bars are needed."""
+    data = data[-window - 1:]
+    return rolling_slopes(data.high, data.low, data.close, window, alpha, method)[-1]
 
-    h = data.high
-    l = data.low
-    c = data.close
 
-    if method == "atr":
-        return alpha * ATR_(h, l, c, window) / window
-    elif method == "stdev":
-        return alpha * STDDEV_(c, window) / window
-    elif method == "linreg":
-        bar_indexes = arange(window)
-        return 2 * alpha * abs((SMA_(c[-window:] * bar_indexes, window) - SMA_(c[-window:], window) * SMA_(bar_indexes, window)) / VAR_(bar_indexes, window))
+class TrendlineTracker:
+    """Incremental pivot and trendline state of TrendlineBreakStrategy.
+
+    A pivot high (low) is the highest (lowest) bar of the `window` bars at both of
+    its sides, so it is confirmed exactly `window` bars after it forms. From the
+    last confirmed pivots, a descending line is projected from the high pivot and
+    an ascending one from the low pivot with the slope of the `window` bars that
+    end on each pivot.
+
+    Only the last 2 * `window` + 1 bars are kept and their extremes are tracked
+    with monotonic deques, so each new bar is amortized O(1) as well as projecting
+    the lines. `batch_lines`
+    calculates the lines of a whole history at once for backtests.
+
+    Args:
+        window (int): Bars at each side of a pivot.
+        alpha (float, optional): Slope multiplier. Defaults to 1.
+        method (str, optional): Slope method. One of "atr", "stdev" or "linreg". Defaults to "stdev".
+    """
+
+    def __init__(self, window: int, alpha: float = 1, method: str = "stdev") -> None:
+        self.window = window
+        self.alpha = alpha
+        self.method = method
+
+        # high, low and close of the bars around the next pivot candidate
+        self._bars = SlidingBuffer(2 * window + 1, (3,))
+        self._highest = SlidingExtremum(2 * window + 1, "max")
+        self._lowest = SlidingExtremum(2 * window + 1, "min")
+        self.reset()
+
+    def reset(self) -> None:
+        self._bars.clear()
+        self._highest.reset()
+        self._lowest.reset()
+        self.hp_value = self.hp_slope = self.hp_bars = None
+        self.lp_value = self.lp_slope = self.lp_bars = None
+
+    def fit(self, candles: CandleLike) -> None:
+        """Restarts the tracker from the last pivots of the given candles."""
+        self.reset()
+        n = candles.shape[0]
+        high_pivots = PIVOTHIGH(candles.high, self.window, self.window)
+        low_pivots = PIVOTLOW(candles.low, self.window, self.window)
+
+        hp_index = last_nonnan(high_pivots)
+        if hp_index is not None:
+            self.hp_value = high_pivots[hp_index]
+            self.hp_slope = calc_slope(candles[:hp_index + 1], self.window, self.alpha, self.method)
+            self.hp_bars = n - hp_index
+
+        lp_index = last_nonnan(low_pivots)
+        if lp_index is not None:
+            self.lp_value = low_pivots[lp_index]
+            self.lp_slope = calc_slope(candles[:lp_index + 1], self.window, self.alpha, self.method)
+            self.lp_bars = n - lp_index
+
+        tail = candles[-(2 * self.window + 1):]
+        self._bars.extend(np.column_stack((tail.high, tail.low, tail.close)))
+        self._highest.extend(tail.high)
+        self._lowest.extend(tail.low)
+
+    def update(self, high: float, low: float, close: float) -> None:
+        """A new bar has closed. The middle bar of the buffer is checked as a pivot."""
+        self._bars.append((high, low, close))
+        self._highest.update(high)
+        self._lowest.update(low)
+        if self.hp_bars is not None:
+            self.hp_bars += 1
+        if self.lp_bars is not None:
+            self.lp_bars += 1
+        if not self._bars.is_full:
+            return
+
+        bars = self._bars.values
+        w = self.window
+        if bars[w, 0] == self._highest.value:
+            self.hp_value = bars[w, 0]
+            self.hp_slope = rolling_slopes(*bars[:w + 1].T, w, self.alpha, self.method)[-1]
+            self.hp_bars = w + 1
+        if bars[w, 1] == self._lowest.value:
+            self.lp_value = bars[w, 1]
+            self.lp_slope = rolling_slopes(*bars[:w + 1].T, w, self.alpha, self.method)[-1]
+            self.lp_bars = w + 1
+
+    def lines(self) -> tuple:
+        """Projection of the high and low pivot lines to the next bar. None if there is no pivot yet."""
+        buy_line = None if self.hp_bars is None else self.hp_value - self.hp_bars * self.hp_slope
+        sell_line = None if self.lp_bars is None else self.lp_value + self.lp_bars * self.lp_slope
+        return buy_line, sell_line
+
+    def batch_lines(self, candles: CandleLike) -> tuple:
+        """Lines projected to each bar from the pivots confirmed before it opened.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: buy and sell lines. NaN until the first pivot.
+        """
+        n = candles.shape[0]
+        w = self.window
+        slopes = rolling_slopes(candles.high, candles.low, candles.close, w, self.alpha, self.method)
+        bar_indexes = arange(n)
+
+        lines = []
+        for pivots, direction in ((PIVOTHIGH(candles.high, w, w), -1), (PIVOTLOW(candles.low, w, w), 1)):
+            # A pivot at p is known from bar p + w + 1 on. Keep the last known one
+            known = np.full(n, -1)
+            pivot_indexes = np.flatnonzero(~np.isnan(pivots))
+            pivot_indexes = pivot_indexes[pivot_indexes + w + 1 < n]
+            known[pivot_indexes + w + 1] = pivot_indexes
+            np.maximum.accumulate(known, out=known)
+
+            found = known >= 0
+            pivot = np.where(found, known, 0)
+            line = pivots[pivot] + direction * (bar_indexes - pivot) * slopes[pivot]
+            lines.append(np.where(found, line, np.nan))
+
+        return tuple(lines)
 
 
 class TrendlineBreakStrategy(TradingStrategy):
@@ -109,8 +262,7 @@ class TrendlineBreakStrategy(TradingStrategy):
 
         # Estimate of bars needed to get a good approximation for pivots
         self.min_bars = 2 * window + 1
-        self._hp_bars = None
-        self._lp_bars = None
+        self._tracker = TrendlineTracker(window, alpha, method)
 
     @property
     def window(self):
@@ -152,38 +304,10 @@ class TrendlineBreakStrategy(TradingStrategy):
         if not self.compound_mode:
             super().fit(train_data, train_labels)
 
-        # Get all high & low pivots from the whole timeseries
-        high_pivots = PIVOTHIGH(self.train_data.high,
-                                self._window, self._window)
-        low_pivots = PIVOTLOW(self.train_data.low,
-                              self._window, self._window)
-
-        # Just take into account the last pivots. Those will make the prediction
-        hp_index = last_nonnan(high_pivots)
-        lp_index = last_nonnan(low_pivots)
-
-        # Calculate line projection from pivot point as per to method selected by user
-        if hp_index is not None:
-            # get window data previous to pivot
-            hp_data = self.train_data[hp_index - self._window: hp_index + 1]
-            # get pivot point, slope and #bars until current bar
-            self._hp_value = high_pivots[hp_index]
-            self._hp_slope = calc_slope(hp_data, self._window,
-                                        self._alpha, self._method)
-            self._hp_bars = self.train_data.shape[0] - hp_index
-            print(f"{self._hp_value=}")
-
-        if lp_index is not None:
-            # get window data previous to pivot
-            lp_data = self.train_data[lp_index - self._window: lp_index + 1]
-            # get pivot point, slope and #bars until current bar
-            self._lp_value = low_pivots[lp_index]
-            self._lp_slope = calc_slope(lp_data, self._window,
-                                        self._alpha, self._method)
-            self._lp_bars = self.train_data.shape[0] - lp_index
-            print(f"{self._lp_value=}")
-
-        self._batch = self.train_data[-self.min_bars:]
+        self._tracker = TrendlineTracker(self._window, self._alpha, self._method)
+        self._tracker.fit(self.train_data)
+        self._closes = SlidingBuffer(3)
+        self._closes.extend(self.train_data.close[-3:])
 
     def update_data(self, new_data: recarray) -> None:
         if not self.is_new_data(new_data):
@@ -191,54 +315,41 @@ class TrendlineBreakStrategy(TradingStrategy):
 
         if not self.compound_mode:
             super().update_data(new_data)
-        # Select minimal batch for predictions
-        self._batch = self.train_data[-self.min_bars:]
-
-        # Get all high & low pivots from the whole timeseries
-        high_pivots = PIVOTHIGH(self._batch.high, self._window, self._window)
-        low_pivots = PIVOTLOW(self._batch.low, self._window, self._window)
 
-        # Just take into account the last pivots. Those will make the prediction
-        hp_index = last_nonnan(high_pivots)
-        lp_index = last_nonnan(low_pivots)
+        # Only the new bars go through the tracker
+        for candle in new_data:
+            self._tracker.update(candle.high, candle.low, candle.close)
+        self._closes.extend(new_data.close[-3:])
 
-        # if there is not a new high pivot, just increment x-axis projection
-        if hp_index is None and self._hp_bars is not None:
-            self._hp_bars += 1
-        elif hp_index is not None:
-            hp_data = self._batch[hp_index - self._window: hp_index + 1]
-            self._hp_value = high_pivots[hp_index]
-            self._hp_slope = calc_slope(hp_data, self._window,
-                                        self._alpha, self._method)
-            self._hp_bars = self._batch.shape[0] - hp_index
-
-        # if there is not a new low pivot, just increment x-axis projection
-        if lp_index is None and self._lp_bars is not None:
-            self._lp_bars += 1
-        elif lp_index is not None:
-            lp_data = self._batch[lp_index - self._window: lp_index + 1]
-            self._lp_value = low_pivots[lp_index]
-            self._lp_slope = calc_slope(lp_data, self._window,
-                                        self._alpha, self._method)
-            self._lp_bars = self._batch.shape[0] - lp_index
-
-    def generate_entry_signal(self, candle: recarray) -> int:
-        batch = append(self._batch, candle).view(recarray)
-        print(f"{batch[-2+self._offset].close}, {batch[-1+self._offset].close}")
+    def generate_entry_signal(self, candle: recarray) -> EntrySignal:
+        # Closes of the last bars plus the candle in progress. Offset selects the pair crossed
+        closes = (*self._closes.values, candle.close)
+        prev_close, curr_close = closes[self._offset - 2], closes[self._offset - 1]
+        buy_line, sell_line = self._tracker.lines()
 
         # calculate line projection from high pivot to current candle
-        if self._hp_bars is not None:
-            buy_line = self._hp_value - self._hp_bars * self._hp_slope
-            print(round(buy_line, 5), round(
-                batch[-1+self._offset].close - buy_line, 5))
-            if is_crossingover(batch, buy_line, False, self._offset):
-                return 0  # buy
+        if buy_line is not None and prev_close <= buy_line < curr_close:
+            return EntrySignal.BUY
         # calculate line projection from low pivot to current candle
-        if self._lp_bars is not None:
-            sell_line = self._lp_value + self._lp_bars * self._lp_slope
-            print(round(sell_line, 5), round(
-                batch[-1+self._offset].close - sell_line, 5))
-            if is_crossingover(batch, sell_line, True, self._offset):
-                return 1  # sell
-
-        return -1  # netral
+        if sell_line is not None and prev_close >= sell_line > curr_close:
+            return EntrySignal.SELL
+        return EntrySignal.NEUTRAL
+
+    def batch_entry_signals(self) -> recarray:
+        closes = self.train_data.close
+        buy_lines, sell_lines = self._tracker.batch_lines(self.train_data)
+
+        # Pair of closes crossed at each bar as per to the offset
+        curr_closes = np.roll(closes, -self._offset)
+        prev_closes = np.roll(closes, 1 - self._offset)
+        prev_closes[:1 - self._offset] = np.nan
+
+        buy_entry_indexes = (prev_closes <= buy_lines) & (buy_lines < curr_closes)
+        sell_entry_indexes = ~buy_entry_indexes & (prev_closes >= sell_lines) & (sell_lines > curr_closes)
+        buy_entry_prices = np.where(buy_entry_indexes, closes, np.nan)
+        sell_entry_prices = np.where(sell_entry_indexes, closes, np.nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
@@ -1,7 +1,6 @@
 from numpy import ndarray, recarray, where, NaN
-from datatools.custom import get_recarray, shift
+from datatools.custom import get_recarray, shift, SlidingExtremum, sliding_extremum
 
-from trade.indicators import MAX, MIN
 from trade.metadata import CandleLike, EntrySignal
 from trade.strategies.abstract import Hyperparameter, EntryTradingStrategy
 
@@ -60,15 +59,9 @@ class ZigZagEntryStrategy(EntryTradingStrategy):
         self.config_band._check_bounds(band)
         self._band = band
 
-    def _minmax(self):
-        # Precalculate RQK & RBFK. This will save computational time
-        self._batch = self.train_data[-self.min_bars:]
-        if self._window == 1:
-            self._highest = self._batch[-self._lag -1].high
-            self._lowest = self._batch[-self._lag -1].low
-        else:
-            self._highest = MAX(self._batch.high, self._window)[-self._lag -1]
-            self._lowest = MIN(self._batch.low, self._window)[-self._lag -1]
+    def _lagged(self, candles: CandleLike) -> CandleLike:
+        # Candles up to `lag` bars before the newest one
+        return candles[:candles.shape[0] - self._lag]
 
     def fit(
         self,
@@ -77,14 +70,27 @@ class ZigZagEntryStrategy(EntryTradingStrategy):
     ) -> None:
         if not self.compound_mode:
             super().fit(train_data, train_labels)
-        self._minmax()
+
+        # Highest high & lowest low of the window that ends `lag` bars ago
+        lagged = self._lagged(self.train_data)
+        self._highs = SlidingExtremum(self._window, "max")
+        self._lows = SlidingExtremum(self._window, "min")
+        self._highest = self._highs.extend(lagged.high)
+        self._lowest = self._lows.extend(lagged.low)
+        self._batch = self.train_data[-self.min_bars:]
 
     def update_data(self, new_candles: CandleLike) -> None:
         if not self.is_new_data(new_candles):
             return
         if not self.compound_mode:
             super().update_data(new_candles)
-        self._minmax()
+
+        # Only the candles that reached the lagged position enter the windows
+        n_new = min(new_candles.shape[0], self.train_data.shape[0] - self._lag)
+        for candle in self._lagged(self.train_data)[-n_new:]:
+            self._highest = self._highs.update(candle.high)
+            self._lowest = self._lows.update(candle.low)
+        self._batch = self.train_data[-self.min_bars:]
 
     def generate_entry_signal(self, candle: CandleLike) -> EntrySignal:
         # If lag = 0 that means we need to calculate indicators with current candle
@@ -104,13 +110,8 @@ class ZigZagEntryStrategy(EntryTradingStrategy):
         
     def batch_entry_signals(self) -> recarray:
 
-        # this is because MAX & MIN don't accept window = 1
-        if self._window == 1:
-            highs = self.train_data.high
-            lows = self.train_data.low
-        else:
-            highs = MAX(self.train_data.high, self._window)
-            lows = MIN(self.train_data.low, self._window)
+        highs = sliding_extremum(self.train_data.high, self._window, "max")
+        lows = sliding_extremum(self.train_data.low, self._window, "min")
 
         # lag=0 means on the current candle we will generate an entry signal.
         # First check if the current high/low breaks previous high/low + tolerance 
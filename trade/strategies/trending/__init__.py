@@ -1,2 +1,3 @@
 from trade.strategies.trending.dualsma import DualSmaStrategy
 from trade.strategies.trending.nadaraya_watson import DualNadarayaKernelStrategy
+from trade.strategies.trending.nadaraya_watson_curvature import CurveNadarayaKernelStrategy
@@ -1,5 +1,7 @@
+from trade.metadata import EntrySignal
 from trade.strategies.abstract import Hyperparameter, TradingStrategy
-from numpy import recarray
+from datatools.custom import get_recarray, rolling_reduce
+from numpy import recarray, where, nan
 
 
 class DualSmaStrategy(TradingStrategy):
@@ -24,6 +26,8 @@ class DualSmaStrategy(TradingStrategy):
         self._long_window = long_window
         self._neutral_band = neutral_band
 
+        self.min_bars = long_window
+
     @property
     def short_window(self):
         return self._short_window
@@ -41,6 +45,7 @@ class DualSmaStrategy(TradingStrategy):
     def long_window(self, long_window):
         self.config_long_window._check_bounds(long_window)
         self._long_window = long_window
+        self.min_bars = long_window
 
     @property
     def neutral_band(self):
@@ -80,17 +85,32 @@ class DualSmaStrategy(TradingStrategy):
         # TODO Aqui va a haber un pedo cuando se actualicen con strategias compuestas
         return super().update_data(new_data)
 
-    def generate_entry_signal(self, datum: recarray) -> int:
+    def generate_entry_signal(self, datum: recarray) -> EntrySignal:
         # Calculate short and long moving averages
         mav_short = (self._cached_mav_short + datum.close) / self.short_window
         mav_long = (self._cached_mav_long + datum.close) / self.long_window
 
-        print(f"{mav_short=:.6f} {mav_long=:.6f}")
-
         # Detect tendency and return signal
         if mav_short > mav_long + self._neutral_band[1]:
-            return 0  # buy
+            return EntrySignal.BUY
         elif mav_short < mav_long + self._neutral_band[0]:
-            return 1  # sell
+            return EntrySignal.SELL
         else:
-            return -1  # neutral
+            return EntrySignal.NEUTRAL
+
+    def batch_entry_signals(self) -> recarray:
+        # Moving averages of every bar, including its own close as the streaming path does
+        closes = self.train_data.close
+        mav_short = rolling_reduce(closes, self._short_window, "mean")
+        mav_long = rolling_reduce(closes, self._long_window, "mean")
+
+        # NaN averages of the first bars never trigger signals
+        buy_entry_indexes = mav_short > mav_long + self._neutral_band[1]
+        sell_entry_indexes = mav_short < mav_long + self._neutral_band[0]
+        buy_entry_prices = where(buy_entry_indexes, closes, nan)
+        sell_entry_prices = where(sell_entry_indexes, closes, nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
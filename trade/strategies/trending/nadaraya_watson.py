@@ -3,7 +3,7 @@ from datatools.custom import addpop, get_recarray, shift, find_supreme
 from datatools.technical import crossingover, crossingunder, above, onband, below
 
 from trade.metadata import CandleLike, EntrySignal
-from trade.indicators import RBFK, RQK
+from trade.indicators import RBFK, RQK, KERNEL_BANK, rqk_weights, rbfk_weights
 from trade.strategies.abstract import Hyperparameter, TradingStrategy
 
 
@@ -152,7 +152,7 @@ class DualNadarayaKernelStrategy(TradingStrategy):
         # Then calculate new indicator values
         new_rqk = RQK(self._batch_rqk.close, self._window_rqk, self._alpha_rq,
                       self._rqk_bars, dropna=True)
-        new_rbfk = RBFK(self._batch_rbfk.close, (self._window_rbfk - self._lag),
+        new_rbfk = RBFK(self._batch_rbfk.close, self._window_rbfk,
                         self._rbfk_bars, dropna=True)
 
         # Finally add them to the queue
@@ -259,6 +259,130 @@ class DualNadarayaKernelStrategy(TradingStrategy):
 
 
         
+    @classmethod
+    def iter_population_signals(
+        cls,
+        candles: CandleLike,
+        window_rqk: np.ndarray,
+        window_rbfk: np.ndarray,
+        alpha_rq: np.ndarray = 1,
+        band: np.ndarray = (0, 0),
+        n_bars: int = 25,
+        lag: int = 1,
+        mode: str = "oncross",
+        max_memory: int = 2 ** 28,
+    ):
+        """Entry signals of a population of configs evaluated at once, i.e. a
+        hyperparameter sweep. Configs are processed in chunks that fit in
+        `max_memory` bytes: the kernels a chunk needs are computed once with a
+        weight bank matrix product and the crossings are 2-D boolean arrays.
+
+        Args:
+            candles (CandleLike): Candles to evaluate the configs on.
+            window_rqk (np.ndarray): RQK window of each config.
+            window_rbfk (np.ndarray): RBFK window of each config.
+            alpha_rq (np.ndarray, optional): RQK alpha of each config. Defaults to 1.
+            band (np.ndarray, optional): (low, high) band of each config, with shape (n_configs, 2),
+                or a single band. Defaults to (0, 0).
+            n_bars (int, optional): Bars of the kernels, shared by the population. Defaults to 25.
+            lag (int, optional): Lag of the signals, shared by the population. Defaults to 1.
+            mode (str, optional): "oncross" or "holded". Defaults to "oncross".
+            max_memory (int, optional): Approximate bytes used by a chunk. Defaults to 256 MiB.
+
+        Yields:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: configs, buy_index, sell_index. `configs`
+                are the indexes of the chunk in the population and buy_index/sell_index the
+                boolean signals of each one with shape (len(configs), n_candles). Row i is the
+                buy_index/sell_index of `batch_entry_signals` of config configs[i].
+        """
+        cls.config_n_bars._check_bounds(n_bars)
+        cls.config_lag._check_bounds(lag)
+        cls.config_mode._check_bounds(mode)
+
+        band = np.asarray(band, dtype=np.float64)
+        window_rqk, window_rbfk, alpha_rq, band_low, band_high = np.broadcast_arrays(
+            np.asarray(window_rqk, dtype=np.float64).ravel(),
+            np.asarray(window_rbfk, dtype=np.float64).ravel(),
+            np.asarray(alpha_rq, dtype=np.float64).ravel(),
+            band[..., 0].ravel(), band[..., 1].ravel())
+        for config, values in ((cls.config_window_rqk, window_rqk), (cls.config_window_rbfk, window_rbfk),
+                               (cls.config_alpha_rq, alpha_rq)):
+            config._check_bounds(values.min())
+            config._check_bounds(values.max())
+        cls.config_band._check_bounds((band_low.min(), band_high.max()))
+
+        closes = np.asarray(candles.close, dtype=np.float64)
+        n_candles = closes.shape[0]
+
+        # Configs sharing a RQK are kept in the same chunk, so it's computed once
+        order = np.lexsort((window_rbfk, alpha_rq, window_rqk))
+        chunk_size = max(1, int(max_memory // (48 * n_candles)))
+
+        for start in range(0, order.shape[0], chunk_size):
+            configs = order[start:start + chunk_size]
+            rq_params, rq_rows = np.unique(
+                np.stack([window_rqk[configs], alpha_rq[configs]], axis=1), axis=0, return_inverse=True)
+            rbf_params, rbf_rows = np.unique(window_rbfk[configs], return_inverse=True)
+
+            rq = KERNEL_BANK(closes, rqk_weights(rq_params[:, 0], rq_params[:, 1], n_bars))[rq_rows.ravel()]
+            rbf = KERNEL_BANK(closes, rbfk_weights(rbf_params, n_bars))[rbf_rows.ravel()]
+
+            buy_level = rq + band_high[configs, None]
+            sell_level = rq + band_low[configs, None]
+            del rq
+
+            buy_index = np.zeros((configs.shape[0], n_candles), dtype=bool)
+            sell_index = np.zeros((configs.shape[0], n_candles), dtype=bool)
+            if mode == "oncross":
+                # Same conditions as crossingover/crossingunder, shifted by 1 + lag
+                buy_index[:, 1 + lag:] = (rbf[:, :n_candles - 1 - lag] <= buy_level[:, :n_candles - 1 - lag]) \
+                    & (rbf[:, 1:n_candles - lag] > buy_level[:, 1:n_candles - lag])
+                sell_index[:, 1 + lag:] = (rbf[:, :n_candles - 1 - lag] >= sell_level[:, :n_candles - 1 - lag]) \
+                    & (rbf[:, 1:n_candles - lag] < sell_level[:, 1:n_candles - lag])
+            elif mode == "holded":
+                # Same conditions as above/below, shifted by lag
+                np.greater(rbf[:, :n_candles - lag], buy_level[:, :n_candles - lag], out=buy_index[:, lag:])
+                np.less(rbf[:, :n_candles - lag], sell_level[:, :n_candles - lag], out=sell_index[:, lag:])
+
+            yield configs, buy_index, sell_index
+
+    @classmethod
+    def batch_population_signals(
+        cls,
+        candles: CandleLike,
+        window_rqk: np.ndarray,
+        window_rbfk: np.ndarray,
+        alpha_rq: np.ndarray = 1,
+        band: np.ndarray = (0, 0),
+        n_bars: int = 25,
+        lag: int = 1,
+        mode: str = "oncross",
+        max_memory: int = 2 ** 28,
+        out: np.ndarray = None,
+    ) -> np.ndarray:
+        """Signal matrix of a population of configs. See `iter_population_signals`.
+
+        Args:
+            out (np.ndarray, optional): int8 array with shape (n_configs, n_candles) to write
+                the signals in, i.e. a np.memmap for populations that don't fit in memory.
+                Defaults to None (a new array).
+
+        Returns:
+            np.ndarray: EntrySignal value of each config (rows) and candle (columns).
+        """
+        n_configs = np.broadcast(np.ravel(window_rqk), np.ravel(window_rbfk), np.ravel(alpha_rq),
+                                 np.asarray(band)[..., 0].ravel()).size
+        if out is None:
+            out = np.empty((n_configs, candles.shape[0]), dtype=np.int8)
+
+        for configs, buy_index, sell_index in cls.iter_population_signals(
+                candles, window_rqk, window_rbfk, alpha_rq, band, n_bars, lag, mode, max_memory):
+            signals = np.full(buy_index.shape, EntrySignal.NEUTRAL.value, dtype=np.int8)
+            signals[buy_index] = EntrySignal.BUY.value
+            signals[sell_index] = EntrySignal.SELL.value
+            out[configs] = signals
+        return out
+
     def get_kernels(self) -> np.recarray:
         closes = self.train_data.close
         rq = RQK(closes, self._window_rqk, self._alpha_rq, self._rqk_bars)
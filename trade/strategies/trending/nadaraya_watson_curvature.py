@@ -1,9 +1,9 @@
-from numpy import ndarray
-from datatools.custom import addpop, get_recarray
+from numpy import ndarray, recarray, zeros, where, nan
+from datatools.custom import addpop, get_recarray, shift
 from datatools.technical import crossingover, crossingunder
 
 from trade.metadata import CandleLike, EntrySignal
-from trade.indicators import RBFK, RQK, get_stable_min_bars
+from trade.indicators import RQK
 from trade.strategies.abstract import Hyperparameter, TradingStrategy
 
 
@@ -49,15 +49,6 @@ class CurveNadarayaKernelStrategy(TradingStrategy):
         self.config_window._check_bounds(window)
         self._window = window
 
-    @property
-    def window_rbfk(self):
-        return self._window_rbfk
-
-    @window_rbfk.setter
-    def window_rbfk(self, window_rbfk):
-        self.config_window_rbfk._check_bounds(window_rbfk)
-        self._window_rbfk = window_rbfk
-
     @property
     def alpha(self):
         return self._alpha
@@ -99,23 +90,15 @@ class CurveNadarayaKernelStrategy(TradingStrategy):
         train_data: CandleLike,
         train_labels: ndarray = None
     ) -> None:
-        super().fit(train_data, train_labels)
+        if not self.compound_mode:
+            super().fit(train_data, train_labels)
 
-        # Precalculate RQK & RBFK. This will save computational time
+        # Precalculate RQK. This will save computational time
         self._rqk_queue = RQK(train_data.close, self._window, self._alpha,
-                              self.min_bars, dropna=True)
-        self._rbfk_queue = RBFK(train_data.close, (self._window_rbfk - self._lag),
-                                self._rbfk_bars, dropna=True)
-
-        # print(self._rqk_queue)
-        # print(self._rbfk_queue)
+                              self._n_bars, dropna=True)
 
         # Save minimal batch to compute indicator with current candle
-        self._batch_rqk = self.train_data[-self.min_bars:]
-        self._batch_rbfk = self.train_data[-self._rbfk_bars:]
-
-        # signals = self.batch_signals()
-        # print(signals)
+        self._batch_rqk = self.train_data[-self._n_bars:]
 
     def update_data(self, new_candles: CandleLike) -> None:
         if not self.is_new_data(new_candles):
@@ -125,59 +108,52 @@ class CurveNadarayaKernelStrategy(TradingStrategy):
             super().update_data(new_candles)
 
         # Update minimal batch
-        self._batch_rqk = self.train_data[-self.min_bars:]
-        self._batch_rbfk = self.train_data[-self._rbfk_bars:]
+        self._batch_rqk = self.train_data[-self._n_bars:]
 
-        # Then calculate new indicator values
+        # Then calculate new indicator values and add them to the queue
         new_rqk = RQK(self._batch_rqk.close, self._window, self._alpha,
-                      self.min_bars, dropna=True)
-        new_rbfk = RBFK(self._batch_rbfk.close, (self._window_rbfk - self._lag),
-                        self._rbfk_bars, dropna=True)
-
-        # Finally add them to the queue
+                      self._n_bars, dropna=True)
         self._rqk_queue = addpop(self._rqk_queue, new_rqk)
-        self._rbfk_queue = addpop(self._rbfk_queue, new_rbfk)
-        # print(self._rqk_queue)
-        # print(self._rbfk_queue)
 
-    def generate_entry_signal(self, candle: CandleLike) -> int:
-        # If lag = 0 that means we need to calculate indicators with current candle
+    def generate_entry_signal(self, candle: CandleLike) -> EntrySignal:
+        # If lag = 0 that means we need to calculate the kernel with current candle
         if self._lag == 0:
             batch_rqk = addpop(self._batch_rqk.close, candle.close)
-            batch_rbfk = addpop(self._batch_rbfk.close, candle.close)
-
-            # Calculate indicator for current candle
-            rqk = RQK(batch_rqk, self._window, self._alpha,
-                      self.min_bars)[-1]
-            rbfk = RBFK(batch_rbfk, (self._window_rbfk - self._lag),
-                        self.min_bars)[-1]
-
-            line_rqk = [self._rqk_queue[-1], rqk]
-            line_rbfk = [self._rbfk_queue[-1], rbfk]
+            rqk = RQK(batch_rqk, self._window, self._alpha, self._n_bars)[-1]
+            line_rqk = [self._rqk_queue[-2], self._rqk_queue[-1], rqk]
         # else use cache stored values to make signal
         else:
-            line_rqk = self._rqk_queue[-2-self._lag:]
-            line_rbfk = self._rbfk_queue[-2-self._lag:]
+            line_rqk = self._rqk_queue[-2-self._lag:len(self._rqk_queue)+1-self._lag]
 
-        # print(
-        #     f"[{line_rqk[0]=:.5f}, {line_rqk[1]=:.5f}][{line_rbfk[0]=:.5f}, {line_rbfk[1]=:.5f}]")
-
-        # Detect tendency and return signal
-        if crossingover(line_rbfk, line_rqk, self._neutral_band[1])[-1]:
+        # The kernel changes of direction when its slope crosses the neutral band
+        if crossingover(line_rqk[1:], line_rqk[:-1], self._neutral_band[1])[-1]:
             return EntrySignal.BUY
-        elif crossingunder(line_rbfk, line_rqk, self._neutral_band[0])[-1]:
+        elif crossingunder(line_rqk[1:], line_rqk[:-1], self._neutral_band[0])[-1]:
             return EntrySignal.SELL
         else:
             return EntrySignal.NEUTRAL
 
-    def batch_signals(self):
-        # Precalculate RQK & RBFK. This will save computational time
-        rqks = RQK(self.train_data.close, self._window, self._alpha,
-                   self.min_bars)
-        rbfks = RBFK(self.train_data.close, (self._window_rbfk - self._lag),
-                     self._rbfk_bars)
+    def batch_entry_signals(self) -> recarray:
+        rqks = RQK(self.train_data.close, self._window, self._alpha, self._n_bars)
 
-        buy_signals = crossingover(rqks, rbfks, self.neutral_band[1])
-        sell_signals = crossingunder(rqks, rbfks, self.neutral_band[0])
+        # Direction changes of the kernel at each bar, delayed by the lag
+        buy_entry_indexes = zeros(rqks.shape[0], dtype=bool)
+        sell_entry_indexes = zeros(rqks.shape[0], dtype=bool)
+        buy_entry_indexes[1:] = crossingover(rqks[1:], rqks[:-1], self._neutral_band[1])
+        sell_entry_indexes[1:] = crossingunder(rqks[1:], rqks[:-1], self._neutral_band[0])
+        buy_entry_indexes = shift(buy_entry_indexes, self._lag, False)
+        sell_entry_indexes = shift(sell_entry_indexes, self._lag, False)
 
-        return get_recarray([buy_signals, sell_signals], names=["buy", "sell"])
+        # Calculate an approximation of the entry price at the candle where the signal is activated
+        if self._lag == 0:
+            buy_entry_prices = where(buy_entry_indexes, self.train_data.high, nan)
+            sell_entry_prices = where(sell_entry_indexes, self.train_data.low, nan)
+        else:
+            opens = self.train_data.open
+            buy_entry_prices = where(buy_entry_indexes, opens, nan)
+            sell_entry_prices = where(sell_entry_indexes, opens, nan)
+
+        return get_recarray([
+            buy_entry_indexes, buy_entry_prices,
+            sell_entry_indexes, sell_entry_prices],
+            names=['buy_index', 'buy_price', 'sell_index', 'sell_price'])
@@ -1,6 +1,11 @@
+import os
+import sys
 from atexit import register
+from collections import deque
 from datetime import datetime
-from logging import StreamHandler, Formatter, getLogger, DEBUG, INFO, WARNING, ERROR, CRITICAL
+from threading import Event, Lock, Thread
+from time import monotonic
+from logging import Handler, Formatter, getLogger, DEBUG, INFO, WARNING, ERROR, CRITICAL
 
 class CustomFormatter(Formatter):
     """
@@ -14,10 +19,10 @@ class CustomFormatter(Formatter):
     blue = "\x1b[34m"
     bold_red = "\x1b[31;1m"
     reset = "\x1b[0m"
-    
+
     # Define log format
     format = "[%(asctime)s] - %(name)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d)"
-    
+
     # Define format for each log level
     FORMATS = {
         DEBUG: blue + format + reset,
@@ -27,57 +32,229 @@ class CustomFormatter(Formatter):
         CRITICAL: bold_red + format + reset
     }
 
+    def __init__(self, colored: bool = True):
+        super().__init__()
+        # Formatters are created once instead of once per record
+        if colored:
+            self.formatters = {level: Formatter(fmt) for level, fmt in self.FORMATS.items()}
+        else:
+            self.formatters = {level: Formatter(self.FORMATS[INFO]) for level in self.FORMATS}
+        self.default_formatter = self.formatters[INFO]
+
     def format(self, record):
         """
-        Format the log record and write to file.
+        Format the log record with the format of its level.
+        """
+        return self.formatters.get(record.levelno, self.default_formatter).format(record)
+
+
+class RotatingLogFile:
+    """
+    Log file named after its opening date. It rotates to a new file when it
+    exceeds `max_bytes` or has been open for `rotate_secs`, whatever comes first.
+    Files of the same day get a numeric suffix, i.e. logs/2024-03-01.1.log.
+    Rotations on time always move to the next free suffix.
+    """
+
+    def __init__(self, directory: str = "logs", max_bytes: int = 10_000_000, rotate_secs: float = 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rotate_secs = rotate_secs
+        self.file = None
+        self.open()
+
+    def _path(self, new_file: bool = False):
+        # The first file of the day that is not full, or that does not exist if `new_file`
+        today = datetime.now().strftime('%Y-%m-%d')
+        path = os.path.join(self.directory, f"{today}.log")
+        suffix = 0
+        while os.path.exists(path) and (new_file or os.path.getsize(path) >= self.max_bytes):
+            suffix += 1
+            path = os.path.join(self.directory, f"{today}.{suffix}.log")
+        return path
+
+    def open(self, new_file: bool = False):
+        """
+        Open the current log file in append mode, or a new one if `new_file`.
         """
-        # Get the format for the current log level
-        log_fmt = self.FORMATS.get(record.levelno)
-
-        # Write the file record
-        file_record = self.file_formatter.format(record)
-        self.file.write(file_record + "\n")
-
-        # Return the console record
-        console_formatter = Formatter(log_fmt)
-        return console_formatter.format(record)
-    
-    def set_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = self._path(new_file)
+        self.file = open(self.path, "a")
+        self.size = self.file.tell()
+        self.opened_at = monotonic()
+        self.day = datetime.now().date()
+
+    def is_expired(self):
+        return monotonic() - self.opened_at >= self.rotate_secs
+
+    def should_rotate(self):
+        return (
+            self.size >= self.max_bytes
+            or self.is_expired()
+            or datetime.now().date() != self.day
+        )
+
+    def write(self, text: str):
         """
-        Set up the log file.
+        Write a batch of lines, rotating the file beforehand if needed.
         """
-        # Open the log file with today's date
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.file = open(f'logs/{today}.log', "a")
+        if self.should_rotate():
+            # A file under max_bytes would be reopened if the rotation is on time
+            new_file = self.is_expired() and datetime.now().date() == self.day
+            self.close()
+            self.open(new_file)
+        self.file.write(text)
+        self.size += len(text)
+
+    def flush(self):
+        self.file.flush()
 
-        # Set up the file formatter
-        log_fmt = self.FORMATS.get(INFO)
-        self.file_formatter = Formatter(log_fmt)
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
 
-        # Register the file close method to be called at exit
-        register(self.file.close)
+
+class AsyncLogHandler(Handler):
+    """
+    Logging handler that never blocks the calling thread on I/O.
+
+    `emit` only appends the record to a bounded in-memory buffer. A daemon
+    writer thread formats the pending records and writes them in batches to the
+    console and to a RotatingLogFile. If the buffer is full, the oldest records
+    are dropped and a warning with the number of dropped records is written with
+    the next batch.
+    """
+
+    def __init__(
+        self,
+        log_file: RotatingLogFile = None,
+        stream = None,
+        capacity: int = 10_000,
+        flush_interval: float = 0.5,
+    ):
+        super().__init__()
+        self.log_file = log_file
+        self.stream = stream
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.file_formatter = CustomFormatter(colored=False)
+
+        # Records and drops are shared by the trading thread and the writer one
+        self.dropped = 0
+        self._lock = Lock()
+        self._records = deque(maxlen=capacity)
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._writer = Thread(target=self._run, name="danafx-log-writer", daemon=True)
+        self._writer.start()
+
+        # Pending records are written before the interpreter exits
+        register(self.close)
+
+    def emit(self, record):
+        """
+        Buffer the record. Called from the trading thread, so no I/O here.
+        """
+        with self._lock:
+            if len(self._records) == self.capacity:
+                # deque(maxlen) discards the oldest record on append
+                self.dropped += 1
+            self._records.append(record)
+        if record.levelno >= ERROR:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._write_batch()
+        self._write_batch()
+
+    def _write_batch(self):
+        # The pending records and drops are taken at once, so no drop is counted twice or lost
+        with self._lock:
+            if not self._records and not self.dropped:
+                return
+            records, dropped = list(self._records), self.dropped
+            self._records.clear()
+            self.dropped = 0
+
+        console_lines, file_lines = [], []
+        if dropped:
+            message = f"{dropped} log records dropped, logging buffer is full"
+            console_lines.append(message)
+            file_lines.append(message)
+
+        for record in records:
+            try:
+                if self.stream is not None:
+                    console_lines.append(self.format(record))
+                if self.log_file is not None:
+                    file_lines.append(self.file_formatter.format(record))
+            except Exception:
+                self.handleError(record)
+
+        try:
+            if self.stream is not None and console_lines:
+                self.stream.write("\n".join(console_lines) + "\n")
+                self.stream.flush()
+            if self.log_file is not None and file_lines:
+                self.log_file.write("\n".join(file_lines) + "\n")
+                self.log_file.flush()
+        except Exception:
+            # Same policy as logging: errors on emitting are not raised
+            if self.stream is not None:
+                self.stream.write("logging writer failed to write a batch\n")
+
+    def flush(self):
+        """
+        Ask the writer thread to write the pending records. Does not wait for it.
+        """
+        self._wakeup.set()
+
+    def close(self):
+        """
+        Stop the writer thread after writing every pending record.
+        """
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._wakeup.set()
+            self._writer.join()
+            if self.log_file is not None:
+                self.log_file.close()
+        super().close()
 
 
-def get_logger():
+def get_logger(
+    directory: str = "logs",
+    max_bytes: int = 10_000_000,
+    rotate_secs: float = 86400,
+    capacity: int = 10_000,
+):
     """
-    Get a logger with custom settings.
+    Get a logger with custom settings. Records are written asynchronously to the
+    console and to a rotating file in `directory`.
     """
     # Create logger
     logger = getLogger("danafx")
     logger.setLevel(DEBUG)
 
-    # Create console handler
-    ch = StreamHandler()
+    # Every bot shares the same handler and writer thread
+    if any(isinstance(handler, AsyncLogHandler) for handler in logger.handlers):
+        return logger
 
-    # Set up the custom formatter
-    cf = CustomFormatter()
-    cf.set_file()
+    # Create the asynchronous console and file handler
+    handler = AsyncLogHandler(
+        log_file=RotatingLogFile(directory, max_bytes, rotate_secs),
+        stream=sys.stderr,
+        capacity=capacity,
+    )
 
-    # Add the custom formatter to the console handler
-    ch.setFormatter(cf)
+    # Set up the custom formatter of the console
+    handler.setFormatter(CustomFormatter())
 
-    # Add the console handler to the logger
-    logger.addHandler(ch)
+    # Add the handler to the logger
+    logger.addHandler(handler)
 
     # Return the logger
     return logger
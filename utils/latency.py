@@ -0,0 +1,228 @@
+import json
+from time import perf_counter_ns, monotonic
+
+
+class LatencyHistogram:
+    """Log-linear histogram of latencies in nanoseconds, as in HdrHistogram.
+
+    Values below 2**significant_bits have their own bucket. Above that, each
+    power of two is split in 2**(significant_bits - 1) buckets, so the relative
+    error of any percentile is below 2**(1 - significant_bits) with a fixed and
+    small memory footprint.
+
+    Args:
+        significant_bits (int, optional): Precision of the buckets. Defaults to 7 (~1.6% error).
+    """
+
+    def __init__(self, significant_bits: int = 7) -> None:
+        self.significant_bits = significant_bits
+        self._sub_buckets = 1 << significant_bits
+        self._half = self._sub_buckets >> 1
+        self.reset()
+
+    def reset(self) -> None:
+        # Cleared in place, spans keep a reference to the counts
+        if hasattr(self, "counts"):
+            self.counts[:] = [0] * len(self.counts)
+        else:
+            self.counts = [0] * (self._sub_buckets + 64 * self._half)
+        self.count = 0
+        self.total = 0
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_buckets:
+            return value
+        shift = value.bit_length() - self.significant_bits
+        return self._sub_buckets + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _lower_bound(self, index: int) -> int:
+        if index < self._sub_buckets:
+            return index
+        shift, mantissa = divmod(index - self._sub_buckets, self._half)
+        return (mantissa + self._half) << (shift + 1)
+
+    def record(self, value: int) -> None:
+        value = max(int(value), 0)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> int:
+        """Lower bound of the bucket that holds the q-th percentile (0 < q <= 100)."""
+        if self.count == 0:
+            return 0
+        target = max(1, round(q / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self._lower_bound(index)
+        return 0
+
+    @property
+    def min(self) -> int:
+        return self.percentile(1e-9)
+
+    @property
+    def max(self) -> int:
+        return self.percentile(100)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ns": self.total / self.count if self.count else 0,
+            "min_ns": self.min,
+            "p50_ns": self.percentile(50),
+            "p90_ns": self.percentile(90),
+            "p99_ns": self.percentile(99),
+            "p999_ns": self.percentile(99.9),
+            "max_ns": self.max,
+        }
+
+
+class _Span:
+    # Reusable context manager of a single stage. Not reentrant. The bucket
+    # index is inlined to keep the overhead of a span below a microsecond
+    __slots__ = ("histogram", "counts", "bits", "sub_buckets", "offset", "start")
+
+    def __init__(self, histogram: LatencyHistogram) -> None:
+        self.histogram = histogram
+        self.counts = histogram.counts
+        self.bits = histogram.significant_bits
+        self.sub_buckets = histogram._sub_buckets
+        self.offset = histogram._sub_buckets - 2 * histogram._half
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter_ns() - self.start
+        if elapsed < self.sub_buckets:
+            self.counts[elapsed] += 1
+        else:
+            shift = elapsed.bit_length() - self.bits
+            self.counts[self.offset + (shift << (self.bits - 1)) + (elapsed >> shift)] += 1
+        histogram = self.histogram
+        histogram.count += 1
+        histogram.total += elapsed
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class LatencyRecorder:
+    """Monotonic clock spans aggregated in memory into one LatencyHistogram per
+    stage, symbol and strategy.
+
+    When disabled, `span` returns a shared no-op context manager, so instrumented
+    code pays nothing but the call.
+
+    Args:
+        enabled (bool, optional): Whether spans are measured. Defaults to True.
+        path (str, optional): File written by `export`. Prometheus text format if it
+            ends with ".prom", JSON otherwise. Defaults to None.
+        export_every_secs (float, optional): Seconds between exports of `maybe_export`. Defaults to 60.
+        significant_bits (int, optional): Precision of the histograms. Defaults to 7.
+
+    Example:
+        >>> latency = LatencyRecorder(path="logs/latency.prom")
+        >>> with latency.span("update_data", "EURUSD", "DualSmaStrategy"):
+        ...     strategy.update_data(candles)
+        >>> latency.maybe_export()
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        path: str = None,
+        export_every_secs: float = 60,
+        significant_bits: int = 7,
+    ) -> None:
+        self.enabled = enabled
+        self.path = path
+        self.export_every_secs = export_every_secs
+        self.significant_bits = significant_bits
+        self._histograms = {}
+        self._spans = {}
+        self._last_export = monotonic()
+
+    def histogram(self, stage: str, symbol: str = "", strategy: str = "") -> LatencyHistogram:
+        key = (stage, symbol, strategy)
+        if key not in self._histograms:
+            self._histograms[key] = LatencyHistogram(self.significant_bits)
+        return self._histograms[key]
+
+    def span(self, stage: str, symbol: str = "", strategy: str = ""):
+        """Context manager that records the time spent inside it."""
+        if not self.enabled:
+            return _NULL_SPAN
+        key = (stage, symbol, strategy)
+        span = self._spans.get(key)
+        if span is None:
+            span = self._spans[key] = _Span(self.histogram(stage, symbol, strategy))
+        return span
+
+    def record(self, stage: str, elapsed_ns: int, symbol: str = "", strategy: str = "") -> None:
+        if self.enabled:
+            self.histogram(stage, symbol, strategy).record(elapsed_ns)
+
+    def reset(self) -> None:
+        for histogram in self._histograms.values():
+            histogram.reset()
+
+    def summary(self) -> list:
+        return [
+            {"stage": stage, "symbol": symbol, "strategy": strategy, **histogram.summary()}
+            for (stage, symbol, strategy), histogram in self._histograms.items()
+            if histogram.count
+        ]
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, name: str = "danafx_stage_latency_seconds") -> str:
+        """Summaries in Prometheus text exposition format."""
+        lines = [
+            f"# HELP {name} Latency of the bot loop stages.",
+            f"# TYPE {name} summary",
+        ]
+        for (stage, symbol, strategy), histogram in self._histograms.items():
+            if not histogram.count:
+                continue
+            labels = f'stage="{stage}",symbol="{symbol}",strategy="{strategy}"'
+            for q in (0.5, 0.9, 0.99, 0.999):
+                lines.append(f'{name}{{{labels},quantile="{q}"}} {histogram.percentile(q * 100) / 1e9:.9f}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total / 1e9:.9f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str = None) -> None:
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to export latencies")
+        content = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w") as file:
+            file.write(content)
+        self._last_export = monotonic()
+
+    def maybe_export(self) -> bool:
+        """Exports if enabled, a path is set and `export_every_secs` have passed."""
+        if not self.enabled or self.path is None:
+            return False
+        if monotonic() - self._last_export < self.export_every_secs:
+            return False
+        self.export()
+        return True
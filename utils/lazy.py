@@ -0,0 +1,51 @@
+from importlib import import_module
+from typing import Callable
+
+
+def lazy_function(module_name: str, function_name: str) -> Callable:
+    """Function that imports `module_name` on its first call and then forwards
+    every call to `module_name.function_name`. Heavy dependencies (TA-Lib,
+    MetaTrader5, plotly) are paid by the first user only, not on import.
+
+    Args:
+        module_name (str): Module of the function, i.e. "talib" or "talib.stream".
+        function_name (str): Name of the function in the module.
+
+    Returns:
+        Callable: Wrapper with the same name as the function.
+
+    Example:
+        >>> EMA = lazy_function("talib", "EMA")
+        >>> EMA(closes, 14)  # talib is imported here
+    """
+    function = None
+
+    def wrapper(*args, **kwargs):
+        nonlocal function
+        if function is None:
+            function = getattr(import_module(module_name), function_name)
+        return function(*args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = function_name
+    wrapper.__doc__ = f"Lazy wrapper of {module_name}.{function_name}."
+    return wrapper
+
+
+def lazy_attributes(module_globals: dict, attributes: dict) -> Callable:
+    """Module level `__getattr__` that imports `attributes` on first access.
+
+    Args:
+        module_globals (dict): globals() of the module, where resolved attributes are cached.
+        attributes (dict): Module path keyed by attribute name, i.e. {"Mt5Session": "trade.brokers.mt5broker"}.
+
+    Returns:
+        Callable: Function to assign to the module `__getattr__`.
+    """
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module {module_globals['__name__']!r} has no attribute {name!r}")
+        value = getattr(import_module(attributes[name]), name)
+        module_globals[name] = value
+        return value
+
+    return __getattr__